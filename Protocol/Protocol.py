@@ -3,6 +3,7 @@ from collections import defaultdict
 from typing import List, Dict, Optional, Union, Sequence, Literal
 import os
 import json
+from shared import well_addressing  # 共用的孔位寻址表（define_action/well_addressing.py）
 
 
 def process_log_file(log_path):
@@ -103,11 +104,7 @@ def process_log_file(log_path):
 
     def is_full_row(wells: List[str]) -> bool:
         """Returns True if all wells in a row (e.g., A1 to A12) are included"""
-        if len(wells) < 12:
-            return False
-        row = wells[0][0]
-        indices = sorted([int(w[1:]) for w in wells if w[0] == row])
-        return indices == list(range(1, 13))
+        return well_addressing.is_full_row(wells, cols=12)
 
     def build_transfer_liquid_dict_complete(step_lines: List[str]) -> Dict:
         asp_vols = []
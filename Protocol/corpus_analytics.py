@@ -0,0 +1,410 @@
+"""
+语料级统计：把所有解析好的 phase 输出读成列式 DataFrame，一次性做向量化统计。
+
+输入两种 phase 文件都支持：
+- Protocol.py 写的 json/*.ot2.apiv2.json：{"Phase N": [按 LEGACY_FIELDS 排列的值]}，
+  sources 等单元格可能是 repr 字符串；
+- protocol_converter_5.15 写的 <log>.json：带 "template" 的 dict 列表（含模块 phase）。
+另外可以给日志目录（success/*.log），统计每种动作（步骤首词）出现的次数。
+
+得到的表：
+    transfers   一行一个 transfer（列同 phase_table.COLUMNS 去掉 layout，外加 protocol / template / pipette）
+    phases      一行一个 phase（transfer 数、枪头数、是否可用 8 通道 / 96 头、估计耗时）
+    log_lines   日志里一行一个顶层步骤（protocol / action / 各模块是否出现），给了日志才有
+
+    python corpus_analytics.py json --logs success --out corpus_stats.json
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from csv_protocol.phase_table import (
+    COLUMNS, CONTAINER_FIELDS, VALUE_FIELDS, first, read_phase_json, tip_column,
+)
+from shared import sim_clock, well_addressing
+
+DEFAULT_OP_SECONDS = sim_clock.DEFAULT_OP_SECONDS
+WELL_ROWCOL = well_addressing.WELL_ROWCOL
+
+CHANNELS = 8
+# 从文件名去掉这些后缀得到 protocol id（长的在前）
+ID_SUFFIXES = (".ot2.apiv2.log.json", ".ot2.apiv2.json", ".ot2.apiv2.log", ".log.json", ".json", ".log")
+# 与 Protocol.py / protocol_converter_5.15 相同的过滤规则
+EXCLUDED_PREFIXES = ("/Users", "Congratulations!", "Caught exception:", "Deck calibration", "WARNING",
+                     "Protocol complete", "Seal and shake", "Pausing robot operation", "TRANSFERRING",
+                     "Centrifuge")
+MODULE_PATTERNS = {
+    "temperature": r"Temperature Module",
+    "magnetic": r"Magnetic Module",
+    "heater_shaker": r"Heater-Shaker|Heater Shaker|Deactivating Heater",
+    "thermocycler": r"Thermocycler",
+}
+TEMPLATE_MODULE = {
+    "transfer_with_temperature": "temperature",
+    "transfer_with_magnetic": "magnetic",
+    "heater_shaker": "heater_shaker",
+}
+_TIP_VOLUME = re.compile(r"(\d+)\s*(?:µL|uL|ul)", re.IGNORECASE)
+
+
+# ---------------------------------------------------------------
+# LOADING -------------------------------------------------------
+# ---------------------------------------------------------------
+
+
+def protocol_id(path: Path) -> str:
+    name = path.name
+    for suffix in ID_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return path.stem
+
+
+def read_phases(path) -> List[Dict[str, Any]]:
+    """任一种 phase 文件 -> phase dict 列表（phase_table.read_phase_json）。"""
+    return read_phase_json(path)
+
+
+def module_seconds(d: Dict[str, Any]) -> float:
+    """模块 phase 本身占用的时间：heater_shaker 的 duration_minutes、磁力架的 magnetic_delay_minutes。"""
+    minutes = (d.get("duration_minutes") or 0) + (d.get("magnetic_delay_minutes") or 0)
+    return float(minutes) * 60
+
+
+def pipette_for_tip_rack(tip_rack: str) -> str:
+    """'Opentrons OT-2 96 Filter Tip Rack 20 µL' -> 'p20'；不认识的返回空串。"""
+    m = _TIP_VOLUME.search(tip_rack or "")
+    return f"p{m.group(1)}" if m else ""
+
+
+def _padded(value, n: int) -> list:
+    """
+    phase 字段 -> n 个 transfer 的值，和 phases_to_rows 里逐行 _at 的结果相同
+    （列表不够长补 None，标量 / None 每个 transfer 相同），但整段切片拼接，不逐个取。
+    """
+    if isinstance(value, (list, tuple)):
+        return list(value[:n]) + [None] * (n - len(value))
+    return [value] * n
+
+
+# 按 transfer 展开的字段；mix_times 在执行端是整个 phase 的次数（见 _PHASE_FIELDS）
+_TRANSFER_FIELDS = list(CONTAINER_FIELDS) + [name for name in VALUE_FIELDS if name != "mix_times"]
+_PHASE_FIELDS = ("touch_tip", "is_96_well", "spread", "mix_stage", "mix_times", "mix_vol", "mix_rate")
+_PHASE_COLUMNS = ("protocol", "phase", "template", "module", "module_s")
+
+
+@dataclass
+class _Collected:
+    protocols: List[str]                 # 所有输入文件，包括一个 phase 都没有的
+    phase_cols: Dict[str, list]          # 一个 phase 一个值
+    fields: Dict[str, list]              # _PHASE_FIELDS，一个 phase 一个值
+    transfers: Dict[str, list]           # _TRANSFER_FIELDS，一个 transfer 一个值
+    counts: List[int]                    # 每个 phase 的 transfer 数
+
+
+def _collect(files: Iterable[Path]) -> _Collected:
+    """逐个 phase 把字段整段追加到列表里（不逐个 transfer 循环），最后一次性建 DataFrame。"""
+    out = _Collected([], {name: [] for name in _PHASE_COLUMNS}, {name: [] for name in _PHASE_FIELDS},
+                     {name: [] for name in _TRANSFER_FIELDS}, [])
+    for path in files:
+        pid = protocol_id(path)
+        out.protocols.append(pid)
+        for p, d in enumerate(read_phases(path), start=1):
+            template = d.get("template", "transfer")
+            for name, value in zip(_PHASE_COLUMNS, (pid, p, template, TEMPLATE_MODULE.get(template, ""),
+                                                    module_seconds(d))):
+                out.phase_cols[name].append(value)
+            for name in _PHASE_FIELDS:
+                out.fields[name].append(first(d.get(name)))
+            n = max(len(d.get("sources") or []), len(d.get("targets") or []))
+            out.counts.append(n)
+            for name in _TRANSFER_FIELDS:
+                out.transfers[name].extend(_padded(d.get(name), n))
+    return out
+
+
+def _frame(c: _Collected) -> pd.DataFrame:
+    counts = np.asarray(c.counts, dtype="int64")
+    of_phase = np.repeat(np.arange(len(counts)), counts)   # 每个 transfer 属于第几个 phase
+    starts = np.cumsum(counts) - counts
+
+    def per_transfer(values: list) -> np.ndarray:
+        return np.asarray(values, dtype=object)[of_phase]
+
+    data: Dict[str, Any] = {
+        "protocol": per_transfer(c.phase_cols["protocol"]),
+        "template": per_transfer(c.phase_cols["template"]),
+        "phase": per_transfer(c.phase_cols["phase"]),
+        "step": np.arange(len(of_phase)) - starts[of_phase],
+    }
+    for name, (prefix, key) in CONTAINER_FIELDS.items():
+        containers = pd.DataFrame.from_records([x or {} for x in c.transfers[name]],
+                                               columns=["well", key, "slot"])
+        data[f"{prefix}_well"] = containers["well"].fillna("")
+        data[tip_column(prefix, key)] = containers[key].fillna("")
+        data[f"{prefix}_slot"] = containers["slot"]
+    for name, column in VALUE_FIELDS.items():
+        data[column] = per_transfer(c.fields[name]) if name == "mix_times" else c.transfers[name]
+    for name in _PHASE_FIELDS:
+        if name != "mix_times":
+            data[name] = per_transfer(c.fields[name])
+    df = pd.DataFrame(data, index=pd.RangeIndex(len(of_phase)))
+    df["touch_tip"] = df["touch_tip"].fillna(False).astype(bool)
+    df["is_96_well"] = df["is_96_well"].fillna(False).astype(bool)
+    df["spread"] = df["spread"].fillna("").replace("", "wide")
+    df["mix_stage"] = df["mix_stage"].fillna("").replace("", "none")
+    df["mix_times"] = pd.to_numeric(df["mix_times"], errors="coerce").fillna(0)
+    for name, dtype in COLUMNS:
+        if name not in df:
+            continue
+        if dtype == "float64":
+            df[name] = pd.to_numeric(df[name], errors="coerce").astype("float64")
+        elif dtype == "int64":
+            df[name] = pd.to_numeric(df[name], errors="coerce").fillna(-1).astype("int64")
+        else:
+            df[name] = df[name].astype(dtype)
+    df["protocol"] = pd.Categorical(df["protocol"], categories=list(dict.fromkeys(c.protocols)))
+    df["template"] = df["template"].astype("category")
+    return df
+
+
+def read_actions(log_files: Iterable[Path]) -> pd.DataFrame:
+    """日志里每个顶层步骤的首词（Aspirating / Dispensing / Picking ...）按 protocol 计数。"""
+    pids, lines = [], []
+    for path in log_files:
+        pid = protocol_id(Path(path))
+        text = Path(path).read_text(encoding="utf-8", errors="replace")
+        for line in text.splitlines():
+            if line[:1].isspace() or line.startswith("~~"):
+                continue
+            pids.append(pid)
+            lines.append(line)
+    s = pd.Series(lines, dtype="string").str.strip()
+    keep = (s.str.len() > 0) & ~s.str.contains("--", regex=False) & ~s.str.endswith(":") \
+        & ~s.str.startswith(EXCLUDED_PREFIXES)
+    frame = pd.DataFrame({"protocol": pd.Series(pids, dtype="string")[keep],
+                          "line": s[keep]})
+    frame["action"] = frame["line"].str.split(n=1).str[0]
+    for module, pattern in MODULE_PATTERNS.items():
+        frame[module] = frame["line"].str.contains(pattern, regex=True)
+    return frame
+
+
+# ---------------------------------------------------------------
+# CORPUS --------------------------------------------------------
+# ---------------------------------------------------------------
+
+
+@dataclass
+class Corpus:
+    transfers: pd.DataFrame
+    phases: pd.DataFrame
+    log_lines: Optional[pd.DataFrame] = None
+    protocols: Optional[List[str]] = None   # 所有输入的 protocol，包括没有 phase 的空文件
+
+    def __post_init__(self):
+        if self.protocols is None:
+            self.protocols = list(dict.fromkeys(self.phases["protocol"]))
+
+    # ---- statistics ----
+
+    def action_frequencies(self) -> pd.DataFrame:
+        """(action, protocols, count)，按 count 降序。没有日志时从 phase 推断 transfer / mix / touch_tip。"""
+        if self.log_lines is not None and len(self.log_lines):
+            g = self.log_lines.groupby("action")
+            out = pd.DataFrame({"count": g.size(), "protocols": g["protocol"].nunique()})
+        else:
+            t = self.transfers
+            out = pd.DataFrame({
+                "count": [len(t), int((t["mix_times"] > 0).sum()), int(t["touch_tip"].sum())],
+                "protocols": [t["protocol"].nunique(),
+                              t.loc[t["mix_times"] > 0, "protocol"].nunique(),
+                              t.loc[t["touch_tip"], "protocol"].nunique()],
+            }, index=pd.Index(["Transferring", "Mixing", "Touching"], name="action"))
+        return out.sort_values("count", ascending=False)
+
+    def volume_distribution(self) -> pd.DataFrame:
+        """每种移液器的吸液体积分布。"""
+        t = self.transfers.dropna(subset=["asp_vol"])
+        q = t.groupby("pipette", observed=True)["asp_vol"].describe(percentiles=[0.1, 0.5, 0.9])
+        return q.rename(columns={"count": "transfers"})
+
+    def tips_per_protocol(self) -> pd.DataFrame:
+        t = self.transfers
+        used = t[t["tip_well"] != ""]
+        out = pd.DataFrame({
+            "tips": used.groupby("protocol", observed=False).size(),
+            "transfers": t.groupby("protocol", observed=False).size(),
+        })
+        out["tips_per_transfer"] = out["tips"] / out["transfers"].where(out["transfers"] > 0)
+        return out.sort_values("tips", ascending=False)
+
+    def module_usage(self) -> pd.DataFrame:
+        """每种模块：用到它的 protocol 数，以及 phase 数（来自 template）/ 日志行数。"""
+        modules = list(MODULE_PATTERNS)
+        ph = self.phases[self.phases["module"] != ""]
+        out = pd.DataFrame(index=pd.Index(modules, name="module"))
+        out["phases"] = ph.groupby("module").size().reindex(modules, fill_value=0)
+        proto = ph.groupby("module")["protocol"].nunique().reindex(modules, fill_value=0)
+        if self.log_lines is not None and len(self.log_lines):
+            lines = self.log_lines[modules]
+            out["log_lines"] = lines.sum().reindex(modules).astype("int64")
+            from_logs = lines.groupby(self.log_lines["protocol"]).any().sum().reindex(modules)
+            proto = proto.combine(from_logs, max)
+        out["protocols"] = proto.astype("int64")
+        return out
+
+    def multichannel_share(self) -> Dict[str, float]:
+        """可以改用 8 通道 / 96 头的 transfer phase 占比（按 phase 数和按 transfer 数）。"""
+        p = self.phases[self.phases["transfers"] > 0]
+        if p.empty:
+            return {"phases": 0, "multichannel_phases": 0.0, "multichannel_transfers": 0.0,
+                    "head96_phases": 0.0, "head96_transfers": 0.0}
+        n = p["transfers"]
+        return {
+            "phases": int(len(p)),
+            "multichannel_phases": float(p["multichannel"].mean()),
+            "multichannel_transfers": float(n[p["multichannel"]].sum() / n.sum()),
+            "head96_phases": float(p["head96"].mean()),
+            "head96_transfers": float(n[p["head96"]].sum() / n.sum()),
+        }
+
+    def runtime(self) -> pd.DataFrame:
+        """
+        每个 protocol 的估计耗时（秒，含模块 phase 的加热 / 振荡 / 磁吸等待），
+        以及可用 8 通道的 phase 都换成 8 通道后的估计。没有 phase 的 protocol 为 0。
+        """
+        g = self.phases.groupby("protocol")
+        out = pd.DataFrame({
+            "seconds": g["seconds"].sum(),
+            "seconds_multichannel": g["seconds_multichannel"].sum(),
+        }).reindex(pd.Index(self.protocols, name="protocol"), fill_value=0.0)
+        out["saving"] = 1 - out["seconds_multichannel"] / out["seconds"].where(out["seconds"] > 0)
+        return out.sort_values("seconds", ascending=False)
+
+    def summary(self) -> Dict[str, Any]:
+        rt = self.runtime()
+        return {
+            "protocols": len(self.protocols),
+            "phases": int(len(self.phases)),
+            "transfers": int(len(self.transfers)),
+            "actions": self.action_frequencies()["count"].to_dict(),
+            "volume_by_pipette": self.volume_distribution().round(3).to_dict(orient="index"),
+            "tips": self.tips_per_protocol()["tips"].describe().round(3).to_dict(),
+            "modules": self.module_usage().to_dict(orient="index"),
+            "multichannel": self.multichannel_share(),
+            "runtime_hours": {
+                "total": float(rt["seconds"].sum() / 3600),
+                "total_multichannel": float(rt["seconds_multichannel"].sum() / 3600),
+                "median_per_protocol": float(rt["seconds"].median() / 3600) if len(rt) else 0.0,
+            },
+        }
+
+
+def _annotate(transfers: pd.DataFrame, phase_cols: Dict[str, list],
+              op_seconds: Dict[str, float]) -> pd.DataFrame:
+    """按 phase 聚合 transfers，算 8 通道 / 96 头可行性和耗时估计（全部向量化）。"""
+    t = transfers
+    key = ["protocol", "phase"]
+    rows = {w: rc[0] for w, rc in WELL_ROWCOL.items()}
+    cols = {w: rc[1] for w, rc in WELL_ROWCOL.items()}
+    pos = t["step"] % CHANNELS
+    block = t["step"] // CHANNELS
+    gkey = [t["protocol"], t["phase"], block]
+
+    def column_pattern(prefix: str) -> pd.Series:
+        # 每 8 个 transfer 一组：要么是同一列 A..H，要么是同一个孔（储液槽）
+        well = t[f"{prefix}_well"].astype(object)
+        row, col = well.map(rows), well.map(cols)
+        one_column = (row == pos) & (col.groupby(gkey).transform("nunique") == 1)
+        one_well = well.groupby(gkey).transform("nunique") == 1
+        return one_column | one_well
+
+    t = t.assign(_ok=column_pattern("source") & column_pattern("target"),
+                 _tip=t["tip_well"] != "",
+                 _delay=t["delay_s"].fillna(0.0),
+                 _mix=t["mix_times"] * t["mix_stage"].map({"both": 2}).fillna(1).where(t["mix_times"] > 0, 0))
+    g = t.groupby(key, observed=True)
+    agg = pd.DataFrame({
+        "transfers": g.size(),
+        "tips": g["_tip"].sum(),
+        "pipette": g["pipette"].first(),
+        "asp_vol": g["asp_vol"].first(),
+        "is_96_well": g["is_96_well"].any(),
+        "mix_reps": g["_mix"].sum(),
+        "delay_s": g["_delay"].sum(),
+        "all_ok": g["_ok"].all(),
+    }).reset_index()
+    agg["protocol"] = agg["protocol"].astype(str)
+
+    phases = pd.DataFrame(phase_cols).astype({"protocol": str, "phase": "int64", "module_s": "float64"})
+    phases = phases.merge(agg, on=key, how="left")
+    phases["transfers"] = phases["transfers"].fillna(0).astype("int64")
+    phases["tips"] = phases["tips"].fillna(0).astype("int64")
+    phases["mix_reps"] = phases["mix_reps"].fillna(0).astype("int64")
+    phases["delay_s"] = phases["delay_s"].fillna(0.0)
+    n = phases["transfers"]
+    full_blocks = (n > 0) & (n % CHANNELS == 0)
+    phases["multichannel"] = (full_blocks & phases["all_ok"].fillna(False).astype(bool)) | phases["is_96_well"].fillna(False).astype(bool)
+    phases["head96"] = phases["is_96_well"].fillna(False).astype(bool) | (phases["multichannel"] & (n % 96 == 0) & (n > 0))
+
+    liquid = op_seconds["aspirate"] + op_seconds["dispense"]
+    tip = op_seconds["pick_up_tips"] + op_seconds["drop_tips"]
+    # 等待（delay、模块运行时间）不会因为换成 8 通道而变短
+    wait = phases["delay_s"] + phases["module_s"]
+    phases["seconds"] = (n + phases["mix_reps"]) * liquid + phases["tips"] * tip + wait
+    div = phases["multichannel"].map({True: CHANNELS, False: 1})
+    phases["seconds_multichannel"] = ((n + phases["mix_reps"]) * liquid + phases["tips"] * tip) / div + wait
+    return phases.drop(columns=["all_ok"])
+
+
+def load_corpus(phase_files: Iterable, log_files: Iterable = (),
+                op_seconds: Optional[Dict[str, float]] = None) -> Corpus:
+    files = [Path(f) for f in phase_files]
+    collected = _collect(files)
+    transfers = _frame(collected)
+    # merge 后的 phase 只有第一个 transfer 带枪头盒：整个 phase 用同一支移液器
+    rack = transfers["tip_rack"].where(transfers["tip_rack"] != "")
+    rack = rack.groupby([transfers["protocol"], transfers["phase"]], observed=True).transform("first")
+    transfers["pipette"] = rack.fillna("").map(pipette_for_tip_rack).astype("category")
+    phases = _annotate(transfers, collected.phase_cols, op_seconds or DEFAULT_OP_SECONDS)
+    logs = [Path(f) for f in log_files]
+    return Corpus(transfers, phases, read_actions(logs) if logs else None,
+                  protocols=list(dict.fromkeys(collected.protocols)))
+
+
+def _expand(paths: List[str], pattern: str) -> List[Path]:
+    out: List[Path] = []
+    for p in map(Path, paths):
+        out.extend(sorted(p.glob(pattern)) if p.is_dir() else [p])
+    return [p for p in out if not p.name.endswith(".idx.json")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="corpus-wide statistics over parsed phase files")
+    parser.add_argument("phases", nargs="+", help="phase json 文件或目录（目录下所有 *.json）")
+    parser.add_argument("--logs", nargs="*", default=[], help="日志文件或目录（目录下所有 *.log）")
+    parser.add_argument("--out", help="把 summary 写成 JSON")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    corpus = load_corpus(_expand(args.phases, "*.json"), _expand(args.logs, "*.log"))
+    summary = corpus.summary()
+    summary["seconds_to_compute"] = round(time.perf_counter() - start, 3)
+    text = json.dumps(summary, indent=2, ensure_ascii=False, default=str)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
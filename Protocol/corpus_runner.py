@@ -0,0 +1,172 @@
+"""
+可断点续跑的批量 parse_protocol。
+
+每次尝试前先往 journal（JSON Lines）追加一条 started 并 fsync，结束后再追加 done / failed：
+
+    {"id": ..., "input_hash": ..., "status": "started" | "done" | "failed", "attempt": n,
+     "outputs": [...], "error": ..., "seconds": ..., "time": ...}
+
+重新运行时读 journal，同一个 id 以最后一条为准：
+- done 且输入哈希没变、输出文件都在 -> 跳过；
+- failed，或只有 started（进程在这次尝试里被杀掉 / 段错误 / OOM）-> 重试，
+  同一份输入累计最多 max_attempts 次，硬崩溃也算一次；
+- 输入（log 或 labware json）变了 -> 当作新任务，尝试次数重新计。
+输出由 parse_protocol 经 file_io 写临时文件再 rename（内容没变时不写），崩溃时不会留下半个文件。
+
+    python corpus_runner.py                          # success/ 下所有 *.ot2.apiv2.log
+    python corpus_runner.py name1 name2 --max-attempts 5
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import sys
+import time
+import traceback
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from file_io import append_line_synced, file_sha256
+
+HERE = Path(__file__).resolve().parent
+LOG_SUFFIX = ".ot2.apiv2.log"
+
+
+def load_converter(path: Path = HERE / "protocol_converter_5.15.py"):
+    """文件名里有点号，不能直接 import；按路径加载（它 import 的 protocol_ir / file_io / shared 就在本目录）。"""
+    spec = importlib.util.spec_from_file_location("protocol_converter_5_15", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@dataclass
+class JournalEntry:
+    id: str
+    input_hash: str
+    status: str  # started / done / failed
+    attempt: int
+    outputs: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    seconds: float = 0.0
+    time: float = 0.0
+
+
+class Journal:
+    """追加写、逐条 fsync 的 checkpoint 文件。最后一行写了一半（崩溃）时忽略它。"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.last: Dict[str, JournalEntry] = {}
+        self.attempts: Dict[tuple, int] = {}  # (id, input_hash) -> 已开始的尝试次数
+        if self.path.exists():
+            for line in self.path.read_text(encoding="utf-8").splitlines():
+                try:
+                    entry = JournalEntry(**json.loads(line))
+                except (ValueError, TypeError):
+                    continue
+                self._apply(entry)
+
+    def _apply(self, entry: JournalEntry):
+        self.last[entry.id] = entry
+        if entry.status in ("started", "failed"):
+            # 按 attempt 编号取最大值：started 和它的 failed 只算一次，没有 started 的旧 journal 也能用
+            key = (entry.id, entry.input_hash)
+            self.attempts[key] = max(self.attempts.get(key, 0), entry.attempt)
+
+    def append(self, entry: JournalEntry):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        append_line_synced(self.path, json.dumps(entry.__dict__, ensure_ascii=False))
+        self._apply(entry)
+
+    def is_done(self, pid: str, input_hash: str) -> bool:
+        entry = self.last.get(pid)
+        return (entry is not None and entry.status == "done" and entry.input_hash == input_hash
+                and all(Path(p).exists() for p in entry.outputs))
+
+    def attempts_made(self, pid: str, input_hash: str) -> int:
+        return self.attempts.get((pid, input_hash), 0)
+
+
+class CorpusRunner:
+    def __init__(self, success_dir="success", builds_dir="../../Protocols/protoBuilds",
+                 graph_dir="graph_protocol", journal="graph_protocol/corpus_journal.jsonl",
+                 max_attempts: int = 3, verbose: bool = False, converter=None):
+        self.success_dir = Path(success_dir)
+        self.builds_dir = Path(builds_dir)
+        self.graph_dir = Path(graph_dir)
+        self.journal = Journal(journal)
+        self.max_attempts = max_attempts
+        self.verbose = verbose
+        self.converter = converter or load_converter()
+
+    def inputs(self, pid: str) -> List[Path]:
+        return [self.success_dir / f"{pid}{LOG_SUFFIX}",
+                self.builds_dir / pid / f"{pid}.ot2.apiv2.py.json"]
+
+    def discover(self) -> List[str]:
+        return sorted(p.name[:-len(LOG_SUFFIX)] for p in self.success_dir.glob(f"*{LOG_SUFFIX}"))
+
+    def run_one(self, pid: str) -> str:
+        """处理一个 protocol，返回 skipped / done / failed / gave_up。"""
+        try:
+            input_hash = file_sha256(*self.inputs(pid))
+        except OSError as e:
+            input_hash = f"missing: {e.filename}"
+        if self.journal.is_done(pid, input_hash):
+            return "skipped"
+
+        while self.journal.attempts_made(pid, input_hash) < self.max_attempts:
+            attempt = self.journal.attempts_made(pid, input_hash) + 1
+            # 先落盘再跑：这次尝试把进程带崩了，下次启动时也计入次数
+            self.journal.append(JournalEntry(pid, input_hash, "started", attempt, time=time.time()))
+            start = time.perf_counter()
+            try:
+                # parse_protocol 会 print 整个 phase 列表；批量时默认不输出
+                with contextlib.redirect_stdout(sys.stdout if self.verbose else io.StringIO()):
+                    outputs = self.converter.parse_protocol(
+                        pid, success_dir=str(self.success_dir),
+                        builds_dir=str(self.builds_dir), graph_dir=str(self.graph_dir))
+            except Exception as e:
+                self.journal.append(JournalEntry(
+                    pid, input_hash, "failed", attempt,
+                    error="".join(traceback.format_exception_only(type(e), e)).strip(),
+                    seconds=time.perf_counter() - start, time=time.time()))
+                continue
+            self.journal.append(JournalEntry(
+                pid, input_hash, "done", attempt, outputs=[str(p) for p in outputs],
+                seconds=time.perf_counter() - start, time=time.time()))
+            return "done"
+        return "gave_up"
+
+    def run(self, ids: Optional[Iterable[str]] = None) -> Dict[str, List[str]]:
+        results: Dict[str, List[str]] = {}
+        for pid in ids or self.discover():
+            status = self.run_one(pid)
+            results.setdefault(status, []).append(pid)
+            print(f"[{status}] {pid}")
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("ids", nargs="*", help="protocol 名；默认 success/ 下所有 log")
+    parser.add_argument("--success-dir", default="success")
+    parser.add_argument("--builds-dir", default="../../Protocols/protoBuilds")
+    parser.add_argument("--graph-dir", default="graph_protocol")
+    parser.add_argument("--journal", default="graph_protocol/corpus_journal.jsonl")
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    runner = CorpusRunner(args.success_dir, args.builds_dir, args.graph_dir, args.journal,
+                          max_attempts=args.max_attempts, verbose=args.verbose)
+    results = runner.run(args.ids)
+    print(", ".join(f"{k}: {len(v)}" for k, v in sorted(results.items())))
+    return 1 if results.get("gave_up") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,367 @@
+"""
+Typed phase table：merge_same_slot_phases 输出的 phase 列表 <-> 一行一个 transfer 的表格。
+
+旧格式（protocol_N.csv）每个 phase 是一列、每一行是一个位置字段，sources/targets 等单元格是
+Python repr 字符串，读回时要逐格 ast.literal_eval。这里改为固定列、固定类型：
+
+    列名                  类型     说明
+    phase                int      phase 序号（从 1 开始）
+    step                 int      phase 内第几个 transfer（从 0 开始）
+    asp_vol              float    吸液体积 uL
+    disp_vol             float    排液体积 uL
+    source_well          str      源孔，例如 A1
+    source_labware       str      源器材显示名
+    source_slot          int      源槽位（缺失为 -1）
+    target_well          str
+    target_labware       str
+    target_slot          int
+    tip_well             str      取枪头的位置（缺失为空）
+    tip_rack             str
+    tip_slot             int
+    asp_flow_rate        float    uL/s
+    dis_flow_rate        float    uL/s
+    blow_out_air_volume  float    uL
+    delay_s              float    吸液后的等待秒数
+    touch_tip            bool
+    is_96_well           bool
+    spread               str
+    mix_stage            str      none / before / after / both
+    mix_times            int
+    mix_vol              float
+    mix_rate             float
+    layout               str      各列表字段的形状（见 LAYOUT_FIELDS），同一 phase 每行相同
+
+一个 phase 的行数是 sources / targets / tip_racks 以及各个按 transfer 取值的字段里最长的那个；
+第 i 行放每个字段的第 i 个值（标量字段每行相同）。layout 按 LAYOUT_FIELDS 的顺序记下每个字段
+是 None（-）、标量（s）还是长度为 N 的列表（N），所以 rows_to_phases / table_to_phases 能把
+phase 原样还原：各列表保持原长度，全 None 的 delays 也还是列表。
+use_channels / offsets / liquid_height / mix_liquid_height 解析端总是 None，表里不存。
+
+缺失的浮点数为空（读入后是 NaN），缺失的整数为 -1。默认写普通 CSV（只依赖标准库）；
+后缀为 .parquet 或 .arrow/.feather 时通过 pandas + pyarrow 写列式文件。
+读入用 read_phase_table：一次带 dtype 的列式读取，不做逐格 eval。
+
+    python phase_table.py protocol_7.csv            # 旧格式 -> protocol_7.phases.csv
+"""
+import ast
+import csv
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+COLUMNS = [
+    ("phase", "int64"),
+    ("step", "int64"),
+    ("asp_vol", "float64"),
+    ("disp_vol", "float64"),
+    ("source_well", "string"),
+    ("source_labware", "string"),
+    ("source_slot", "int64"),
+    ("target_well", "string"),
+    ("target_labware", "string"),
+    ("target_slot", "int64"),
+    ("tip_well", "string"),
+    ("tip_rack", "string"),
+    ("tip_slot", "int64"),
+    ("asp_flow_rate", "float64"),
+    ("dis_flow_rate", "float64"),
+    ("blow_out_air_volume", "float64"),
+    ("delay_s", "float64"),
+    ("touch_tip", "bool"),
+    ("is_96_well", "bool"),
+    ("spread", "string"),
+    ("mix_stage", "string"),
+    ("mix_times", "int64"),
+    ("mix_vol", "float64"),
+    ("mix_rate", "float64"),
+    ("layout", "string"),
+]
+COLUMN_NAMES = [name for name, _ in COLUMNS]
+DTYPES = dict(COLUMNS)
+
+# 旧 protocol_N.csv 的行顺序 = build_transfer_liquid_dict_complete 返回的 key 顺序
+LEGACY_FIELDS = [
+    "asp_vols", "disp_vols", "sources", "targets", "tip_racks", "use_channels",
+    "asp_flow_rates", "dis_flow_rates", "offsets", "touch_tip", "liquid_height",
+    "blow_out_air_volume", "spread", "is_96_well", "mix_stage", "mix_times",
+    "mix_vol", "mix_rate", "mix_liquid_height", "delays",
+]
+# 按 transfer 取值的字段 -> 列（容器字段展开成 _well / _labware(_rack) / _slot 三列）
+CONTAINER_FIELDS = {"sources": ("source", "labware"), "targets": ("target", "labware"), "tip_racks": ("tip", "type")}
+VALUE_FIELDS = {
+    "asp_vols": "asp_vol",
+    "disp_vols": "disp_vol",
+    "asp_flow_rates": "asp_flow_rate",
+    "dis_flow_rates": "dis_flow_rate",
+    "blow_out_air_volume": "blow_out_air_volume",
+    "delays": "delay_s",
+    "mix_times": "mix_times",
+}
+LAYOUT_FIELDS = list(CONTAINER_FIELDS) + list(VALUE_FIELDS)
+# 解析端总是 None 的字段
+UNSTORED_FIELDS = ("use_channels", "offsets", "liquid_height", "mix_liquid_height")
+
+
+def first(value) -> Any:
+    """[x] -> x，标量原样返回，空/None -> None。"""
+    if isinstance(value, (list, tuple)):
+        return value[0] if value else None
+    return value
+
+
+def _at(value, i: int) -> Any:
+    """按 transfer 下标取值：列表取第 i 个（不够长取 None），标量对所有 transfer 相同。"""
+    if isinstance(value, (list, tuple)):
+        return value[i] if i < len(value) else None
+    return value
+
+
+def _num(value) -> str:
+    return "" if value is None else repr(float(value))
+
+
+def _int(value) -> str:
+    return "-1" if value is None else str(int(value))
+
+
+def _shape(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, (list, tuple)):
+        return str(len(value))
+    return "s"
+
+
+def _rebuild(shape: str, values: List[Any]) -> Any:
+    """layout 里的一个形状 + 各行的值 -> 原字段值。"""
+    if shape == "-":
+        return None
+    if shape == "s":
+        return values[0]
+    return list(values[:int(shape)])
+
+
+def tip_column(prefix: str, key: str) -> str:
+    """容器字段 key（labware / type）在表里的列名；枪头盒只有一列 tip_rack。"""
+    return "tip_rack" if prefix == "tip" else f"{prefix}_{key}"
+
+
+def phases_to_rows(phases: List[Dict]) -> List[Dict[str, Any]]:
+    """
+    phase 字典列表 -> 一行一个 transfer 的行（值已格式化为 CSV 文本）。
+    只存 LEGACY_FIELDS；其它 key（5.15 的 template / 模块参数）不在表里。
+    """
+    rows = []
+    for p, d in enumerate(phases, start=1):
+        for name in UNSTORED_FIELDS:
+            if d.get(name) is not None:
+                raise ValueError(f"phase {p}: {name}={d[name]!r} cannot be stored in a phase table")
+        layout = ",".join(_shape(d.get(name)) for name in LAYOUT_FIELDS)
+        n = max([len(d[name]) for name in LAYOUT_FIELDS if isinstance(d.get(name), (list, tuple))] + [1])
+        for i in range(n):
+            row = {"phase": str(p), "step": str(i)}
+            for name, (prefix, key) in CONTAINER_FIELDS.items():
+                c = _at(d.get(name), i) or {}
+                row[f"{prefix}_well"] = c.get("well", "")
+                row[tip_column(prefix, key)] = c.get(key, "")
+                row[f"{prefix}_slot"] = _int(c.get("slot"))
+            for name, column in VALUE_FIELDS.items():
+                value = _at(d.get(name), i)
+                row[column] = _int(value) if DTYPES[column] == "int64" else _num(value)
+            row.update({
+                "touch_tip": str(bool(d.get("touch_tip"))),
+                "is_96_well": str(bool(d.get("is_96_well"))),
+                "spread": d.get("spread") or "",
+                "mix_stage": d.get("mix_stage") or "",
+                "mix_vol": _num(d.get("mix_vol")),
+                "mix_rate": _num(d.get("mix_rate")),
+                "layout": layout,
+            })
+            rows.append(row)
+    return rows
+
+
+def _parse_text_row(row: Dict[str, str]) -> Dict[str, Any]:
+    """phases_to_rows 的文本行 -> 与 DataFrame 记录相同的类型化值（缺失为 None）。"""
+    typed = {}
+    for name, dtype in COLUMNS:
+        text = row.get(name, "")
+        if dtype == "float64":
+            typed[name] = float(text) if text != "" else None
+        elif dtype == "int64":
+            typed[name] = None if text in ("", "-1") else int(text)
+        elif dtype == "bool":
+            typed[name] = text == "True"
+        else:
+            typed[name] = text
+    return typed
+
+
+def _phase_from_rows(rows: List[Dict[str, Any]]) -> Dict:
+    """一个 phase 的类型化行（按 step 排好）-> LEGACY_FIELDS 顺序的 phase 字典。"""
+    head = rows[0]
+    layout = (head.get("layout") or "").split(",")
+    if len(layout) != len(LAYOUT_FIELDS):
+        # 没有 layout 列的旧表：每个字段都当作按行排列的列表
+        layout = [str(len(rows))] * len(LAYOUT_FIELDS)
+    shapes = dict(zip(LAYOUT_FIELDS, layout))
+    d: Dict[str, Any] = {}
+    for name, (prefix, key) in CONTAINER_FIELDS.items():
+        containers = [{"well": r[f"{prefix}_well"], key: r[tip_column(prefix, key)], "slot": r[f"{prefix}_slot"]}
+                      for r in rows]
+        d[name] = _rebuild(shapes[name], containers)
+    for name, column in VALUE_FIELDS.items():
+        d[name] = _rebuild(shapes[name], [r[column] for r in rows])
+    d.update({
+        "touch_tip": bool(head["touch_tip"]),
+        "is_96_well": bool(head["is_96_well"]),
+        "spread": head["spread"] or None,
+        "mix_stage": head["mix_stage"] or None,
+        "mix_vol": head["mix_vol"],
+        "mix_rate": head["mix_rate"],
+    })
+    for name in UNSTORED_FIELDS:
+        d[name] = None
+    return {name: d[name] for name in LEGACY_FIELDS}
+
+
+def rows_to_phases(rows: List[Dict[str, str]]) -> List[Dict]:
+    """phases_to_rows 的逆操作：rows_to_phases(phases_to_rows(x)) == x（只看 LEGACY_FIELDS）。"""
+    phases: Dict[int, List[Dict[str, Any]]] = {}
+    for row in map(_parse_text_row, rows):
+        phases.setdefault(row["phase"], []).append(row)
+    return [_phase_from_rows(sorted(g, key=lambda r: r["step"])) for _, g in sorted(phases.items())]
+
+
+def write_phase_table(phases: List[Dict], path) -> Path:
+    """写 typed phase table；后缀 .parquet / .arrow / .feather 时需要 pandas + pyarrow。"""
+    path = Path(path)
+    rows = phases_to_rows(phases)
+    if path.suffix in (".parquet", ".arrow", ".feather"):
+        df = _frame_from_text_rows(rows)
+        if path.suffix == ".parquet":
+            df.to_parquet(path, index=False)
+        else:
+            df.to_feather(path)
+        return path
+    with path.open("w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMN_NAMES)
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def _frame_from_text_rows(rows: List[Dict[str, str]]):
+    import io
+
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=COLUMN_NAMES)
+    writer.writeheader()
+    writer.writerows(rows)
+    buf.seek(0)
+    return _read_csv(buf)
+
+
+def _read_csv(source):
+    import pandas as pd
+
+    # 空串只在浮点列里表示缺失；字符串列的空串保持为空串
+    return pd.read_csv(source, dtype=DTYPES, keep_default_na=False,
+                       na_values={name: [""] for name, t in COLUMNS if t == "float64"})
+
+
+def read_phase_table(path):
+    """一次列式读取，返回按 COLUMNS 定好类型的 pandas DataFrame。"""
+    import pandas as pd
+
+    path = Path(path)
+    if path.suffix == ".parquet":
+        df = pd.read_parquet(path)
+    elif path.suffix in (".arrow", ".feather"):
+        df = pd.read_feather(path)
+    else:
+        return _read_csv(path)
+    return df.astype(DTYPES)
+
+
+def table_to_phases(df) -> List[Dict]:
+    """DataFrame -> merge_same_slot_phases 同结构的 phase 字典（供执行端使用），与 rows_to_phases 一致。"""
+    def typed(record: Dict[str, Any]) -> Dict[str, Any]:
+        out = {}
+        for name, dtype in COLUMNS:
+            value = record.get(name)
+            if dtype == "float64":
+                out[name] = None if value is None or value != value else float(value)  # NaN -> None
+            elif dtype == "int64":
+                out[name] = None if value is None or int(value) == -1 else int(value)
+            elif dtype == "bool":
+                out[name] = bool(value)
+            else:
+                out[name] = "" if value is None or value != value else str(value)
+        return out
+
+    return [_phase_from_rows([typed(r) for r in g.to_dict("records")])
+            for _, g in df.sort_values(["phase", "step"]).groupby("phase", sort=True)]
+
+
+def read_legacy_csv(path) -> List[Dict]:
+    """读旧的 protocol_N.csv（phase 为列，单元格为 repr 字符串）。只用于迁移。"""
+    with Path(path).open(newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    header, body = rows[0], rows[1:]
+    phases = []
+    for col in range(len(header)):
+        d = {}
+        for field, row in zip(LEGACY_FIELDS, body):
+            cell = row[col] if col < len(row) else ""
+            if cell == "":
+                d[field] = None
+            elif field in ("spread", "mix_stage"):
+                d[field] = cell
+            else:
+                d[field] = ast.literal_eval(cell)
+        phases.append(d)
+    return phases
+
+
+def _cell(value):
+    # Protocol.py 经 DataFrame 导出时，部分列表单元格可能是 repr 字符串
+    if isinstance(value, str) and value[:1] in "[{(":
+        try:
+            return ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return value
+    return value
+
+
+def read_phase_json(path) -> List[Dict]:
+    """
+    读 JSON 格式的 phase 文件，两种都支持：
+    - Protocol.py 写的 {"Phase N": [按 LEGACY_FIELDS 排列的值]}；
+    - protocol_converter_5.15 写的 phase dict 列表（带 template，含模块 phase）。
+    """
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    if isinstance(data, dict):
+        phases = [dict(zip(LEGACY_FIELDS, v)) if isinstance(v, list) else v for v in data.values()]
+    else:
+        phases = list(data)
+    return [{k: _cell(v) for k, v in d.items()} for d in phases]
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("usage: python phase_table.py protocol_N.csv [...]")
+        return 2
+    for name in argv:
+        src = Path(name)
+        dst = src.with_suffix(".phases.csv")
+        phases = read_legacy_csv(src)
+        write_phase_table(phases, dst)
+        print(f"{src} -> {dst} ({len(phases_to_rows(phases))} transfers, {len(phases)} phases)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
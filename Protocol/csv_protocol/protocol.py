@@ -551,6 +551,7 @@ sorted_actions
 
 import re
 from typing import List, Dict, Optional, Union, Sequence, Literal
+from shared import well_addressing  # 共用的孔位寻址表（define_action/well_addressing.py）
 
 def extract_float_after_keyword(text: str, keyword: str) -> Optional[float]:
     match = re.search(fr'{keyword} ([\d.]+)', text)
@@ -572,11 +573,7 @@ def extract_container_from_line(line: str, keyword: str) -> Optional[Dict[str, U
 
 def is_full_row(wells: List[str]) -> bool:
     """Returns True if all wells in a row (e.g., A1 to A12) are included"""
-    if len(wells) < 12:
-        return False
-    row = wells[0][0]
-    indices = sorted([int(w[1:]) for w in wells if w[0] == row])
-    return indices == list(range(1, 13))
+    return well_addressing.is_full_row(wells, cols=12)
 
 def build_transfer_liquid_dict_complete(step_lines: List[str]) -> Dict:
     asp_vols = []
@@ -744,7 +741,9 @@ outputs = [build_transfer_liquid_dict_complete(steps) for phase, steps in groupe
 outputs
 
 o = merge_same_slot_phases(outputs)
-ddf = pd.DataFrame({"Phase {}".format(i + 1): phase for i, phase in enumerate(o)})
 
-# Save the DataFrame to a CSV file
-ddf.to_csv("protocol_10.csv", index=False)
\ No newline at end of file
+# Save as a typed phase table: one row per transfer, fixed typed columns (see phase_table.py).
+# Read it back with phase_table.read_phase_table / table_to_phases.
+# Run from Protocol/ (python -m csv_protocol.protocol) so the package import resolves.
+from csv_protocol.phase_table import write_phase_table
+write_phase_table(o, "protocol_10.phases.csv")
\ No newline at end of file
@@ -0,0 +1,46 @@
+from pathlib import Path
+
+import pytest
+
+from csv_protocol.phase_table import (
+    phases_to_rows, read_legacy_csv, read_phase_json, read_phase_table, rows_to_phases, table_to_phases,
+    write_phase_table,
+)
+
+PROTOCOL_DIR = Path(__file__).resolve().parent.parent
+PHASE_FILES = sorted(PROTOCOL_DIR.glob("csv_protocol/protocol_*.csv")) + sorted(PROTOCOL_DIR.glob("json/*.json"))
+
+
+def _read(path: Path):
+    return read_legacy_csv(path) if path.suffix == ".csv" else read_phase_json(path)
+
+
+@pytest.mark.parametrize("path", PHASE_FILES, ids=lambda p: p.name)
+def test_rows_round_trip(path):
+    phases = _read(path)
+    assert rows_to_phases(phases_to_rows(phases)) == phases
+
+
+@pytest.mark.parametrize("path", PHASE_FILES, ids=lambda p: p.name)
+def test_table_round_trip(path, tmp_path):
+    pytest.importorskip("pandas")
+    phases = _read(path)
+    out = write_phase_table(phases, tmp_path / "phases.csv")
+    assert table_to_phases(read_phase_table(out)) == phases
+
+
+def test_lengths_survive_uneven_lists():
+    phases = rows_to_phases(phases_to_rows([{
+        "asp_vols": 10.0, "disp_vols": [5.0, 5.0], "sources": [{"well": "A1", "labware": "src", "slot": 1}],
+        "targets": [{"well": "A1", "labware": "dst", "slot": 2}, {"well": "B1", "labware": "dst", "slot": 2}],
+        "tip_racks": [{"well": w, "type": "tips", "slot": 3} for w in ("A1", "B1", "C1")],
+        "use_channels": None, "asp_flow_rates": [7.6], "dis_flow_rates": [7.6, 9.0], "offsets": None,
+        "touch_tip": True, "liquid_height": None, "blow_out_air_volume": [0.0], "spread": "wide",
+        "is_96_well": False, "mix_stage": "after", "mix_times": [3, 4], "mix_vol": 20.0, "mix_rate": None,
+        "mix_liquid_height": None, "delays": [None, None],
+    }]))
+    assert len(phases[0]["tip_racks"]) == 3
+    assert phases[0]["blow_out_air_volume"] == [0.0]
+    assert phases[0]["delays"] == [None, None]
+    assert phases[0]["mix_times"] == [3, 4]
+    assert phases[0]["asp_vols"] == 10.0
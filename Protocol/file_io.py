@@ -0,0 +1,118 @@
+"""
+解析流水线共用的文件写入工具。
+
+atomic_write_* 先写同目录下的临时文件、fsync，再 os.replace 到目标路径：
+进程中途崩溃时目标要么是旧内容、要么是完整的新内容，不会出现写了一半的文件。
+"""
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Union
+
+PathLike = Union[str, Path]
+
+
+def _fsync_dir(directory: Path):
+    # rename 本身的持久化；Windows 上不能打开目录，跳过
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_bytes(path: PathLike, data: bytes) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    _fsync_dir(path.parent)
+    return path
+
+
+def atomic_write_text(path: PathLike, text: str, encoding: str = "utf-8") -> Path:
+    return atomic_write_bytes(path, text.encode(encoding))
+
+
+def atomic_write_json(path: PathLike, obj: Any, **dump_kwargs) -> Path:
+    return atomic_write_text(path, dumps_json(obj, **dump_kwargs))
+
+
+def write_bytes_if_changed(path: PathLike, data: bytes) -> bool:
+    """
+    与已有文件内容（先比大小，再比 sha256）相同时不写，mtime 不变、下游 watcher 不会被触发；
+    否则原子写入。返回是否真的写了。
+    """
+    path = Path(path)
+    try:
+        same_size = path.stat().st_size == len(data)
+    except FileNotFoundError:
+        same_size = False
+    if same_size and _digest(path) == hashlib.sha256(data).hexdigest():
+        return False
+    atomic_write_bytes(path, data)
+    return True
+
+
+def write_text_if_changed(path: PathLike, text: str, encoding: str = "utf-8") -> bool:
+    return write_bytes_if_changed(path, text.encode(encoding))
+
+
+def dumps_json(obj: Any, **dump_kwargs) -> str:
+    """
+    流水线里统一的 JSON 序列化：indent=4、ASCII 转义、sort_keys。
+    key 排序后输出不依赖 dict 的构建顺序；列表（phase 列表、graph 的节点 / 边）保持构建顺序，
+    它们由解析代码按日志顺序生成（不经过 set），所以同样的输入总是得到逐字节相同的输出。
+    """
+    dump_kwargs.setdefault("indent", 4)
+    dump_kwargs.setdefault("sort_keys", True)
+    return json.dumps(obj, **dump_kwargs)
+
+
+def write_json_if_changed(path: PathLike, obj: Any, **dump_kwargs) -> bool:
+    return write_bytes_if_changed(path, dumps_json(obj, **dump_kwargs).encode("utf-8"))
+
+
+def _digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_sha256(*paths: PathLike) -> str:
+    """多个文件内容合在一起的 sha256（用于判断输入是否变化）。"""
+    h = hashlib.sha256()
+    for p in paths:
+        with open(p, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def append_line_synced(path: PathLike, line: str):
+    """追加一行并 fsync，返回时这一行已经落盘。"""
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line.rstrip("\n") + "\n")
+        f.flush()
+        os.fsync(f.fileno())
@@ -0,0 +1,243 @@
+"""
+按需读取 Protocol/json/*.ot2.apiv2.json（顶层是 {"Phase 1": [...], "Phase 2": [...]}）。
+
+有 sidecar 索引 <name>.idx.json（记录每个 "Phase N" 值的字节区间 [start, end)
+和建索引时文件的大小 / mtime）时，文件用 mmap 打开，取某个 phase 只对那一段字节做
+json.loads。没有索引或索引过期时直接整个文件 json.load（C 解析器一遍，比 Python
+逐字节扫描快得多），读路径上不建索引；索引用 build_index / 命令行预先生成。
+
+    with PhaseFile("json/111210-part-3.ot2.apiv2.json") as pf:
+        print(len(pf), pf.keys()[:3])
+        phase = pf.get("Phase 7", as_dict=True)   # 按 LEGACY_FIELDS 转成字段 dict
+
+    python phase_json.py json/*.ot2.apiv2.json     # 预先生成 sidecar 索引
+"""
+import json
+import mmap
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from file_io import atomic_write_text
+
+from csv_protocol.phase_table import LEGACY_FIELDS
+
+INDEX_SUFFIX = ".idx.json"
+INDEX_VERSION = 1
+
+# 扫描时只关心这些结构字符；其余字节（数字、字母、UTF-8 多字节）直接跳过
+_STRUCTURAL = re.compile(rb'[\\"\[\]{},:]')
+
+
+class PhaseIndexError(ValueError):
+    """文件不是顶层 object，或者结构不完整。"""
+
+
+def scan_top_level(buf) -> List[Tuple[str, int, int]]:
+    """
+    扫描顶层 object，返回 [(key, value_start, value_end)]，区间是字节偏移。
+    只跟踪字符串 / 转义 / 嵌套深度，不解码任何值。
+    """
+    entries: List[Tuple[str, int, int]] = []
+    depth = 0
+    in_string = False
+    escaped_at = -1  # 反斜杠后面那个字节的位置
+    string_start = -1
+    last_string: Optional[Tuple[int, int]] = None
+    key: Optional[str] = None
+    value_start = -1
+
+    for m in _STRUCTURAL.finditer(buf):
+        pos = m.start()
+        ch = buf[pos:pos + 1]
+        if in_string:
+            if pos == escaped_at:
+                continue
+            if ch == b"\\":
+                escaped_at = pos + 1
+            elif ch == b'"':
+                in_string = False
+                last_string = (string_start, pos + 1)
+            continue
+        if ch == b'"':
+            in_string = True
+            string_start = pos
+        elif ch in (b"{", b"["):
+            if depth == 0 and ch != b"{":
+                raise PhaseIndexError("top level is not a JSON object")
+            depth += 1
+        elif ch == b":" and depth == 1:
+            if last_string is None:
+                raise PhaseIndexError(f"missing key before ':' at byte {pos}")
+            key = json.loads(bytes(buf[last_string[0]:last_string[1]]).decode("utf-8"))
+            value_start = pos + 1
+        elif (ch == b"," and depth == 1) or (ch == b"}" and depth == 1):
+            if key is not None:
+                entries.append((key, value_start, pos))
+                key = None
+            if ch == b"}":
+                depth -= 1
+        elif ch in (b"}", b"]"):
+            depth -= 1
+    if depth != 0 or in_string:
+        raise PhaseIndexError("truncated JSON")
+    return entries
+
+
+def _stat_key(st: os.stat_result) -> Dict[str, int]:
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def sidecar_path(path: Union[str, Path]) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+def load_index(path: Union[str, Path],
+               st: Optional[os.stat_result] = None) -> Optional[Dict[str, Tuple[int, int]]]:
+    """
+    读 sidecar；不存在、版本不符或与文件大小 / mtime 不一致时返回 None。
+    st 是调用方打开文件后的 fstat，保证比较的是正要读的那个文件。
+    """
+    path = Path(path)
+    try:
+        data = json.loads(sidecar_path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if st is None:
+        st = path.stat()
+    if data.get("version") != INDEX_VERSION or data.get("source") != _stat_key(st):
+        return None
+    return {k: (int(a), int(b)) for k, a, b in data["phases"]}
+
+
+def write_index(path: Union[str, Path], entries: List[Tuple[str, int, int]],
+                st: os.stat_result) -> Path:
+    """
+    原子写 sidecar，并发读者不会看到半个索引。st 必须是扫描之前取的 stat：
+    扫描期间文件被改写时，记下的是旧的大小 / mtime，下次读会当作过期。
+    """
+    return atomic_write_text(sidecar_path(path), json.dumps({
+        "version": INDEX_VERSION,
+        "source": _stat_key(st),
+        "phases": [[k, a, b] for k, a, b in entries],
+    }))
+
+
+def build_index(path: Union[str, Path]) -> Optional[Path]:
+    """扫描并写 sidecar；扫描期间文件变了就不写，返回 None。"""
+    path = Path(path)
+    with path.open("rb") as f:
+        st = os.fstat(f.fileno())
+        if not st.st_size:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            entries = scan_top_level(buf)
+        if _stat_key(os.fstat(f.fileno())) != _stat_key(st):
+            return None
+    return write_index(path, entries, st)
+
+
+class PhaseFile:
+    """
+    一个 phase JSON 文件的只读视图。keys() 保持文件里的顺序。
+    有有效 sidecar 时 pf["Phase 3"] / pf[2] 只解码这一项（indexed 为 True）；
+    否则打开时整个文件 json.load 一次，值留在内存里。use_sidecar=False 时不看 sidecar。
+    """
+
+    def __init__(self, path: Union[str, Path], use_sidecar: bool = True):
+        self.path = Path(path)
+        self._file = self.path.open("rb")
+        st = os.fstat(self._file.fileno())   # 先 stat 再读，和 sidecar 里记的比较
+        self._buf = b""
+        self._values: Optional[Dict[str, Any]] = None
+        index = load_index(self.path, st) if use_sidecar and st.st_size else None
+        if index is not None:
+            self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        elif st.st_size:
+            values = json.loads(self._file.read().decode("utf-8"))
+            if not isinstance(values, dict):
+                raise PhaseIndexError("top level is not a JSON object")
+            self._values = values
+        else:
+            self._values = {}   # 空文件按空 protocol 处理
+        self._index: Dict[str, Tuple[int, int]] = index or {}
+        self._keys: List[str] = list(index if index is not None else self._values)
+
+    @property
+    def indexed(self) -> bool:
+        return self._values is None
+
+    def keys(self) -> List[str]:
+        return list(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key) -> bool:
+        return key in (self._index if self._values is None else self._values)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def span(self, key: str) -> Tuple[int, int]:
+        if self._values is not None:
+            raise PhaseIndexError(f"{self.path} has no byte index (run build_index first)")
+        return self._index[key]
+
+    def raw(self, key: Union[str, int]) -> bytes:
+        """这一项的 JSON 字节；没有索引时是重新编码的值，不是文件里的原始字节。"""
+        if isinstance(key, int):
+            key = self._keys[key]
+        if self._values is not None:
+            return json.dumps(self._values[key], ensure_ascii=False).encode("utf-8")
+        start, end = self._index[key]
+        return bytes(self._buf[start:end])
+
+    def __getitem__(self, key: Union[str, int]) -> Any:
+        if isinstance(key, int):
+            key = self._keys[key]
+        if self._values is not None:
+            return self._values[key]
+        return json.loads(self.raw(key).decode("utf-8"))
+
+    def get(self, key: Union[str, int], as_dict: bool = False) -> Any:
+        """as_dict=True 时把位置列表按 LEGACY_FIELDS 转成 {字段: 值}。"""
+        value = self[key]
+        if as_dict and isinstance(value, list):
+            return dict(zip(LEGACY_FIELDS, value))
+        return value
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        for key in self._keys:
+            yield key, self[key]
+
+    def close(self):
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+        self._file.close()
+
+    def __enter__(self) -> "PhaseFile":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("usage: python phase_json.py file.ot2.apiv2.json [...]")
+        return 2
+    for name in argv:
+        written = build_index(name)
+        with PhaseFile(name) as pf:
+            where = written or "not indexed (empty or changed while scanning)"
+            print(f"{name}: {len(pf)} phases -> {where}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
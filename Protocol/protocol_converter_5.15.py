@@ -35,9 +35,18 @@ Deactivating Heater
 
 
 """
+import logging
 import re
 from collections import defaultdict
+from pathlib import Path
 from typing import List, Dict, Optional, Union, Sequence, Literal  # ← 提前导入
+from protocol_ir import LabwareTable, Op, TransferOp, WellRef, merge_ops, op_from_dict
+from file_io import write_json_if_changed
+from shared import well_addressing  # 共用的孔位寻址表（define_action/well_addressing.py）
+
+logger = logging.getLogger(__name__)
+
+WELL = well_addressing.WELL_PATTERN
 
 
 # ---------------------------------------------------------------------------
@@ -84,12 +93,16 @@ def extract_float_after_keyword(text: str, keyword: str) -> Optional[float]:
     match = re.search(fr'{keyword} ([\d.]+)', text)
     return float(match.group(1)) if match else None
 
-def extract_container_from_line(line: str, keyword: str) -> Optional[Dict[str, Union[str, int, float]]]:
+def extract_container_from_line(line: str, keyword: str, table: Optional[LabwareTable] = None
+                                ) -> Optional[Union[Dict[str, Union[str, int, float]], WellRef]]:
+    """给出 table 时返回 WellRef（器材名进符号表，只存整数 id），否则返回旧的 dict。"""
     # 匹配 from 模式
-    match = re.search(fr'{keyword} [\d.]+ uL .*?from ([A-H]\d+) of (.*?) on (\d+).*?at ([\d.]+) uL/sec', line)
+    match = re.search(fr'{keyword} [\d.]+ uL .*?from ({WELL}) of (.*?) on (\d+).*?at ([\d.]+) uL/sec', line)
     if not match:
         # 匹配 into 模式
-        match = re.search(fr'{keyword} [\d.]+ uL .*?into ([A-H]\d+) of (.*?) on (\d+).*?at ([\d.]+) uL/sec', line)
+        match = re.search(fr'{keyword} [\d.]+ uL .*?into ({WELL}) of (.*?) on (\d+).*?at ([\d.]+) uL/sec', line)
+    if match and table is not None:
+        return table.ref(match.group(1), match.group(2).strip(), int(match.group(3)))
     if match:
         return {
             "well": match.group(1),
@@ -100,13 +113,17 @@ def extract_container_from_line(line: str, keyword: str) -> Optional[Dict[str, U
 
 def is_full_row(wells: List[str]) -> bool:
     """Returns True if all wells in a row (e.g., A1 to A12) are included"""
-    if len(wells) < 12:
-        return False
-    row = wells[0][0]
-    indices = sorted([int(w[1:]) for w in wells if w[0] == row])
-    return indices == list(range(1, 13))
+    return well_addressing.is_full_row(wells, cols=12)
+
+def _well_name(container) -> str:
+    return container.well if isinstance(container, WellRef) else container["well"]
 
-def build_transfer_liquid_dict_complete(step_lines: List[str]) -> Dict:
+
+def build_transfer_liquid_dict_complete(step_lines: List[str], table: Optional[LabwareTable] = None) -> Dict:
+    """
+    一个移液 phase -> 参数 dict。给出 table 时 sources / targets / tip_racks 里是 WellRef，
+    由 protocol_ir.op_from_dict 直接接收，器材名在导出（to_dict）时才展开。
+    """
     asp_vols = []
     dis_vols = []
     sources = []
@@ -145,8 +162,10 @@ def build_transfer_liquid_dict_complete(step_lines: List[str]) -> Dict:
         elif stripped.startswith("Mixing"):
             mixing_indices.append(i)
         elif stripped.startswith("Picking up tip"):
-            tip_match = re.search(r'from ([A-H]\d+) of (.*?) on (\d+)', stripped)
-            if tip_match:
+            tip_match = re.search(fr'from ({WELL}) of (.*?) on (\d+)', stripped)
+            if tip_match and table is not None:
+                tip_rack_info = table.ref(tip_match.group(1), tip_match.group(2).strip(), int(tip_match.group(3)))
+            elif tip_match:
                 tip_rack_info = {
                     "well": tip_match.group(1),
                     "type": tip_match.group(2).strip(),
@@ -169,13 +188,13 @@ def build_transfer_liquid_dict_complete(step_lines: List[str]) -> Dict:
 
         if stripped.startswith("Aspirating") and "from" in stripped:
             asp_vols = extract_float_after_keyword(stripped, "Aspirating")
-            source = extract_container_from_line(stripped, "Aspirating")
+            source = extract_container_from_line(stripped, "Aspirating", table)
             if source:
                 sources.append(source)
             asp_flow_rate = extract_float_after_keyword(stripped, "at")
         elif stripped.startswith("Dispensing") and "into" in stripped:
             dis_vols = extract_float_after_keyword(stripped, "Dispensing")
-            target = extract_container_from_line(stripped, "Dispensing")
+            target = extract_container_from_line(stripped, "Dispensing", table)
             if target:
                 targets.append(target)
             dis_flow_rate = extract_float_after_keyword(stripped, "at")
@@ -183,10 +202,10 @@ def build_transfer_liquid_dict_complete(step_lines: List[str]) -> Dict:
         elif stripped.startswith("Transferring"):
             asp_vols = extract_float_after_keyword(stripped, "Aspirating")
             dis_vols = extract_float_after_keyword(stripped, "Dispensing")
-            source = extract_container_from_line(stripped, "Aspirating")
+            source = extract_container_from_line(stripped, "Aspirating", table)
             if source:
                 sources.append(source)
-            target = extract_container_from_line(stripped, "Dispensing")
+            target = extract_container_from_line(stripped, "Dispensing", table)
             if target:
                 targets.append(target)    
                 # 新增：分别提取Aspirating和Dispensing的流速
@@ -227,8 +246,8 @@ def build_transfer_liquid_dict_complete(step_lines: List[str]) -> Dict:
                 delays = [int(float(delay_match.group(1)))]
 
     # Determine 96-well multichannel use
-    source_wells = [s['well'] for s in sources]
-    target_wells = [t['well'] for t in targets]
+    source_wells = [_well_name(s) for s in sources]
+    target_wells = [_well_name(t) for t in targets]
     is_96_well = is_full_row(source_wells) and is_full_row(target_wells)
 
     basic_info = {
@@ -275,52 +294,35 @@ def build_transfer_liquid_dict_complete(step_lines: List[str]) -> Dict:
         return {"template": template, **basic_info}
 
 
-def merge_same_slot_phases(param_dicts: List[Dict]) -> List[Dict]:
-    merged = []
-    last_key = None
-    last_block = None
-
-    for d in param_dicts:
-        if not d.get("sources") or not d.get("targets"):
-            merged.append(d)
-            last_key = None
-            last_block = None
-            continue
-
-        key = (
-            d["template"],
-            d["sources"][0]["slot"],
-            d["targets"][0]["slot"],
-            d.get("mix_stage"),
-            d.get("is_96_well"),
-            d.get("touch_tip"),
-            d.get("blow_out_air_volume", [0])[0]
-        )
-
-        if last_key == key and last_block:
-            for field in ['asp_vols', 'disp_vols', 'sources', 'targets',
-                          'tip_racks', 'asp_flow_rates', 'dis_flow_rates',
-                          'blow_out_air_volume', 'delays']:
-                if field in d:
-                    if not isinstance(last_block[field], list):
-                        last_block[field] = [last_block[field]]
-                    last_block[field].extend(d[field] if isinstance(d[field], list) else [d[field]])
-        else:
-            merged.append(d)
-            last_key = key
-            last_block = d
-
-    return merged
-
-
-def process_liquid_handler_log(filename: str = "test.log", text: str = "") -> List[Dict]:
+def process_liquid_handler_log(filename: str = "test.log", text: str = "", as_ir: bool = False):
     """
     Process the liquid handler log text and return a list of dictionaries
     containing the parsed information.
+    as_ir=True 时返回 (ops, table)：protocol_ir 里的 TransferOp / ModuleOp 和共用的 LabwareTable。
     """
     if not text:
         text = open(filename, "r", encoding="utf-8").read()
 
+    # 本次解析的符号表：器材名 / 枪头盒类型只存一份，phase 里只放整数 id
+    table = LabwareTable()
+    outputs = build_phase_dicts(text, table)
+    ops = merge_ops([op_from_dict(d, table) for d in outputs], table)
+    final_outputs = [op.to_dict(table) for op in ops]
+
+    # ------------- Output the final DataFrame -------------
+    logger.debug("final outputs: %s", final_outputs)
+    write_json_if_changed(f"{filename}.json", final_outputs)
+    # ddf = pd.DataFrame({"Phase {}".format(i + 1): phase for i, phase in enumerate(final_outputs)})
+    if as_ir:
+        return ops, table
+    return final_outputs
+
+
+def build_phase_dicts(text: str, table: Optional[LabwareTable] = None) -> List[Dict]:
+    """
+    把日志文本切成 phase，每个 phase 生成一个（未合并的）参数 dict。
+    table 为 None 时器材名 / 枪头盒直接内联在 dict 里，给的话只放 table 里的整数 id。
+    """
     # Define regex patterns for module start commands
 
     MODULE_START_PATTERNS = [
@@ -406,23 +408,15 @@ def process_liquid_handler_log(filename: str = "test.log", text: str = "") -> Li
     if current_phase:
         grouped_phases.append(current_phase)
 
-    print(grouped_phases)
+    logger.debug("grouped phases: %s", grouped_phases)
      # -------- Build dicts for each phase (liquid vs HS) --------
     outputs = []
     for phase_lines in grouped_phases:
         if any("Heater-Shaker" in l for l in phase_lines):
             outputs.append(build_heater_shaker_dict(phase_lines))
         else:
-            outputs.append(build_transfer_liquid_dict_complete(phase_lines))
-    # -----------------------------------------------------------
-
-    final_outputs = merge_same_slot_phases(outputs)
-
-    # ------------- Output the final DataFrame -------------
-    print(final_outputs)
-    json.dump(final_outputs, open(f"{filename}.json", "w"), indent=4)
-    # ddf = pd.DataFrame({"Phase {}".format(i + 1): phase for i, phase in enumerate(final_outputs)})
-    return final_outputs
+            outputs.append(build_transfer_liquid_dict_complete(phase_lines, table))
+    return outputs
 
 
 def extract_labware_info_from_json(json_data: dict) -> list:
@@ -451,11 +445,15 @@ from typing import List, Dict, Any
 import networkx as nx
 import json
 
-def build_protocol_graph(labware_info: List[Dict[str, Any]], protocol_steps: List[Dict[str, Any]]) -> nx.DiGraph:
+def build_protocol_graph(labware_info: List[Dict[str, Any]], protocol_steps: List[Any],
+                         table: Optional[LabwareTable] = None) -> nx.DiGraph:
     """
     构建包含物料创建和步骤节点的 protocol graph。
     每个节点代表一个操作或物料；每条边表示数据/物料流动。
+    protocol_steps 可以是 dict 列表，或者（给出 table 时）protocol_ir 的 op 列表。
     """
+    if table is not None:
+        return _build_protocol_graph_ir(labware_info, protocol_steps, table)
     G = nx.DiGraph()
     slot_last_writer = {}  # 记录每个 slot 上次的输出节点（transfer/heater_shaker）
 
@@ -497,19 +495,55 @@ def build_protocol_graph(labware_info: List[Dict[str, Any]], protocol_steps: Lis
     return G
 
 
-def parse_protocol(name: str):
-    logfile = f"success/{name}.ot2.apiv2.log"
+def _build_protocol_graph_ir(labware_info: List[Dict[str, Any]], ops: List[Op], table: LabwareTable) -> nx.DiGraph:
+    """build_protocol_graph 的 IR 版本：槽位直接从 LabwareTable 取，不再拷贝 dict。"""
+    G = nx.DiGraph()
+    slot_last_writer = {}
+
+    labware_ids = {lw["id"] for lw in labware_info}
+    for labware in labware_info:
+        node_id = labware["id"]
+        G.add_node(node_id, template="create_resource", **labware)
+        slot_last_writer[labware["slot_on_deck"]] = node_id
+
+    for i, op in enumerate(ops):
+        node_id = f"step_{i+1}"
+        attrs = op.to_dict(table)
+        if isinstance(op, TransferOp):
+            for port_name, refs in (("sources", op.sources), ("targets", op.targets), ("tip_racks", op.tips)):
+                if refs:
+                    slot = refs[0].slot(table)
+                    prev_node = slot_last_writer.get(slot)
+                    if prev_node:
+                        source_port = "labware" if prev_node in labware_ids else f"{port_name}_out"
+                        G.add_edge(prev_node, node_id, source_port=source_port, target_port=port_name)
+                    if port_name != "tip_racks":
+                        slot_last_writer[slot] = node_id
+                attrs[port_name] = [ref.well for ref in refs]
+        G.add_node(node_id, **attrs)
+    return G
+
+
+def parse_protocol(name: str, success_dir: str = "success",
+                   builds_dir: str = "../../Protocols/protoBuilds",
+                   graph_dir: str = "graph_protocol") -> List[Path]:
+    """
+    解析一个 protocol，返回输出文件（<log>.json 和 graph.json）。
+    两者都是原子写入；内容与已有文件相同时不重写。
+    """
+    logfile = f"{success_dir}/{name}.ot2.apiv2.log"
 
-    infofile = f"../../Protocols/protoBuilds/{name}/{name}.ot2.apiv2.py.json"
+    infofile = f"{builds_dir}/{name}/{name}.ot2.apiv2.py.json"
 
-    protocol_steps = process_liquid_handler_log(logfile)
+    ops, table = process_liquid_handler_log(logfile, as_ir=True)
     with open(infofile, "r") as f:
         labware_data = json.load(f)
     labware_info = extract_labware_info_from_json(labware_data)
-    protocol_graph = build_protocol_graph(labware_info, protocol_steps)
+    protocol_graph = build_protocol_graph(labware_info, ops, table)
     data = nx.node_link_data(protocol_graph)
-    with open(f"graph_protocol/{name}/graph.json", "w") as f:
-        json.dump(data, f, indent=4)
+    graph_file = Path(f"{graph_dir}/{name}/graph.json")
+    write_json_if_changed(graph_file, data)
+    return [Path(f"{logfile}.json"), graph_file]
 
 
 if __name__ == "__main__":
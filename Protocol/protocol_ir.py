@@ -0,0 +1,303 @@
+"""
+日志解析 / protocol graph 共用的中间表示（IR）。
+
+phase 以前是 20 多个 key 的 dict，merge_same_slot_phases 原地把标量改成列表、
+build_protocol_graph 再拷贝进节点属性。这里用带 __slots__ 的 dataclass：
+- WellRef 只存孔名和一个整数 labware id，器材名/槽位在 LabwareTable 里只存一份；
+- TransferOp 里逐 transfer 的字段始终是列表，合并时直接 extend，不再 isinstance 判断；
+- to_dict() 还原成原来 dict 的形状（包括合并时产生的列表形状），输出的 JSON 不变。
+"""
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# Python 3.10+ 的 dataclass 才支持 slots=True
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+TRANSFER_TEMPLATES = ("transfer", "transfer_with_temperature", "transfer_with_magnetic")
+# ModuleOp.kind -> 它所在 phase 的 template
+MODULE_TEMPLATES = {
+    "heater_shaker": "heater_shaker",
+    "temperature": "transfer_with_temperature",
+    "magnetic": "transfer_with_magnetic",
+}
+MODULE_KINDS = {template: kind for kind, template in MODULE_TEMPLATES.items()}
+
+
+class LabwareTable:
+    """
+    (器材显示名 / 枪头盒类型, 槽位) -> 整数 id；同一次解析里所有 WellRef 共用的符号表。
+    名字只在这里存一份（sys.intern），phase 记录里只有 id，导出时才展开。
+    """
+    __slots__ = ("names", "slots", "_ids")
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.slots: List[int] = []
+        self._ids: Dict[Tuple[str, int], int] = {}
+
+    def intern(self, name: str, slot: int) -> int:
+        key = (name, slot)
+        lid = self._ids.get(key)
+        if lid is None:
+            lid = self._ids[key] = len(self.names)
+            self.names.append(sys.intern(name))
+            self.slots.append(slot)
+        return lid
+
+    def ref(self, well: str, name: str, slot: int) -> "WellRef":
+        """解析时直接用正则分组构造 WellRef，不经过中间 dict。"""
+        return WellRef(sys.intern(well), self.intern(name, slot))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+@dataclass(frozen=True, **_SLOTS)
+class WellRef:
+    well: str
+    labware: int  # LabwareTable id
+
+    @classmethod
+    def from_dict(cls, d: Union[Dict[str, Any], "WellRef"], table: LabwareTable) -> "WellRef":
+        if isinstance(d, WellRef):  # 解析器已经用同一个 table 建好的
+            return d
+        name = d["labware"] if "labware" in d else d["type"]
+        return cls(sys.intern(d["well"]), table.intern(name, d["slot"]))
+
+    def slot(self, table: LabwareTable) -> int:
+        return table.slots[self.labware]
+
+    def to_dict(self, table: LabwareTable, name_key: str = "labware") -> Dict[str, Any]:
+        return {"well": self.well, name_key: table.names[self.labware], "slot": table.slots[self.labware]}
+
+
+@dataclass(frozen=True, **_SLOTS)
+class MixSpec:
+    stage: str = "none"  # none / before / after / both
+    times: int = 0
+    volume: Optional[float] = None
+    rate: Optional[float] = None
+    liquid_height: Optional[float] = None
+
+
+NO_MIX = MixSpec()
+
+
+def _mix_spec(stage, times, volume, rate, liquid_height) -> MixSpec:
+    """不混合的步骤共用同一个 NO_MIX（MixSpec 不可变）。"""
+    spec = MixSpec(stage, times, volume, rate, liquid_height)
+    return NO_MIX if spec == NO_MIX else spec
+
+
+@dataclass(**_SLOTS)
+class ModuleOp:
+    """heater_shaker phase，或 transfer_with_temperature / transfer_with_magnetic 附带的模块动作。"""
+    kind: str  # heater_shaker / temperature / magnetic
+    target_temperature: Optional[float] = None
+    wait_for_temp: bool = False
+    shake_speed: Optional[float] = None
+    duration_minutes: Optional[int] = None
+    deactivate_heater: bool = False
+    deactivate_shaker: bool = False
+    deactivate: bool = False  # temperature module
+    engage: bool = False
+    engage_delay_minutes: Optional[int] = None
+    disengage: bool = False
+
+    @property
+    def template(self) -> str:
+        return MODULE_TEMPLATES[self.kind]
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "ModuleOp":
+        """kind 由 template 决定：heater_shaker phase，或 transfer_with_temperature / magnetic 的模块字段。"""
+        kind = MODULE_KINDS[d["template"]]
+        if kind == "magnetic":
+            return cls(kind, engage=d.get("magnetic_engage", False),
+                       engage_delay_minutes=d.get("magnetic_delay_minutes"),
+                       disengage=d.get("magnetic_disengage", False))
+        if kind == "temperature":
+            return cls(kind, target_temperature=d.get("temperature_target"),
+                       deactivate=d.get("temperature_deactivate", False))
+        return cls(
+            kind,
+            target_temperature=d.get("target_temperature"),
+            wait_for_temp=d.get("wait_for_temp", False),
+            shake_speed=d.get("shake_speed"),
+            duration_minutes=d.get("duration_minutes"),
+            deactivate_heater=d.get("deactivate_heater", False),
+            deactivate_shaker=d.get("deactivate_shaker", False),
+        )
+
+    def fields(self) -> Dict[str, Any]:
+        """这个模块在 phase dict 里的字段（不含 template）。"""
+        if self.kind == "magnetic":
+            return {"magnetic_engage": self.engage, "magnetic_delay_minutes": self.engage_delay_minutes,
+                    "magnetic_disengage": self.disengage}
+        if self.kind == "temperature":
+            return {"temperature_target": self.target_temperature,
+                    "temperature_deactivate": self.deactivate}
+        return {
+            "target_temperature": self.target_temperature,
+            "wait_for_temp": self.wait_for_temp,
+            "shake_speed": self.shake_speed,
+            "duration_minutes": self.duration_minutes,
+            "deactivate_heater": self.deactivate_heater,
+            "deactivate_shaker": self.deactivate_shaker,
+        }
+
+    def to_dict(self, table: Optional[LabwareTable] = None) -> Dict[str, Any]:
+        return {"template": self.template, **self.fields()}
+
+
+@dataclass(**_SLOTS)
+class TransferOp:
+    """
+    一个（可能由多个 phase 合并的）移液步骤。
+    asp_vols 等逐 phase 的字段每个 phase 一项；phases 是合并进来的 phase 数。
+    """
+    template: str
+    sources: List[WellRef] = field(default_factory=list)
+    targets: List[WellRef] = field(default_factory=list)
+    tips: List[WellRef] = field(default_factory=list)
+    asp_vols: List[float] = field(default_factory=list)
+    disp_vols: List[float] = field(default_factory=list)
+    asp_flow_rates: List[Optional[float]] = field(default_factory=list)
+    dis_flow_rates: List[Optional[float]] = field(default_factory=list)
+    blow_out_air_volume: List[Optional[float]] = field(default_factory=list)
+    delays: List[Optional[float]] = field(default_factory=list)
+    touch_tip: bool = False
+    is_96_well: bool = False
+    mix: MixSpec = NO_MIX
+    module: Optional[ModuleOp] = None
+    phases: int = 1
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any], table: LabwareTable) -> "TransferOp":
+        def per_phase(value) -> list:
+            # 构建 dict 时：标量、[x]、None 都表示“这个 phase 的一个值”
+            if isinstance(value, list):
+                return list(value)
+            return [value]
+
+        mix_times = d.get("mix_times") or 0
+        op = cls(
+            template=d["template"],
+            sources=[WellRef.from_dict(s, table) for s in d.get("sources") or []],
+            targets=[WellRef.from_dict(t, table) for t in d.get("targets") or []],
+            tips=[WellRef.from_dict(t, table) for t in d.get("tip_racks") or []],
+            asp_vols=per_phase(d.get("asp_vols")),
+            disp_vols=per_phase(d.get("disp_vols")),
+            asp_flow_rates=per_phase(d.get("asp_flow_rates")),
+            dis_flow_rates=per_phase(d.get("dis_flow_rates")),
+            blow_out_air_volume=per_phase(d.get("blow_out_air_volume")),
+            delays=per_phase(d.get("delays")),
+            touch_tip=d.get("touch_tip", False),
+            is_96_well=d.get("is_96_well", False),
+            mix=_mix_spec(
+                d.get("mix_stage", "none"),
+                mix_times[0] if isinstance(mix_times, list) else mix_times,
+                d.get("mix_vol"),
+                d.get("mix_rate"),
+                d.get("mix_liquid_height"),
+            ),
+        )
+        if d["template"] in MODULE_KINDS:
+            op.module = ModuleOp.from_dict(d)
+        return op
+
+    def merge_key(self, table: LabwareTable) -> Optional[tuple]:
+        """与原 dict 合并（merge_same_slot_phases）相同的合并条件；没有源或目标时不参与合并。"""
+        if not self.sources or not self.targets:
+            return None
+        return (
+            self.template,
+            self.sources[0].slot(table),
+            self.targets[0].slot(table),
+            self.mix.stage,
+            self.is_96_well,
+            self.touch_tip,
+            self.blow_out_air_volume[0] if self.blow_out_air_volume else 0,
+        )
+
+    def extend(self, other: "TransferOp"):
+        self.sources.extend(other.sources)
+        self.targets.extend(other.targets)
+        self.tips.extend(other.tips)
+        self.asp_vols.extend(other.asp_vols)
+        self.disp_vols.extend(other.disp_vols)
+        self.asp_flow_rates.extend(other.asp_flow_rates)
+        self.dis_flow_rates.extend(other.dis_flow_rates)
+        self.blow_out_air_volume.extend(other.blow_out_air_volume)
+        self.delays.extend(other.delays)
+        self.phases += other.phases
+
+    def to_dict(self, table: LabwareTable) -> Dict[str, Any]:
+        """还原成 build_transfer_liquid_dict_complete / 原 dict 合并产生的 dict 形状。"""
+        merged = self.phases > 1
+
+        def scalar(values: list):
+            # 未合并：原来是标量（或没有吸液时的 []）
+            if merged:
+                return values
+            return values[0] if values else []
+
+        def optional_list(values: list):
+            # 未合并：原来是 [x] 或 None
+            if merged:
+                return values
+            return None if values == [None] else values
+
+        d = {
+            "template": self.template,
+            "sources": [s.to_dict(table) for s in self.sources],
+            "targets": [t.to_dict(table) for t in self.targets],
+            "tip_racks": [t.to_dict(table, "type") for t in self.tips],
+            "use_channels": None,
+            "asp_vols": scalar(self.asp_vols),
+            "asp_flow_rates": optional_list(self.asp_flow_rates),
+            "disp_vols": scalar(self.disp_vols),
+            "dis_flow_rates": optional_list(self.dis_flow_rates),
+            "offsets": None,
+            "touch_tip": self.touch_tip,
+            "liquid_height": None,
+            "blow_out_air_volume": self.blow_out_air_volume,
+            "is_96_well": self.is_96_well,
+            "mix_stage": self.mix.stage,
+            "mix_times": [self.mix.times] if self.mix.times else 0,
+            "mix_vol": self.mix.volume,
+            "mix_rate": self.mix.rate,
+            "mix_liquid_height": self.mix.liquid_height,
+            "delays": optional_list(self.delays),
+        }
+        if self.module is not None:
+            d.update(self.module.fields())
+        return d
+
+
+Op = Union[TransferOp, ModuleOp]
+
+
+def op_from_dict(d: Dict[str, Any], table: LabwareTable) -> Op:
+    if d["template"] in TRANSFER_TEMPLATES:
+        return TransferOp.from_dict(d, table)
+    return ModuleOp.from_dict(d)
+
+
+def merge_ops(ops: List[Op], table: LabwareTable) -> List[Op]:
+    """原 merge_same_slot_phases 的 IR 版：相邻、合并条件相同的 TransferOp 合成一个。"""
+    merged: List[Op] = []
+    last_key = None
+    last: Optional[TransferOp] = None
+    for op in ops:
+        key = op.merge_key(table) if isinstance(op, TransferOp) else None
+        if key is None:
+            merged.append(op)
+            last_key, last = None, None
+        elif key == last_key and last is not None:
+            last.extend(op)
+        else:
+            merged.append(op)
+            last_key, last = key, op
+    return merged
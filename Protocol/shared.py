@@ -0,0 +1,32 @@
+"""
+解析端要用的 define_action 模块（孔位寻址表、操作耗时）。
+
+define_action 不是包、也不在 Protocol/ 下；这里按文件路径加载，不改 sys.path：
+
+    from shared import sim_clock, well_addressing
+"""
+import importlib.util
+import sys
+from pathlib import Path
+
+DEFINE_ACTION_DIR = Path(__file__).resolve().parent.parent / "define_action"
+
+
+def load_define_action(name: str):
+    """加载 define_action/<name>.py（只用于不 import 同目录其它模块的叶子模块），每个进程只加载一次。"""
+    qualified = f"define_action.{name}"
+    module = sys.modules.get(qualified)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(qualified, DEFINE_ACTION_DIR / f"{name}.py")
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[qualified] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[qualified]
+            raise
+    return module
+
+
+well_addressing = load_define_action("well_addressing")
+sim_clock = load_define_action("sim_clock")
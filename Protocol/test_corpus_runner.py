@@ -0,0 +1,83 @@
+import json
+
+from corpus_runner import LOG_SUFFIX, CorpusRunner, Journal, JournalEntry
+
+
+class Converter:
+    """parse_protocol 的替身：按顺序返回 / 抛出 results 里的值，记下被调了几次。"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    def parse_protocol(self, pid, success_dir, builds_dir, graph_dir):
+        self.calls += 1
+        result = self.results.pop(0)
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+
+class Crash(BaseException):
+    """不是 Exception：run_one 不会把它记成 failed，相当于进程在尝试中途死掉。"""
+
+
+def _runner(tmp_path, converter, max_attempts=3):
+    success = tmp_path / "success"
+    success.mkdir(exist_ok=True)
+    (success / f"p1{LOG_SUFFIX}").write_text("log", encoding="utf-8")
+    return CorpusRunner(success, tmp_path / "builds", tmp_path / "graph", tmp_path / "journal.jsonl",
+                        max_attempts=max_attempts, converter=converter)
+
+
+def _crash(tmp_path, max_attempts=3):
+    runner = _runner(tmp_path, Converter(Crash()), max_attempts)
+    try:
+        runner.run_one("p1")
+    except Crash:
+        pass
+    else:
+        raise AssertionError("crash was swallowed")
+
+
+def test_crashed_attempts_count_towards_max_attempts(tmp_path):
+    for _ in range(3):
+        _crash(tmp_path)
+    converter = Converter([])
+    assert _runner(tmp_path, converter).run_one("p1") == "gave_up"
+    assert converter.calls == 0
+
+    statuses = [json.loads(line)["status"] for line in (tmp_path / "journal.jsonl").read_text().splitlines()]
+    assert statuses == ["started"] * 3
+
+
+def test_crash_then_failures_share_the_budget(tmp_path):
+    _crash(tmp_path)
+    converter = Converter(ValueError("bad log"), ValueError("bad log"))
+    assert _runner(tmp_path, converter).run_one("p1") == "gave_up"
+    assert converter.calls == 2
+
+
+def test_started_and_failed_count_once(tmp_path):
+    journal = Journal(tmp_path / "journal.jsonl")
+    journal.append(JournalEntry("p1", "h", "started", 1))
+    journal.append(JournalEntry("p1", "h", "failed", 1, error="boom"))
+    journal.append(JournalEntry("p1", "h", "started", 2))
+    assert journal.attempts_made("p1", "h") == 2
+    assert journal.attempts_made("p1", "other") == 0
+
+    # 最后一行写了一半（崩溃在 append 中途）：忽略它，不影响已有计数
+    with (tmp_path / "journal.jsonl").open("a", encoding="utf-8") as f:
+        f.write('{"id": "p1", "input_hash": "h", "status": "sta')
+    assert Journal(tmp_path / "journal.jsonl").attempts_made("p1", "h") == 2
+
+
+def test_crash_recovery_succeeds_and_is_skipped_next_time(tmp_path):
+    _crash(tmp_path)
+    out = tmp_path / "graph.json"
+    out.write_text("{}", encoding="utf-8")
+    converter = Converter([out])
+    assert _runner(tmp_path, converter).run_one("p1") == "done"
+    entry = Journal(tmp_path / "journal.jsonl").last["p1"]
+    assert (entry.status, entry.attempt) == ("done", 2)
+    assert _runner(tmp_path, Converter()).run_one("p1") == "skipped"
@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from file_io import dumps_json
+
+HERE = Path(__file__).resolve().parent
+
+# 在子进程里跑 parse_protocol：不同的 PYTHONHASHSEED 下 set / dict 的遍历顺序会变
+PARSE = """
+import sys
+from corpus_runner import load_converter
+load_converter().parse_protocol("p1", success_dir=sys.argv[1], builds_dir=sys.argv[2], graph_dir=sys.argv[3])
+"""
+
+
+def test_dumps_json_does_not_depend_on_key_order():
+    a = {"b": 1, "a": {"y": [1, 2], "x": None}}
+    b = {"a": {"x": None, "y": [1, 2]}, "b": 1}
+    assert dumps_json(a) == dumps_json(b)
+
+
+def _run(tmp_path: Path, seed: str):
+    pytest.importorskip("networkx")
+    root = tmp_path / seed
+    success, builds, graph = root / "success", root / "builds" / "p1", root / "graph"
+    success.mkdir(parents=True)
+    builds.mkdir(parents=True)
+    (success / "p1.ot2.apiv2.log").write_text((HERE / "test.txt").read_text(encoding="utf-8"), encoding="utf-8")
+    labware = [
+        {"name": "Agilent 1 Well Reservoir 290 mL", "slot": 1, "type": "agilent_1_reservoir_290ml"},
+        {"name": "Bio-Rad 96 Well Plate 200 µL PCR", "slot": 2, "type": "biorad_96_wellplate_200ul_pcr"},
+        {"name": "Bio-Rad 96 Well Plate 200 µL PCR", "slot": 3, "type": "biorad_96_wellplate_200ul_pcr"},
+        {"name": "Opentrons OT-2 96 Filter Tip Rack 200 µL", "slot": 6, "type": "opentrons_96_filtertiprack_200ul"},
+    ]
+    (builds / "p1.ot2.apiv2.py.json").write_text(json.dumps({"labware": labware}), encoding="utf-8")
+    env = dict(os.environ, PYTHONHASHSEED=seed)
+    subprocess.run([sys.executable, "-c", PARSE, str(success), str(root / "builds"), str(graph)],
+                   cwd=HERE, env=env, check=True, capture_output=True)
+    return (success / "p1.ot2.apiv2.log.json").read_bytes(), (graph / "p1" / "graph.json").read_bytes()
+
+
+def test_parse_protocol_output_is_byte_identical_across_runs(tmp_path):
+    assert _run(tmp_path, "1") == _run(tmp_path, "2")
@@ -0,0 +1,55 @@
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+from phase_json import PhaseFile, PhaseIndexError, build_index, load_index, sidecar_path
+
+SAMPLES = sorted((Path(__file__).resolve().parent / "json").glob("*.ot2.apiv2.json"))
+
+
+@pytest.fixture(params=SAMPLES, ids=lambda p: p.name)
+def sample(request, tmp_path):
+    # 复制一份再建索引，不在仓库的 json/ 里留下 .idx.json
+    path = tmp_path / request.param.name
+    shutil.copyfile(request.param, path)
+    return path
+
+
+def test_indexed_reads_match_json_load(sample):
+    expected = json.loads(sample.read_text(encoding="utf-8"))
+    with PhaseFile(sample) as plain:
+        assert not plain.indexed
+        assert plain.keys() == list(expected)
+        assert dict(plain.items()) == expected
+
+    assert build_index(sample) == sidecar_path(sample)
+    with PhaseFile(sample) as pf:
+        assert pf.indexed
+        assert pf.keys() == list(expected) and len(pf) == len(expected)
+        for i, (key, value) in enumerate(expected.items()):
+            assert key in pf
+            assert pf[key] == value and pf[i] == value
+            assert json.loads(pf.raw(key).decode("utf-8")) == value
+            start, end = pf.span(key)
+            assert json.loads(sample.read_bytes()[start:end].decode("utf-8")) == value
+
+
+def test_stale_sidecar_falls_back_to_json_load(sample):
+    build_index(sample)
+    expected = json.loads(sample.read_text(encoding="utf-8"))
+    expected["Phase 0"] = "changed"
+    sample.write_text(json.dumps(expected, ensure_ascii=False), encoding="utf-8")
+    assert load_index(sample) is None
+    with PhaseFile(sample) as pf:
+        assert not pf.indexed
+        assert pf["Phase 0"] == "changed"
+        with pytest.raises(PhaseIndexError):
+            pf.span("Phase 0")
+
+
+def test_use_sidecar_false_ignores_index(sample):
+    build_index(sample)
+    with PhaseFile(sample, use_sidecar=False) as pf:
+        assert not pf.indexed
@@ -0,0 +1,89 @@
+import copy
+import json
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("networkx")
+
+from corpus_runner import load_converter
+from protocol_ir import LabwareTable, ModuleOp, merge_ops, op_from_dict
+
+HERE = Path(__file__).resolve().parent
+# 同一对槽位的相邻 transfer：会被合并成一个 phase
+SAME_SLOT_LOG = "".join(
+    f"""Picking up tip from {tip} of Opentrons OT-2 96 Filter Tip Rack 200 µL on 6
+Transferring 20.0 from {well} of Agilent 1 Well Reservoir 290 mL on 1 to {well} of Bio-Rad 96 Well Plate 200 µL PCR on 3
+        Aspirating 20.0 uL from {well} of Agilent 1 Well Reservoir 290 mL on 1 at 92.86 uL/sec
+        Dispensing 20.0 uL into {well} of Bio-Rad 96 Well Plate 200 µL PCR on 3 at 92.86 uL/sec
+Dropping tip into A1 of Opentrons Fixed Trash on 12
+""" for tip, well in [("A1", "A1"), ("B1", "B1"), ("C1", "C1")])
+LOG_TEXTS = [(HERE / "test.txt").read_text(encoding="utf-8"), SAME_SLOT_LOG]
+
+
+def legacy_merge(param_dicts):
+    """合并逻辑换成 merge_ops 之前 protocol_converter_5.15.merge_same_slot_phases 的原样拷贝。"""
+    merged = []
+    last_key = None
+    last_block = None
+
+    for d in param_dicts:
+        if not d.get("sources") or not d.get("targets"):
+            merged.append(d)
+            last_key = None
+            last_block = None
+            continue
+
+        key = (
+            d["template"],
+            d["sources"][0]["slot"],
+            d["targets"][0]["slot"],
+            d.get("mix_stage"),
+            d.get("is_96_well"),
+            d.get("touch_tip"),
+            d.get("blow_out_air_volume", [0])[0]
+        )
+
+        if last_key == key and last_block:
+            for field in ['asp_vols', 'disp_vols', 'sources', 'targets',
+                          'tip_racks', 'asp_flow_rates', 'dis_flow_rates',
+                          'blow_out_air_volume', 'delays']:
+                if field in d:
+                    if not isinstance(last_block[field], list):
+                        last_block[field] = [last_block[field]]
+                    last_block[field].extend(d[field] if isinstance(d[field], list) else [d[field]])
+        else:
+            merged.append(d)
+            last_key = key
+            last_block = d
+
+    return merged
+
+
+@pytest.fixture(scope="module")
+def converter():
+    return load_converter()
+
+
+@pytest.mark.parametrize("text", LOG_TEXTS, ids=["test.txt", "same_slot"])
+def test_merge_ops_matches_legacy_dict_merge(converter, text):
+    expected = legacy_merge(converter.build_phase_dicts(text))
+
+    table = LabwareTable()
+    ops = merge_ops([op_from_dict(d, table) for d in converter.build_phase_dicts(text, table)], table)
+    # to_dict 把 table id 展开回器材名，和旧的 dict 合并结果逐字节一致
+    assert json.dumps([op.to_dict(table) for op in ops]) == json.dumps(expected)
+
+
+def test_same_slot_transfers_merge(converter):
+    table = LabwareTable()
+    ops = merge_ops([op_from_dict(d, table) for d in converter.build_phase_dicts(SAME_SLOT_LOG, table)], table)
+    assert len(ops) == 1 and ops[0].phases == 3
+
+
+@pytest.mark.parametrize("kind", ["heater_shaker", "temperature", "magnetic"])
+def test_module_op_template_follows_kind(kind):
+    op = ModuleOp(kind)
+    d = op.to_dict()
+    assert d["template"] == op.template
+    assert ModuleOp.from_dict(copy.deepcopy(d)) == op
@@ -2,12 +2,15 @@ import ast
 from typing import List, Dict, Tuple, Any
 import json
 import re
+from context import print_diagnostic
 class OTAnalyzer(ast.NodeVisitor):
     """Walk an OT-2 protocol script and collect semantic info."""
-    def __init__(self, source: str):
+    def __init__(self, source: str, report=print_diagnostic):
+        self.report = report                             # report(level, message)：警告 / 调试信息
         self.labware: List[Tuple[str, str, str]] = []    # [(var, load_name, slot)]
         self.tipracks: Dict[str, str] = {}               # var -> slot
         self.pipettes: Dict[str, Dict[str, Any]] = {}    # var -> {...}
+        self.pipette_models: Dict[str, str] = {}         # var -> model, e.g. p300 -> p300_multi_gen2
         self.steps: List[ast.Call] = []                  # pipetting calls
         self.source = source    
         self.variables: Dict[str, Any] = {}     # ★ 所有已解析的变量
@@ -27,7 +30,7 @@ class OTAnalyzer(ast.NodeVisitor):
         try:
             self.variables_default = json.loads(m.group(1))
         except Exception as err:
-            print(f"[WARN] JSON解析失败: {err}")
+            self.report("warning", f"JSON解析失败: {err}")
             self.variables_default = {}
 
     # ------ helpers ------
@@ -40,7 +43,7 @@ class OTAnalyzer(ast.NodeVisitor):
     # 变量替换：若已解析出真实值就返回，否则返回变量名字符串
             return self.variables.get(node.id, node.id)
         else:
-            print(f"[DEBUG] Unexpected node type in _const: {ast.dump(node)}")
+            self.report("debug", f"Unexpected node type in _const: {ast.dump(node)}")
             raise ValueError("Expect constant")
 
     # ------ visit methods ------
@@ -102,7 +105,7 @@ class OTAnalyzer(ast.NodeVisitor):
                 # Ensure correct naming: parent_slot_child
                 varname = f"{parent}_{slot}_{child}"
                 self.labware.append((varname, child, slot))
-                print(f"[DEBUG] Assigning child labware: {varname} -> {child} at slot {slot}")
+                self.report("debug", f"Assigning child labware: {varname} -> {child} at slot {slot}")
 
             # 2) instrument - 修改这部分
             elif tgt == "ctx" and fname == "load_instrument":
@@ -121,6 +124,14 @@ class OTAnalyzer(ast.NodeVisitor):
         self.generic_visit(node)
 
     def visit_Assign(self, node: ast.Assign):
+        # p300 = ctx.load_instrument('p300_multi_gen2', ...) → 记录型号，静态分配枪头时要知道通道数
+        if isinstance(node.value, ast.Call) and isinstance(node.value.func, ast.Attribute) \
+                and node.value.func.attr == "load_instrument" and node.value.args \
+                and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            try:
+                self.pipette_models[node.targets[0].id] = str(self._const(node.value.args[0]))
+            except ValueError:
+                pass
         if isinstance(node.value, ast.Call) and isinstance(node.value.func, ast.Name):
             if node.value.func.id == "get_values":
                 keys = [self._const(arg) for arg in node.value.args]
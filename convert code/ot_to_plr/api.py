@@ -0,0 +1,116 @@
+"""
+进程内转换 API：源码字符串进，脚本文本 + 诊断 + 各阶段耗时 + 分析结果出，不写任何文件。
+
+    from api import convert
+    result = convert(open("protocol.py").read(), labware_dirs=["labware"])
+    if result.ok:
+        print(result.script)
+
+main.py / watcher 走的是同一条流水线（transform_explicit -> render_plr_script），
+只是多了写盘。常驻服务里用同一个进程反复调用 convert，器材索引、内置器材、
+AST 缓存都是热的（见 preload）。
+"""
+import contextlib
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from context import AstCache, ConversionContext, ConversionOptions, Diagnostic, get_labware_index
+from labware_loader import preload_builtins
+from script_builder import render_plr_script
+from transform import transform_explicit
+
+_AST_CACHE = AstCache()
+
+
+@dataclass
+class ConversionResult:
+    """
+    一次 convert 的结果。script 为 None 表示失败（看 diagnostics 里的 error）。
+    ir 是 OTAnalyzer（labware / steps / run_constants / pipette_models），
+    expanded_source 是循环展开后的 OT 源码。
+    """
+    script: Optional[str]
+    diagnostics: List[Diagnostic] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+    ir: Any = None
+    expanded_source: Optional[str] = None
+    labware_files: Dict[str, Path] = field(default_factory=dict)
+    options: Optional[ConversionOptions] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.script is not None
+
+    @property
+    def requires_runtime(self) -> bool:
+        """use_runtime 生成的脚本要和 plr_runtime.py 放在一起（script_builder.install_runtime）。"""
+        return bool(self.options and self.options.use_runtime)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """可 JSON 序列化的摘要（不含 ir 对象）。"""
+        return {
+            "ok": self.ok,
+            "script": self.script,
+            "diagnostics": [d.to_dict() for d in self.diagnostics],
+            "timings": self.timings,
+            "labware_files": {k: str(v) for k, v in self.labware_files.items()},
+            "requires_runtime": self.requires_runtime,
+        }
+
+
+class _Timings:
+    """ctx.stage 的最小实现：只记每个阶段的墙钟时间（同名阶段累加）。"""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+
+
+def _resolve_dirs(labware_dirs: Sequence) -> Tuple[Path, ...]:
+    return tuple(dict.fromkeys(Path(d).resolve() for d in labware_dirs))
+
+
+def preload(labware_dirs: Sequence = (".",)):
+    """常驻进程启动时调用一次：建器材索引、import pylabrobot 内置器材。"""
+    get_labware_index(_resolve_dirs(labware_dirs))
+    preload_builtins()
+
+
+def convert(source: str, *, labware_dirs: Sequence = (".",),
+            options: Optional[ConversionOptions] = None) -> ConversionResult:
+    """
+    把 Opentrons 协议源码转换成 PLR 脚本文本。不读写输出目录，异常不向外抛：
+    失败时 result.script 为 None，原因在 diagnostics 里。
+    诊断经 ctx.report 收集到本次的 result.diagnostics，不经过 stdout，可以多线程并发调用。
+    """
+    options = options or ConversionOptions()
+    timings = _Timings()
+    result = ConversionResult(script=None, timings=timings.seconds, options=options)
+    stage = "transform_explicit"
+    start = time.perf_counter()
+    try:
+        ctx = ConversionContext(json_dirs=_resolve_dirs(labware_dirs), profiler=timings,
+                                ast_cache=_AST_CACHE, options=options, diagnostics=result.diagnostics)
+        with ctx.stage(stage):
+            expanded = transform_explicit(source, report=ctx.report)
+        result.expanded_source = expanded
+
+        stage = "render_plr_script"
+        script = render_plr_script(expanded, ctx)
+        result.ir = ctx.analyzer
+        result.labware_files = dict(ctx.labware_files)
+        result.script = script
+    except Exception as e:
+        result.diagnostics.append(Diagnostic("error", stage, f"{type(e).__name__}: {e}"))
+    finally:
+        timings.seconds["total"] = time.perf_counter() - start
+    return result
@@ -0,0 +1,205 @@
+"""
+ot_to_plr 转换流水线的基准测试。
+
+语料 = OT examples 里的脚本 + 按规模合成的 OT 协议（器材数、循环嵌套深度、每层循环步数）。
+对每个输入记录：冷 / 热两种缓存状态下的转换耗时、每秒转换次数、各阶段耗时、峰值内存、
+生成脚本大小，并和基线文件比较。计时不开 tracemalloc。
+
+    python bench.py                                   # 跑一遍并打印
+    python bench.py --save-baseline bench_baseline.json
+    python bench.py --baseline bench_baseline.json    # 有输入慢于基线 --max-slowdown 倍时退出码为 1
+    python bench.py --synth 4x1x8 --synth 9x2x32 --repeat 5
+"""
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from context import clear_process_caches
+from main import convert_file
+from profiling import StageProfiler
+
+EXAMPLES_DIR = Path(__file__).resolve().parent.parent.parent / "OT examples"
+DEFAULT_SYNTH = ["2x1x4", "6x1x16", "9x2x32"]
+
+_PLATES = ["corning_96_wellplate_360ul_flat", "nest_12_reservoir_15ml", "nest_1_reservoir_195ml"]
+_LOOP_VARS = "ijkmn"
+
+
+def synth_protocol(n_labware: int = 4, loop_depth: int = 1, steps_per_loop: int = 4) -> str:
+    """
+    生成一个合成的 OT-2 协议：n_labware 个板子（槽位 1..9），两个枪头盒（槽位 10、11），
+    loop_depth 层嵌套的 `for x in range(TOTAL_COl)`，每层 steps_per_loop 个移液步骤。
+    """
+    if not 1 <= n_labware <= 9:
+        raise ValueError("n_labware must be between 1 and 9 (slots 10 and 11 hold tip racks)")
+    if not 1 <= loop_depth <= len(_LOOP_VARS):
+        raise ValueError(f"loop_depth must be between 1 and {len(_LOOP_VARS)}")
+    lines = [
+        "def run(ctx):",
+        "",
+        "    TOTAL_COl = 12",
+        "    VOL = 50",
+        "",
+    ]
+    for k in range(n_labware):
+        lines.append(f"    plate_{k} = ctx.load_labware('{_PLATES[k % len(_PLATES)]}', {k + 1}, 'plate {k}')")
+    lines += [
+        "    tiprack = [ctx.load_labware('opentrons_96_tiprack_300ul', slot)",
+        "               for slot in [10, 11]]",
+        "    p300 = ctx.load_instrument('p300_single_gen2', 'right', tip_racks=tiprack)",
+        "",
+    ]
+    for depth in range(loop_depth):
+        indent = "    " * (depth + 1)
+        var = _LOOP_VARS[depth]
+        lines.append(f"{indent}for {var} in range(TOTAL_COl):")
+        body = indent + "    "
+        for s in range(steps_per_loop):
+            src = f"plate_{s % n_labware}"
+            dst = f"plate_{(s + 1) % n_labware}"
+            kind = s % 4
+            if kind == 0:
+                lines.append(f"{body}p300.pick_up_tip()")
+            elif kind == 1:
+                lines.append(f"{body}p300.aspirate(VOL, {src}.wells()[{var}].bottom(z=0.5), rate = 0.5)")
+            elif kind == 2:
+                lines.append(f"{body}p300.dispense(VOL, {dst}.wells()[{var}].top(z=-2), rate = 1)")
+            else:
+                lines.append(f"{body}p300.mix(3, VOL, {dst}.wells()[{var}], rate = 2)")
+                lines.append(f"{body}p300.drop_tip()")
+    return "\n".join(lines) + "\n"
+
+
+def _parse_synth(spec: str) -> Tuple[int, int, int]:
+    n_labware, loop_depth, steps = (int(x) for x in spec.lower().split("x"))
+    return n_labware, loop_depth, steps
+
+
+def build_corpus(workdir: Path, synth_specs: List[str], include_examples: bool = True) -> List[Path]:
+    corpus = []
+    if include_examples:
+        corpus += sorted(EXAMPLES_DIR.rglob("*.py"))
+    for spec in synth_specs:
+        path = workdir / f"synth_{spec}.py"
+        path.write_text(synth_protocol(*_parse_synth(spec)), encoding="utf-8")
+        corpus.append(path)
+    return corpus
+
+
+def _convert_quiet(path: Path, outdir: Path, trace_allocations: bool) -> Dict:
+    # 转换过程里的 print 不计入结果，也不刷屏
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        return convert_file(path, outdir, (Path(".").resolve(), path.parent.resolve()), profile=True,
+                            trace_allocations=trace_allocations)
+
+
+def bench_one(path: Path, outdir: Path, repeat: int) -> Dict:
+    """
+    cold：每次转换前清掉进程内的器材索引 / 器材缓存（模块 import 不算在内）；
+    warm：缓存已经是热的，相当于 watch / server 里的重复转换。
+    计时的几轮都不开 tracemalloc，峰值内存单独再跑一次。
+    """
+    cold_walls, walls, stage_walls = [], [], {}
+    result = None
+    for _ in range(repeat):
+        clear_process_caches()
+        result = _convert_quiet(path, outdir, trace_allocations=False)
+        if result["status"] != "ok":
+            return {"name": path.name, "status": "error", "error": result["error"]}
+        cold_walls.append(result["seconds"])
+    for _ in range(repeat):
+        result = _convert_quiet(path, outdir, trace_allocations=False)
+        profiler = StageProfiler(trace_allocations=False)
+        profiler.extend(result["profile"])
+        for stage, t in profiler.summary().items():
+            stage_walls.setdefault(stage, []).append(t["wall_s"])
+        walls.append(result["seconds"])
+    traced = _convert_quiet(path, outdir, trace_allocations=True)
+    wall = statistics.median(walls)
+    return {
+        "name": path.name,
+        "status": "ok",
+        "wall_s": wall,
+        "cold_wall_s": statistics.median(cold_walls),
+        "conversions_per_s": 1.0 / wall if wall else float("inf"),
+        "stages": {stage: statistics.median(v) for stage, v in stage_walls.items()},
+        "peak_bytes": max(r.get("peak_bytes", 0) for r in traced["profile"] or [{}]),
+        "script_bytes": Path(result["output"]).stat().st_size,
+    }
+
+
+def compare(results: List[Dict], baseline: Dict, max_slowdown: float) -> List[str]:
+    """返回慢于基线 max_slowdown 倍（或基线成功、现在失败）的输入描述。"""
+    base = {r["name"]: r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        b = base.get(r["name"])
+        if b is None or b["status"] != "ok":
+            continue
+        if r["status"] != "ok":
+            regressions.append(f"{r['name']}: now fails ({r['error']})")
+            continue
+        ratio = r["wall_s"] / b["wall_s"] if b["wall_s"] else 1.0
+        r["vs_baseline"] = ratio
+        if ratio > max_slowdown:
+            regressions.append(f"{r['name']}: {ratio:.2f}x slower ({b['wall_s']:.4f}s → {r['wall_s']:.4f}s)")
+        if b.get("cold_wall_s"):     # 旧基线没有 cold 数据
+            cold = r["cold_wall_s"] / b["cold_wall_s"]
+            if cold > max_slowdown:
+                regressions.append(f"{r['name']}: {cold:.2f}x slower cold "
+                                   f"({b['cold_wall_s']:.4f}s → {r['cold_wall_s']:.4f}s)")
+    return regressions
+
+
+def print_table(results: List[Dict]):
+    print(f"{'input':<32}{'conv/s':>9}{'wall s':>9}{'cold s':>9}{'peak KiB':>10}{'script KiB':>12}{'vs base':>9}  slowest stage")
+    for r in results:
+        if r["status"] != "ok":
+            print(f"{r['name']:<32}  ERROR {r['error']}")
+            continue
+        stage, t = max(((s, t) for s, t in r["stages"].items() if s != "convert_file"),
+                       key=lambda kv: kv[1], default=("-", 0.0))
+        ratio = f"{r['vs_baseline']:.2f}x" if "vs_baseline" in r else "-"
+        print(f"{r['name']:<32}{r['conversions_per_s']:>9.2f}{r['wall_s']:>9.4f}{r['cold_wall_s']:>9.4f}"
+              f"{r['peak_bytes'] / 1024:>10.1f}{r['script_bytes'] / 1024:>12.1f}{ratio:>9}  {stage} {t:.4f}s")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the OT-to-PLR conversion pipeline")
+    ap.add_argument("--synth", action="append", metavar="LxDxS",
+                    help="synthetic protocol: L labware, loop depth D, S steps per loop (repeatable)")
+    ap.add_argument("--no-examples", action="store_true", help="skip the 'OT examples' scripts")
+    ap.add_argument("--repeat", default=3, type=int, help="cold and warm conversions per input; medians are reported")
+    ap.add_argument("--baseline", type=Path, help="baseline JSON to compare against")
+    ap.add_argument("--save-baseline", type=Path, help="write this run as a baseline JSON")
+    ap.add_argument("--max-slowdown", default=1.5, type=float,
+                    help="fail when an input is this many times slower than the baseline")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        corpus = build_corpus(tmp, args.synth or DEFAULT_SYNTH, include_examples=not args.no_examples)
+        results = [bench_one(p, tmp / "out", args.repeat) for p in corpus]
+
+    regressions = []
+    if args.baseline is not None:
+        regressions = compare(results, json.loads(args.baseline.read_text(encoding="utf-8")),
+                              args.max_slowdown)
+    print_table(results)
+    if args.save_baseline is not None:
+        args.save_baseline.write_text(json.dumps({"results": results}, indent=2), encoding="utf-8")
+    if regressions:
+        print("\nRegressions against baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
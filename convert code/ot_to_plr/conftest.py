@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 转换器的模块互相平铺 import（from context import ...），和 python main.py 一样把本目录放进 sys.path
+sys.path.insert(0, str(Path(__file__).resolve().parent))
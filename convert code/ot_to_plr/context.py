@@ -0,0 +1,161 @@
+import ast
+import contextlib
+import hashlib
+import threading
+from contextlib import nullcontext
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Sequence
+from labware_loader import LabwareIndex, LabwareSpec
+
+_LEVEL_TAGS = {"warning": "WARN", "error": "ERROR", "debug": "DEBUG", "info": "INFO"}
+
+
+@dataclass
+class Diagnostic:
+    level: str     # error / warning / debug / info
+    stage: str
+    message: str
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"level": self.level, "stage": self.stage, "message": self.message}
+
+
+def print_diagnostic(level: str, message: str):
+    """不收集诊断时（命令行）的默认输出：[WARN] ... / [DEBUG] ..."""
+    print(f"[{_LEVEL_TAGS.get(level, level.upper())}] {message}")
+
+
+class SharedLabwareCache:
+    """
+    进程内共享的器材解析缓存：load_name -> (pylabrobot 内置符号 或 None, 自定义器材的 LabwareSpec 或 None)。
+    缓存的是解析结果而不是代码，普通 / --runtime 两种脚本各自按 spec 生成代码。
+    条目写入后不再修改，所以多个转换可以并发读取；写入由锁保护。
+    """
+    def __init__(self):
+        self._entries: Dict[Tuple[str, Tuple[Path, ...]], Tuple[Optional[str], Optional[LabwareSpec]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, load_name: str, json_dirs: Tuple[Path, ...]
+            ) -> Optional[Tuple[Optional[str], Optional[LabwareSpec]]]:
+        return self._entries.get((load_name, json_dirs))
+
+    def put(self, load_name: str, json_dirs: Tuple[Path, ...], builtin_symbol: Optional[str],
+            spec: Optional[LabwareSpec]):
+        with self._lock:
+            # 先写入的为准，保证所有读者看到同一份结果
+            self._entries.setdefault((load_name, json_dirs), (builtin_symbol, spec))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate(self, load_name: str):
+        """JSON 定义改了以后丢掉对应条目（所有目录组）。"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == load_name]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+SHARED_LABWARE_CACHE = SharedLabwareCache()
+
+# 进程内按目录组缓存的 LabwareIndex；进程池 worker 由 install_labware_index 预先填好
+_INDEXES: Dict[Tuple[Path, ...], LabwareIndex] = {}
+_INDEX_LOCK = threading.Lock()
+
+
+def get_labware_index(json_dirs: Tuple[Path, ...]) -> LabwareIndex:
+    with _INDEX_LOCK:
+        if json_dirs not in _INDEXES:
+            _INDEXES[json_dirs] = LabwareIndex(json_dirs)
+        return _INDEXES[json_dirs]
+
+
+def install_labware_index(index: LabwareIndex):
+    """把父进程建好的索引装进当前进程，避免再遍历一次目录。"""
+    with _INDEX_LOCK:
+        _INDEXES[index.dirs] = index
+
+
+def clear_process_caches():
+    """丢掉进程内的器材索引和器材解析缓存（bench 测冷启动用）；已 import 的模块不受影响。"""
+    SHARED_LABWARE_CACHE.clear()
+    with _INDEX_LOCK:
+        _INDEXES.clear()
+
+
+class AstCache:
+    """展开后源码的 sha256 -> ast.Module。只读使用（OTAnalyzer 不改树），超出上限时整体清空。"""
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._trees: Dict[str, ast.Module] = {}
+        self._lock = threading.Lock()
+
+    def parse(self, source: str) -> ast.Module:
+        key = hashlib.sha256(source.encode("utf-8")).hexdigest()
+        tree = self._trees.get(key)
+        if tree is None:
+            tree = ast.parse(source)
+            with self._lock:
+                if len(self._trees) >= self.max_entries:
+                    self._trees.clear()
+                self._trees[key] = tree
+        return tree
+
+
+@dataclass
+class ConversionOptions:
+    """生成脚本的选项。"""
+    asyncio_main: bool = False   # True: 生成 async def main() + asyncio.run；False: notebook 风格的顶层 await
+    headless: bool = False       # True: 不 import / 启动 Visualizer（CI 里批量仿真用）
+    use_runtime: bool = False    # True: 生成只 import plr_runtime 的精简脚本，并把运行时放进输出目录
+    static_tips: bool = False    # True: 转换时给每次 pick_up_tip 分配具体枪头，枪头不够直接报错
+
+
+class ConversionContext:
+    """
+    一次转换的全部可变状态：内置器材映射、本次用到的器材代码、分析器结果。
+    每个转换各建一个 context，互不干扰；跨转换复用的只有只读的 shared 缓存。
+    """
+    def __init__(self, json_dirs: Sequence[Path] = (Path("."),),
+                 shared: Optional[SharedLabwareCache] = None,
+                 ast_cache: Optional[AstCache] = None,
+                 profiler=None,
+                 options: Optional[ConversionOptions] = None,
+                 diagnostics: Optional[List[Diagnostic]] = None):
+        self.json_dirs: Tuple[Path, ...] = tuple(Path(d).resolve() for d in json_dirs)
+        self.shared = SHARED_LABWARE_CACHE if shared is None else shared
+        self.index = get_labware_index(self.json_dirs)
+        self.class_map: Dict[str, str] = {}       # load_name -> pylabrobot.resources.opentrons 符号
+        self.labware_cache: Dict[str, str] = {}   # load_name -> 自定义类代码（内置器材为 ""）
+        self.labware_files: Dict[str, Path] = {}  # load_name -> 用到的自定义器材 JSON
+        self.analyzer = None                      # OTAnalyzer，由 generate_plr_script 填充
+        self.output_changed = None                # 脚本是否真的写盘（内容相同则跳过），由 generate_plr_script 填充
+        self.ast_cache = ast_cache
+        self.profiler = profiler                  # profiling.StageProfiler，None 表示不记录
+        self.options = options if options is not None else ConversionOptions()
+        # 分析器等阶段报告的问题；None 时直接打印（命令行），api.convert 传列表收集（不碰 stdout）
+        self.diagnostics = diagnostics
+        self.current_stage: Optional[str] = None
+
+    @contextlib.contextmanager
+    def stage(self, name: str, **args):
+        """给流水线阶段计时（没有 profiler 时不计时），并记下当前阶段供 report 使用。"""
+        outer, self.current_stage = self.current_stage, name
+        try:
+            with self.profiler.stage(name, **args) if self.profiler is not None else nullcontext():
+                yield
+        finally:
+            self.current_stage = outer
+
+    def report(self, level: str, message: str):
+        if self.diagnostics is None:
+            print_diagnostic(level, message)
+        else:
+            self.diagnostics.append(Diagnostic(level, self.current_stage or "", message))
+
+    def parse(self, source: str) -> ast.Module:
+        return self.ast_cache.parse(source) if self.ast_cache is not None else ast.parse(source)
@@ -1,5 +1,6 @@
 import re
 import ast
+from context import print_diagnostic
 
 def expand_regex_operation(line, loop_var=None, loop_value=None):
     """
@@ -46,7 +47,7 @@ def expand_list_comprehension(code: str):
             
             return expanded_code
 
-def expand_tiprack(match):
+def expand_tiprack(match, report=print_diagnostic):
     """
     专门处理tiprack这样的特殊情况
     """
@@ -63,5 +64,5 @@ def expand_tiprack(match):
             result.append(f"{indent}{var_name}.append(ctx.load_labware('{labware_type}', {slot}))")
         return '\n'.join(result)
     except Exception as e:
-        print(f"Error expanding tiprack: {e}")
+        report("warning", f"Error expanding tiprack: {e}")
         return match.group(0)  # 返回原始文本
\ No newline at end of file
@@ -1,12 +1,96 @@
 import json, textwrap
+import threading
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple, Union, TYPE_CHECKING
 from importlib import import_module
 
-LABWARE_CACHE: Dict[str, str] = {}
+if TYPE_CHECKING:
+    from context import ConversionContext
+
+# NOTE: 不再需要人工维护映射表；内置器材映射记录在 ConversionContext.class_map 里
+
+CUSTOM_LABWARE_DIR = Path(__file__).parent / "custom_labware"
 
-# NOTE: 不再需要人工维护映射表，保留一个自动记录用
+# 旧接口 labware_json_to_plr(load_name, json_dir) 用的进程级状态（和以前一样按 load_name 缓存）
 BUILTIN_CLASSMAP: Dict[str, str] = {}
+LABWARE_CACHE: Dict[str, str] = {}
+_LEGACY_CONTEXTS: Dict[Path, "ConversionContext"] = {}
+
+
+class LabwareIndex:
+    """
+    自定义器材 JSON 的索引：load_name -> JSON 路径。按需建立：
+    - 第一次 find 时才遍历目录，只记录 *.json 的路径，不解析；
+    - 文件名（stem）等于 load_name 时直接命中；
+    - 否则才逐个读还没看过的 JSON，只解析含 "loadName" 的文件，每个文件最多解析一次，
+      找到就停。
+    只含 str/Path/dict，可以 pickle 给进程池的 worker 复用。
+    """
+    def __init__(self, dirs: Tuple[Path, ...]):
+        self.dirs = tuple(dirs)
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """丢掉已知结果，下次 find 时重新遍历（watch 模式下器材 JSON 有变动时调用）。"""
+        self._files: Optional[List[Path]] = None    # 遍历到的全部 *.json，None = 还没遍历
+        self._stems: Dict[str, Path] = {}
+        self._unparsed = 0                           # _files[_unparsed:] 还没读过
+        self.paths: Dict[str, Path] = {}             # 已经确定的 load_name -> JSON
+
+    def _walk(self):
+        files: List[Path] = []
+        for d in (CUSTOM_LABWARE_DIR,) + self.dirs:
+            if d.is_dir():
+                files.extend(sorted(d.glob("**/*.json")))
+        self._files = files
+        for path in files:
+            self._stems.setdefault(path.stem, path)
+
+    def find(self, load_name: str) -> Optional[Path]:
+        with self._lock:
+            if load_name in self.paths:
+                return self.paths[load_name]
+            if self._files is None:
+                self._walk()
+            path = self._stems.get(load_name)
+            while path is None and self._unparsed < len(self._files):
+                candidate = self._files[self._unparsed]
+                self._unparsed += 1
+                try:
+                    data = candidate.read_bytes()
+                    if b'"loadName"' not in data:
+                        continue    # 不是 labware 定义（比如协议输出的 json），跳过
+                    name = json.loads(data)["parameters"]["loadName"]
+                except Exception:
+                    continue
+                self.paths.setdefault(name, candidate)
+                if name == load_name:
+                    path = candidate
+            if path is not None:
+                self.paths.setdefault(load_name, path)
+            return path
+
+    def __len__(self):
+        """已确定的 load_name 数（按需建立，不是目录里的 JSON 总数）。"""
+        return len(self.paths)
+
+def preload_builtins():
+    """提前 import pylabrobot 的 opentrons 器材模块（常驻进程 / worker 预热用）。"""
+    try:
+        import_module("pylabrobot.resources.opentrons")
+    except ImportError:
+        pass
+
 
 # ------------- helper: runtime probe ---------------------------------
 def _probe_builtin(load_name: str) -> str | None:
@@ -22,25 +106,98 @@ def _probe_builtin(load_name: str) -> str | None:
     # 有时文件名里带版本，pylabrobot 侧可能只有前缀，例如 "nest_12_reservoir_15ml_v1"
     # 你可以在这里再加更多花式规则
     return None
+
+def _tuple_literal(items, width: int = 88, indent: int = 8) -> str:
+    """把一串字面量排成多行 tuple 源码，每行不超过 width 个字符。"""
+    rows, row = [], ""
+    for item in items:
+        piece = f"{item}, "
+        if row and indent + len(row) + len(piece) > width:
+            rows.append(row.rstrip())
+            row = ""
+        row += piece
+    rows.append(row.rstrip())
+    pad = " " * indent
+    return "(\n" + "".join(f"{pad}{r}\n" for r in rows) + " " * (indent - 4) + ")"
+
+def _axis_literal(values) -> str:
+    """坐标数组；所有井取值相同时（比如 z）退化成 (v,) * n。"""
+    values = [f"{v:.2f}" for v in values]
+    if len(set(values)) == 1:
+        return f"({values[0]},) * {len(values)}"
+    return _tuple_literal(values)
 # ---------------------------------------------------------------------
 
-def labware_json_to_plr(load_name: str, json_dir: Path = Path(".")) -> str:
-    # 缓存
-    if load_name in LABWARE_CACHE:
-        return LABWARE_CACHE[load_name]
+class LabwareSpec(NamedTuple):
+    """从 OT 器材 JSON 里取出的、生成 WellPlate 需要的全部数据（井按 ordering 排列）。"""
+    load_name: str
+    size: Tuple[float, float, float]        # 器材外形 x / y / z
+    well_size: Tuple[float, float, float]   # 井的 x / y / 深度
+    wells: Tuple[str, ...]
+    x: Tuple[float, ...]
+    y: Tuple[float, ...]
+    z: Tuple[float, ...]
+
+
+def _legacy_context(json_dir: Union[Path, str]) -> "ConversionContext":
+    """旧调用方式：每个 json_dir 一个 context，共用模块级的 BUILTIN_CLASSMAP / LABWARE_CACHE。"""
+    from context import ConversionContext   # context 也 import 本模块，这里延迟导入
+
+    key = Path(json_dir).resolve()
+    ctx = _LEGACY_CONTEXTS.get(key)
+    if ctx is None:
+        ctx = _LEGACY_CONTEXTS[key] = ConversionContext(json_dirs=(key,))
+        ctx.class_map = BUILTIN_CLASSMAP
+        ctx.labware_cache = LABWARE_CACHE
+    return ctx
 
+
+def labware_json_to_plr(load_name: str, ctx: Union["ConversionContext", Path, str] = Path(".")) -> str:
+    """
+    返回 load_name 对应的自定义器材代码（内置器材返回 ""），并把内置符号记到 ctx.class_map。
+    普通模式下是 WellPlate 子类；--runtime 模式下是一行 plr_runtime.custom_labware(...) 调用。
+    兼容旧签名 labware_json_to_plr(load_name, json_dir)：内置符号记到模块级 BUILTIN_CLASSMAP。
+    """
+    if isinstance(ctx, (Path, str)):
+        ctx = _legacy_context(ctx)
+
+    # 本次转换内的缓存
+    if load_name in ctx.labware_cache:
+        return ctx.labware_cache[load_name]
+
+    # 跨转换共享的只读缓存，未命中时解析一次再放进去
+    entry = ctx.shared.get(load_name, ctx.json_dirs)
+    if entry is None:
+        ctx.shared.put(load_name, ctx.json_dirs, *_resolve_labware(load_name, ctx.index))
+        entry = ctx.shared.get(load_name, ctx.json_dirs)
+
+    builtin_symbol, spec = entry
+    if spec is None:
+        code = ""
+    elif ctx.options.use_runtime:
+        code = _labware_runtime_code(spec)
+    else:
+        code = _labware_class_code(spec)
+    if builtin_symbol:
+        ctx.class_map[load_name] = builtin_symbol   # 记录给 script_builder 用
+    else:
+        json_path = ctx.index.find(load_name)
+        if json_path is not None:
+            ctx.labware_files[load_name] = json_path    # watch 模式据此判断依赖
+    ctx.labware_cache[load_name] = code             # 空串代表“已解决，且不需自定义类”
+    return code
+
+
+def _resolve_labware(load_name: str, index: LabwareIndex) -> Tuple[Optional[str], Optional[LabwareSpec]]:
     # 1️⃣ 先探测 pylabrobot 内置器材
     builtin_symbol = _probe_builtin(load_name)
     if builtin_symbol:
-        BUILTIN_CLASSMAP[load_name] = builtin_symbol   # 记录给 script_builder 用
-        LABWARE_CACHE[load_name] = ""                  # 空串代表“已解决，且不需自定义类”
-        return ""
-
-    # 2️⃣ 若内置里没有，再去找 JSON
-    custom_dir = Path(__file__).parent / "custom_labware"
-    candidates = list(custom_dir.glob(f"**/{load_name}.json")) + list(json_dir.glob(f"**/{load_name}.json"))
-    if candidates:
-        meta = json.loads(candidates[0].read_text())
+        return builtin_symbol, None
+
+    # 2️⃣ 若内置里没有，再去索引里找 JSON
+    json_path = index.find(load_name)
+    if json_path is not None:
+        meta = json.loads(json_path.read_text(encoding="utf-8"))
     else:
         # 3️⃣ 最后用 opentrons 官方包在线抓取
         from opentrons.protocol_api.labware import get_labware_definition
@@ -49,7 +206,10 @@ def labware_json_to_plr(load_name: str, json_dir: Path = Path(".")) -> str:
         except Exception as e:
             raise FileNotFoundError(f"Labware '{load_name}' not found locally or online: {e}")
 
-    # ……以下保持不变：生成 WellPlate 子类代码
+    return None, _labware_spec(load_name, meta)
+
+
+def _labware_spec(load_name: str, meta: Dict[str, Any]) -> LabwareSpec:
     wells = meta["wells"]
     first = wells[next(iter(wells))]
     depth = first["depth"]
@@ -59,15 +219,51 @@ def labware_json_to_plr(load_name: str, json_dir: Path = Path(".")) -> str:
         size_x = first["xDimension"]
         size_y = first["yDimension"]
 
+    # 按 ordering（列优先）排列井名，没有 ordering 时保持 JSON 里的顺序
+    names = tuple(w for column in meta.get("ordering", []) for w in column) or tuple(wells)
+    dims = meta["dimensions"]
+    return LabwareSpec(
+        load_name,
+        (dims["xDimension"], dims["yDimension"], dims["zDimension"]),
+        (size_x, size_y, depth),
+        names,
+        tuple(wells[w]["x"] for w in names),
+        tuple(wells[w]["y"] for w in names),
+        tuple(wells[w]["z"] for w in names),
+    )
+
+
+def _labware_class_code(spec: LabwareSpec) -> str:
+    # 生成 WellPlate 子类代码
+    # 紧凑井表：名字 + 坐标数组，在 __init__ 里用循环构建，避免每个井生成一行
+    load_name = spec.load_name
+    size_x, size_y, depth = spec.well_size
     code = textwrap.dedent(f"""
 class {load_name}(WellPlate):
-    def __init__(self, name: str="{load_name}", size_x={meta["dimensions"]["xDimension"]},
-                 size_y={meta["dimensions"]["yDimension"]}, size_z={meta["dimensions"]["zDimension"]}):
+    _WELL_NAMES = {_tuple_literal(repr(w) for w in spec.wells)}
+    _WELL_X = {_axis_literal(spec.x)}
+    _WELL_Y = {_axis_literal(spec.y)}
+    _WELL_Z = {_axis_literal(spec.z)}
+
+    def __init__(self, name: str="{load_name}", size_x={spec.size[0]},
+                 size_y={spec.size[1]}, size_z={spec.size[2]}):
         super().__init__(name=name, size_x=size_x, size_y=size_y, size_z=size_z)
+        for w, x, y, z in zip(self._WELL_NAMES, self._WELL_X, self._WELL_Y, self._WELL_Z):
+            self.add_child(Well(name=w, size_x={size_x}, size_y={size_y}, size_z={depth},
+                                location=Coordinate(x, y, z)))
+""")
+    return code
+
+
+def _labware_runtime_code(spec: LabwareSpec) -> str:
+    # --runtime 模式：只写数据，类由 plr_runtime.custom_labware 在运行时构建
+    return textwrap.dedent(f"""
+{spec.load_name} = custom_labware(
+    "{spec.load_name}", size=({spec.size[0]}, {spec.size[1]}, {spec.size[2]}),
+    well_size=({spec.well_size[0]}, {spec.well_size[1]}, {spec.well_size[2]}),
+    wells={_tuple_literal(repr(w) for w in spec.wells)},
+    x={_axis_literal(spec.x)},
+    y={_axis_literal(spec.y)},
+    z={_axis_literal(spec.z)},
+)
 """)
-    for w, spec in wells.items():
-        code += f'        self.add_child(Well(name="{w}", size_x={size_x}, size_y={size_y}, size_z={depth}, ' \
-                f'location=Coordinate({spec["x"]:.2f}, {spec["y"]:.2f}, {spec["z"]:.2f}))\\n'
-    
-    LABWARE_CACHE[load_name] = code
-    return code
\ No newline at end of file
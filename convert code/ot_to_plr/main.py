@@ -1,30 +1,147 @@
 import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from script_builder import generate_plr_script
 import traceback
 from transform import transform_explicit
+from context import ConversionContext, ConversionOptions, install_labware_index, get_labware_index
+from labware_loader import preload_builtins
+from profiling import StageProfiler
+from watcher import ConversionWatcher
+
+
+def _init_worker(index):
+    """进程池 worker 初始化：装上父进程的器材索引，并提前 import pylabrobot。"""
+    install_labware_index(index)
+    preload_builtins()
+
+
+def convert_file(p: Path, outdir: Path, json_dirs, show_expanded: bool = False,
+                 profile: bool = False, options: ConversionOptions | None = None,
+                 trace_allocations: bool = True) -> dict:
+    """
+    转换单个文件，返回 {path, status, seconds, output, error, profile}，不抛异常。
+    profile=True 时 result["profile"] 是 StageProfiler 的记录列表；
+    trace_allocations=False 时只记时间，不开 tracemalloc（它会让转换慢好几倍）。
+    """
+    start = time.perf_counter()
+    result = {"path": str(p), "status": "ok", "seconds": 0.0, "output": None, "error": None,
+              "profile": None}
+    profiler = StageProfiler(trace_allocations) if profile else None
+    ctx = ConversionContext(json_dirs=json_dirs, profiler=profiler, options=options)
+    try:
+        with ctx.stage("convert_file", file=str(p)):
+            with ctx.stage("transform_explicit"):
+                code_expended = transform_explicit(p, report=ctx.report)
+            if show_expanded:
+                print(code_expended)
+            result["output"] = str(generate_plr_script(code_expended, outdir, p, ctx=ctx))
+    except Exception as e:
+        traceback.print_exc()
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - start
+    if profiler is not None:
+        profiler.close()
+        result["profile"] = profiler.records
+    return result
+
+
+def _print_summary(results, elapsed: float):
+    ok = sum(r["status"] == "ok" for r in results)
+    for r in results:
+        if r["status"] == "ok":
+            print(f"[OK]    {r['seconds']:7.2f}s  {r['path']} → {r['output']}")
+        else:
+            print(f"[ERROR] {r['seconds']:7.2f}s  {r['path']}: {r['error']}")
+    print(f"{ok}/{len(results)} converted in {elapsed:.2f}s")
+
+
 def main():
 
     ap = argparse.ArgumentParser(description="OT-to-PLR converter")
-    ap.add_argument("paths", nargs="+", type=Path)
+    ap.add_argument("paths", nargs="*", type=Path)
     ap.add_argument("--outdir", default="../../plr_out", type=Path)
+    ap.add_argument("--jobs", "-j", default=1, type=int,
+                    help="number of worker processes (0 = one per CPU core)")
+    ap.add_argument("--labware-dir", action="append", default=[], type=Path,
+                    help="extra directory to search for custom labware JSON (repeatable)")
+    ap.add_argument("--show-expanded", action="store_true",
+                    help="print the loop-expanded OT code of every file")
+    ap.add_argument("--watch", type=Path, metavar="DIR",
+                    help="keep running and reconvert OT scripts under DIR when they change")
+    ap.add_argument("--interval", default=1.0, type=float,
+                    help="polling interval in seconds for --watch")
+    ap.add_argument("--asyncio-main", action="store_true",
+                    help="emit an async def main() run via asyncio.run instead of notebook-style top-level await")
+    ap.add_argument("--headless", action="store_true",
+                    help="do not import or start the pylabrobot Visualizer in generated scripts")
+    ap.add_argument("--runtime", action="store_true",
+                    help="emit thin scripts that import the shared plr_runtime module (copied into --outdir)")
+    ap.add_argument("--static-tips", action="store_true",
+                    help="assign concrete tip spots at conversion time; fail if the racks run out")
+    ap.add_argument("--profile", type=Path, metavar="REPORT.json",
+                    help="record wall/CPU time and allocations per pipeline stage into a JSON report")
+    ap.add_argument("--chrome-trace", type=Path, metavar="TRACE.json",
+                    help="with --profile, also write a chrome://tracing file")
     args = ap.parse_args()
+    if not args.paths and args.watch is None:
+        ap.error("give at least one OT script or --watch DIR")
+    if args.chrome_trace is not None and args.profile is None:
+        ap.error("--chrome-trace needs --profile REPORT.json")
+
+    # 所有文件共用一组器材目录，只建一次索引：当前目录、--labware-dir、各协议所在目录
+    json_dirs = [Path("."), *args.labware_dir, *(p.parent for p in args.paths)]
+    if args.watch is not None:
+        json_dirs.append(args.watch)
+    json_dirs = tuple(dict.fromkeys(d.resolve() for d in json_dirs))
+
+    options = ConversionOptions(asyncio_main=args.asyncio_main, headless=args.headless,
+                                use_runtime=args.runtime, static_tips=args.static_tips)
+    if args.watch is not None:
+        get_labware_index(json_dirs)
+        preload_builtins()
+        ConversionWatcher(args.watch, args.outdir, json_dirs, options=options).run(args.interval)
+        return
+
+    jobs = args.jobs or os.cpu_count() or 1
+    start = time.perf_counter()
+    results = []
+    if jobs == 1 or len(args.paths) == 1:
+        for p in args.paths:
+            results.append(convert_file(p, args.outdir, json_dirs, args.show_expanded,
+                                        profile=args.profile is not None, options=options))
+    else:
+        args.outdir.mkdir(parents=True, exist_ok=True)
+        index = get_labware_index(json_dirs)
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(index,)) as pool:
+            futures = [pool.submit(convert_file, p, args.outdir, json_dirs, args.show_expanded,
+                                   profile=args.profile is not None, options=options)
+                       for p in args.paths]
+            for fut in as_completed(futures):
+                results.append(fut.result())
+        order = {str(p): i for i, p in enumerate(args.paths)}
+        results.sort(key=lambda r: order[r["path"]])
+
+    _print_summary(results, time.perf_counter() - start)
 
-    for p in args.paths:
-        
-        try:
-            code_expended = transform_explicit(p)
-            # write the expanded code to a temporary file
-            #with open(args.outdir / p.name, "w") as f:
-            #    f.write(code_expended)
-            print(code_expended)
-            generate_plr_script(code_expended, args.outdir, p)
-        except Exception as e:
-            traceback.print_exc()
-            print(f"[ERROR] Failed to process {p}: {e}")
+    if args.profile is not None:
+        profiler = StageProfiler(trace_allocations=False)   # 只用来汇总 worker 的记录
+        for r in results:
+            profiler.extend(r["profile"] or [])
+        profiler.print_summary()
+        profiler.write_json(args.profile)
+        if args.chrome_trace is not None:
+            profiler.write_chrome_trace(args.chrome_trace)
 
 if __name__ == "__main__":
     main()
 
 
-# python main.py "../../OT examples/sci-lucif-assay4.py"
\ No newline at end of file
+# python main.py "../../OT examples/sci-lucif-assay4.py"
+# python main.py --jobs 8 ../../protocols/*.py
+# python main.py --watch ../../protocols --outdir ../../plr_out
+# python main.py --profile profile.json --chrome-trace trace.json "../../OT examples/sci-lucif-assay4.py"
+# python server.py --port 8765 --workers 4          # 常驻服务，见 server.py
@@ -0,0 +1,110 @@
+"""
+生成脚本共用的运行时库（--runtime 模式下，转换器把它复制到输出目录）。
+
+生成的脚本只保留协议本身：常量、自定义器材数据、声明式的 LAYOUT 和步骤，
+自定义器材类的构建、建 deck、取枪头、液体初始化、启动/收尾都在这里。
+改进这里的逻辑不需要重新转换协议。
+
+脚本开头调用 require(API)，运行时的 API 版本不兼容时立即报错。
+API 2 在 1 的基础上加了 custom_labware / set_liquids / run，API 1 的脚本照常运行。
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+RUNTIME_VERSION = "1.1.0"
+RUNTIME_API = 2
+RUNTIME_MIN_API = 1
+
+
+def require(api: int):
+    """生成脚本所需的 API 版本本运行时不支持时报错。"""
+    if not RUNTIME_MIN_API <= api <= RUNTIME_API:
+        raise RuntimeError(
+            f"generated script needs plr_runtime API {api}, "
+            f"but plr_runtime {RUNTIME_VERSION} provides API {RUNTIME_API}; reconvert the protocol"
+        )
+
+
+def custom_labware(load_name: str, *, size: Tuple[float, float, float], well_size: Tuple[float, float, float],
+                   wells: Sequence[str], x: Sequence[float], y: Sequence[float], z: Sequence[float]):
+    """
+    用转换器从 OT 器材 JSON 取出的数据构建 WellPlate 子类（和普通模式内联生成的类一样）。
+    size 是器材外形，well_size 是井的 x / y / 深度，wells / x / y / z 逐井对应。
+    """
+    from pylabrobot.resources import Coordinate, Well, WellPlate
+
+    well_x, well_y, depth = well_size
+
+    def __init__(self, name: str = load_name, size_x=size[0], size_y=size[1], size_z=size[2]):
+        WellPlate.__init__(self, name=name, size_x=size_x, size_y=size_y, size_z=size_z)
+        for w, wx, wy, wz in zip(wells, x, y, z):
+            self.add_child(Well(name=w, size_x=well_x, size_y=well_y, size_z=depth,
+                                location=Coordinate(wx, wy, wz)))
+
+    return type(load_name, (WellPlate,), {"__init__": __init__})
+
+
+def build_deck(lh, layout: Sequence[Tuple[str, Any, Any, Optional[str]]]) -> Dict[str, Any]:
+    """
+    按声明式布局放置器材，返回 {key: resource}。
+    layout 每项为 (key, cls, slot, name)；key == "tip_racks" 时 slot 是槽位列表，
+    返回值里对应一个 TipRack 列表。
+    """
+    deck: Dict[str, Any] = {}
+    for key, cls, slot, name in layout:
+        if key == "tip_racks":
+            racks = []
+            for slot_i in slot:
+                tr = cls(name=f"tiprack_{slot_i}")
+                lh.deck.assign_child_at_slot(tr, slot=slot_i)
+                racks.append(tr)
+            deck["tip_racks"] = racks
+        else:
+            resource = cls(name=name)
+            lh.deck.assign_child_at_slot(resource, slot=slot)
+            deck[key] = resource
+    return deck
+
+
+def tip_gen(tip_racks: Iterable):
+    """Yield the next available tip."""
+    for rack in tip_racks:
+        for tip in rack:
+            yield tip
+    raise RuntimeError("Out of tips!")
+
+
+def set_liquids(resource, liquids: List[Tuple[Optional[str], float]], n_wells: Optional[int] = None):
+    """给器材的各个井设置液体；n_wells 给定时用 (None, 0) 补齐。"""
+    if n_wells is not None:
+        liquids = list(liquids) + [(None, 0)] * (n_wells - len(liquids))
+    resource.set_well_liquids(liquids)
+
+
+async def setup(layout, *, backend=None, headless: bool = True, tracking: bool = True):
+    """
+    创建 LiquidHandler（默认 chatterbox 后端 + OTDeck），按 layout 建 deck 并 setup。
+    返回 (lh, deck, tips)；tips 是枪头生成器，没有枪头盒时为 None。
+    """
+    from pylabrobot.liquid_handling import LiquidHandler
+    from pylabrobot.liquid_handling.backends import LiquidHandlerChatterboxBackend
+    from pylabrobot.resources import set_tip_tracking, set_volume_tracking
+    from pylabrobot.resources.opentrons import OTDeck
+
+    lh = LiquidHandler(backend=backend or LiquidHandlerChatterboxBackend(), deck=OTDeck())
+    deck = build_deck(lh, layout)
+    await lh.setup()
+    if not headless:
+        from pylabrobot.visualizer.visualizer import Visualizer
+        vis = Visualizer(resource=lh)
+        await vis.setup()
+    if tracking:
+        set_tip_tracking(True)
+        set_volume_tracking(True)
+    tips = tip_gen(deck["tip_racks"]) if "tip_racks" in deck else None
+    return lh, deck, tips
+
+
+def run(main):
+    """脚本入口：asyncio.run(main())。"""
+    import asyncio
+    return asyncio.run(main())
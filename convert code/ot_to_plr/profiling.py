@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List
+
+
+class StageProfiler:
+    """
+    记录转换流水线每个阶段的墙钟时间、CPU 时间和内存分配。
+    用法：
+        prof = StageProfiler()
+        with prof.stage("transform_explicit", file="a.py"):
+            ...
+        prof.close()
+        prof.write_json("profile.json"); prof.write_chrome_trace("trace.json")
+    close() 关掉由本 profiler 打开的 tracemalloc（之前已经在跟踪的不动），也可以用 with StageProfiler() as prof。
+    阶段可以嵌套（例如 labware_json_to_plr 在 generate_plr_script 里面），
+    每条记录的 peak_bytes 是该阶段期间相对进入时的内存峰值增量。
+    """
+    def __init__(self, trace_allocations: bool = True):
+        self.trace_allocations = trace_allocations
+        self.records: List[Dict[str, Any]] = []
+        self._origin = time.perf_counter()
+        self._local = threading.local()
+        self._started_tracing = False
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def close(self):
+        """停止内存跟踪（只停自己启动的那次）；之后记录的阶段不再带 alloc/peak。"""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        self.trace_allocations = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _stack(self) -> list:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def stage(self, name: str, **args):
+        stack = self._stack()
+        mem_start = 0
+        if self.trace_allocations:
+            mem_start, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # 把到目前为止的峰值记给外层，再为本阶段重置峰值
+                stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+            tracemalloc.reset_peak()
+        frame = {"peak": mem_start}
+        stack.append(frame)
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            stack.pop()
+            record = {
+                "stage": name,
+                "start_s": wall_start - self._origin,
+                "wall_s": wall,
+                "cpu_s": cpu,
+                "depth": len(stack),
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": args,
+            }
+            if self.trace_allocations:
+                mem_end, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, frame["peak"])
+                record["alloc_bytes"] = mem_end - mem_start
+                record["peak_bytes"] = peak - mem_start
+                if stack:
+                    stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+            self.records.append(record)
+
+    def extend(self, records: List[Dict[str, Any]]):
+        """合并其它进程（--jobs worker）返回的记录。"""
+        self.records.extend(records)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        totals: Dict[str, Dict[str, float]] = {}
+        for r in self.records:
+            t = totals.setdefault(r["stage"], {"count": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                               "alloc_bytes": 0, "peak_bytes": 0})
+            t["count"] += 1
+            t["wall_s"] += r["wall_s"]
+            t["cpu_s"] += r["cpu_s"]
+            t["alloc_bytes"] += r.get("alloc_bytes", 0)
+            t["peak_bytes"] = max(t["peak_bytes"], r.get("peak_bytes", 0))
+        return totals
+
+    def report(self) -> Dict[str, Any]:
+        return {"stages": self.summary(), "records": self.records}
+
+    def write_json(self, path: Path):
+        Path(path).write_text(json.dumps(self.report(), indent=2, ensure_ascii=False), encoding="utf-8")
+
+    def write_chrome_trace(self, path: Path):
+        """chrome://tracing / Perfetto 可以直接打开的 Trace Event 格式。"""
+        events = [{
+            "name": r["stage"],
+            "cat": "ot_to_plr",
+            "ph": "X",
+            "ts": r["start_s"] * 1e6,
+            "dur": r["wall_s"] * 1e6,
+            "pid": r["pid"],
+            "tid": r["tid"],
+            "args": {**r["args"], "cpu_s": r["cpu_s"],
+                     **({"alloc_bytes": r["alloc_bytes"], "peak_bytes": r["peak_bytes"]}
+                        if "alloc_bytes" in r else {})},
+        } for r in self.records]
+        Path(path).write_text(json.dumps({"traceEvents": events}), encoding="utf-8")
+
+    def print_summary(self):
+        print(f"{'stage':<24}{'count':>6}{'wall s':>10}{'cpu s':>10}{'peak KiB':>11}")
+        for name, t in sorted(self.summary().items(), key=lambda kv: -kv[1]["wall_s"]):
+            print(f"{name:<24}{t['count']:>6}{t['wall_s']:>10.4f}{t['cpu_s']:>10.4f}"
+                  f"{t['peak_bytes'] / 1024:>11.1f}")
@@ -0,0 +1,44 @@
+"""
+转换器要用的 Protocol/、define_action/ 下的模块（原子写文件的 file_io、孔位寻址表 well_addressing）。
+
+它们不是包、也不在本目录下；这里按文件路径加载，不改 sys.path。
+（不叫 shared.py：Protocol/shared.py 同名，两边在同一个进程里 import 时会互相顶掉。）
+
+    from repo_modules import file_io, well_addressing
+"""
+import importlib.util
+import sys
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parents[2]
+PROTOCOL_DIR = REPO_DIR / "Protocol"
+DEFINE_ACTION_DIR = REPO_DIR / "define_action"
+
+
+def _load(qualified: str, path: Path):
+    """按路径加载一个叶子模块（不 import 同目录其它模块），每个进程只加载一次。"""
+    module = sys.modules.get(qualified)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(qualified, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[qualified] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[qualified]
+            raise
+    return module
+
+
+def load_protocol_module(name: str):
+    """加载 Protocol/<name>.py。"""
+    return _load(f"Protocol.{name}", PROTOCOL_DIR / f"{name}.py")
+
+
+def load_define_action(name: str):
+    """加载 define_action/<name>.py（和 Protocol/shared.py 用同一个模块名，同进程里只有一份）。"""
+    return _load(f"define_action.{name}", DEFINE_ACTION_DIR / f"{name}.py")
+
+
+file_io = load_protocol_module("file_io")
+well_addressing = load_define_action("well_addressing")
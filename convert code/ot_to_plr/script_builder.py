@@ -1,34 +1,76 @@
-import textwrap, ast, os
+import textwrap, ast
 import asyncio
 from pathlib import Path
 from collections import defaultdict
 from analyze import OTAnalyzer
-from labware_loader import labware_json_to_plr, BUILTIN_CLASSMAP, LABWARE_CACHE
+from context import ConversionContext
+from labware_loader import labware_json_to_plr
 from step_converter import generate_steps
-def generate_plr_script(expended_code: str, outdir: Path, ot_path: Path):
-    BUILTIN_CLASSMAP.clear()
-    LABWARE_CACHE.clear()
+from plr_runtime import RUNTIME_API
+from tip_allocator import TipAllocator, pick_up_channels
+from repo_modules import file_io, well_addressing
 
-    analyzer = OTAnalyzer(expended_code)
-    analyzer.visit(ast.parse(expended_code))
+RUNTIME_SOURCE = Path(__file__).parent / "plr_runtime.py"
+
+
+def install_runtime(outdir: Path) -> Path:
+    """把 plr_runtime.py 放到输出目录，已有且内容相同时不动；旧版本会被更新。"""
+    target = outdir / RUNTIME_SOURCE.name
+    file_io.write_text_if_changed(target, RUNTIME_SOURCE.read_text(encoding="utf-8"))
+    return target
+
+
+def generate_plr_script(expended_code: str, outdir: Path, ot_path: Path,
+                        ctx: ConversionContext | None = None):
+    # 每次转换的状态都挂在 ctx 上，并发转换之间互不影响
+    if ctx is None:
+        ctx = ConversionContext()
+    script = render_plr_script(expended_code, ctx)
+    with ctx.stage("write_script"):
+        outdir.mkdir(parents=True, exist_ok=True)
+        if ctx.options.use_runtime:
+            install_runtime(outdir)
+        out_path = outdir / (ot_path.stem + "_plr.py")
+        # 内容没变时不写（mtime 不变）；否则临时文件 + fsync + rename，崩溃时不会留下半个脚本
+        ctx.output_changed = file_io.write_text_if_changed(out_path, script)
+    print(f"[✓] {ot_path.name} → {out_path}" + ("" if ctx.output_changed else " (unchanged)"))
+    return out_path
+
+
+def render_plr_script(expended_code: str, ctx: ConversionContext) -> str:
+    """展开后的 OT 源码 -> PLR 脚本文本。不读写输出目录（器材 JSON 仍从 ctx.json_dirs 读）。"""
+
+    with ctx.stage("OTAnalyzer.visit"):
+        analyzer = OTAnalyzer(expended_code, report=ctx.report)
+        analyzer.visit(ctx.parse(expended_code))
+    ctx.analyzer = analyzer
 
     # Build custom labware class code only for non‑builtin resources
-    labware_defs = "\n".join(
-        code for code in (
-            labware_json_to_plr(load_name)  # returns "" if builtin
-            for _, load_name, _ in analyzer.labware
+    with ctx.stage("labware_json_to_plr"):
+        labware_defs = "\n".join(
+            code for code in (
+                labware_json_to_plr(load_name, ctx)  # returns "" if builtin
+                for _, load_name, _ in analyzer.labware
+            )
+            if code  # keep only non‑empty strings
         )
-        if code  # keep only non‑empty strings
-    )
+
+    use_runtime = ctx.options.use_runtime
+    # Custom labware classes subclass WellPlate and build their wells in a loop
+    # (with --runtime, plr_runtime.custom_labware builds them from the emitted data)
+    custom_import_line = "from pylabrobot.resources import WellPlate, Well" if labware_defs and not use_runtime else ""
+    # plr_runtime helpers the thin script imports
+    runtime_names = {"require", "setup"} | ({"custom_labware"} if labware_defs else set())
 
     # Collect any builtin resources that labware_json_to_plr recognized
     builtin_import_line = ""
-    if BUILTIN_CLASSMAP:
-        imported_syms = ", ".join(sorted(set(BUILTIN_CLASSMAP.values())))
+    if ctx.class_map:
+        imported_syms = ", ".join(sorted(set(ctx.class_map.values())))
         builtin_import_line = (
             "from pylabrobot.resources.opentrons import (\n"
             f"  {imported_syms}\n)"
         )
+    resource_import_block = "\n".join(l for l in (custom_import_line, builtin_import_line) if l)
     
     # Add constants defined in the run function
     const_lines = []
@@ -51,16 +93,20 @@ def generate_plr_script(expended_code: str, outdir: Path, ot_path: Path):
     
     # Track labware variables for deck dictionary
     deck_dict_items = {}
+    # Same deck as declarative (key, class, slot, name) entries for plr_runtime.build_deck
+    layout_lines = []
     
     # Process tip racks first
     tipracks_exist = False
+    tiprack_slots = []
     for load_name, instances in labware_groups.items():
-        cls_name = BUILTIN_CLASSMAP.get(load_name, load_name)
+        cls_name = ctx.class_map.get(load_name, load_name)
         
         if any(name for name in [load_name, cls_name] if 'tiprack' in name.lower()):
             tipracks_exist = True
             # Generate tiprack specific code with a list
             slots = [slot for _, slot in instances]
+            tiprack_slots = slots
             collection_name = "tipracks"  # Use consistent naming
             
             deck_setup_lines.append(f"    # Tip racks on slots {slots}")
@@ -74,10 +120,14 @@ def generate_plr_script(expended_code: str, outdir: Path, ot_path: Path):
             
             # Add to return dictionary
             deck_dict_items["tip_racks"] = collection_name
+            layout_lines.append(f"    (\"tip_racks\", {cls_name}, {slots}, None),")
     
+    # Well format of the working plate, for well-name lookups
+    working_plate_format = well_addressing.FORMATS[96]
+
     # Process plates and other labware
     for load_name, instances in labware_groups.items():
-        cls_name = BUILTIN_CLASSMAP.get(load_name, load_name)
+        cls_name = ctx.class_map.get(load_name, load_name)
         
         # Skip tipracks as they've been handled separately
         if any(name for name in [load_name, cls_name] if 'tiprack' in name.lower()):
@@ -97,6 +147,7 @@ def generate_plr_script(expended_code: str, outdir: Path, ot_path: Path):
                 elif "24" in cls_name or "24" in load_name:
                     comment = f"    # 24-well plate at slot {slot}"
                     dict_name = "working_plate"
+                    working_plate_format = well_addressing.FORMATS[24]
                 else:
                     comment = f"    # Working plate at slot {slot}"
                     dict_name = "working_plate"
@@ -118,6 +169,7 @@ def generate_plr_script(expended_code: str, outdir: Path, ot_path: Path):
             deck_setup_lines.append(comment)
             deck_setup_lines.append(f"    {var} = {cls_name}(name=\"{var}\")")
             deck_setup_lines.append(f"    lh.deck.assign_child_at_slot({var}, slot={slot})")
+            layout_lines.append(f"    (\"{dict_name}\", {cls_name}, {slot}, \"{var}\"),")
             
             # Add to return dictionary
             deck_dict_items[dict_name] = var
@@ -160,7 +212,11 @@ def generate_plr_script(expended_code: str, outdir: Path, ot_path: Path):
                 medium_vol = volume_constants[0]
             
             # Set up plate wells with volume information
-            if medium_vol:
+            if medium_vol and use_runtime:
+                runtime_names.add("set_liquids")
+                well_definition_lines.append(f"set_liquids(deck[\"working_plate\"], [('culture medium', {medium_vol})] * 12, 96)")
+                well_definition_lines.append("")
+            elif medium_vol:
                 well_definition_lines.append(f"working_plate_volumns = [('culture medium', {medium_vol})] * 12 + [(None, 0)] * (96-12)")
                 well_definition_lines.append(f"deck[\"working_plate\"].set_well_liquids(working_plate_volumns)")
                 well_definition_lines.append("")
@@ -185,8 +241,12 @@ def generate_plr_script(expended_code: str, outdir: Path, ot_path: Path):
             
             # Generate the reagent info line
             reagent_str = ", ".join(reagent_list)
-            well_definition_lines.append(f"reagent_info = [{reagent_str}] + [(None, 0)] * (12 - {len(reagent_list)})")
-            well_definition_lines.append("deck[\"reagent_res\"].set_well_liquids(reagent_info)")
+            if use_runtime:
+                runtime_names.add("set_liquids")
+                well_definition_lines.append(f"set_liquids(deck[\"reagent_res\"], [{reagent_str}], 12)")
+            else:
+                well_definition_lines.append(f"reagent_info = [{reagent_str}] + [(None, 0)] * (12 - {len(reagent_list)})")
+                well_definition_lines.append("deck[\"reagent_res\"].set_well_liquids(reagent_info)")
             well_definition_lines.append("")
             
             # Generate well references based on the reagents we identified
@@ -210,7 +270,8 @@ def generate_plr_script(expended_code: str, outdir: Path, ot_path: Path):
             
             well_definition_lines.append("")
             well_definition_lines.append("# Define cell wells for processing")
-            well_definition_lines.append(f"wells_name = [f\"A{{i}}\" for i in range(1, {well_count+1})]  # A1-A{well_count}")
+            wells_name = list(working_plate_format.row(0)[:well_count])
+            well_definition_lines.append(f"wells_name = {wells_name}  # {wells_name[0]}-{wells_name[-1]}")
             well_definition_lines.append("cells_all  = deck[\"working_plate\"][wells_name]")
     
     # Create tip generator function as a regular string, not inside an f-string
@@ -232,7 +293,14 @@ def _build_deck(lh: LiquidHandler):
         deck_func += line + "\n"
 
     # Generate protocol steps
-    step_lines = generate_steps(analyzer.steps)
+    # Static tip allocation: every pick-up gets a concrete tip spot now, and a
+    # protocol that needs more tips than the loaded racks fails here
+    tip_allocator = None
+    if ctx.options.static_tips:
+        mixed = len(set(pick_up_channels(analyzer.steps, analyzer.pipette_models))) > 1
+        tip_allocator = TipAllocator([f"tiprack_{slot}" for slot in tiprack_slots], singles_from_back=mixed)
+    with ctx.stage("generate_steps"):
+        step_lines = generate_steps(analyzer.steps, tip_allocator, analyzer.pipette_models)
     
     # Convert step_lines list to a string with proper line breaks
     step_block = "\n".join(step_lines)
@@ -240,37 +308,38 @@ def _build_deck(lh: LiquidHandler):
     # The well definition lines should also be properly joined
     well_definition_block = "\n".join(well_definition_lines)
 
-    # Generate the template with our prepared blocks
-    template = f"""
-import asyncio
-from pylabrobot.liquid_handling import LiquidHandler
-from pylabrobot.liquid_handling.backends import LiquidHandlerChatterboxBackend
-from pylabrobot.resources.opentrons import OTDeck
-from pylabrobot.visualizer.visualizer import Visualizer
-from pylabrobot.resources import Coordinate, set_tip_tracking, set_volume_tracking
-{builtin_import_line}
-
-# Constants from Opentrons protocol
-{const_block}
+    options = ctx.options
+    visualizer_import = "" if options.headless else "from pylabrobot.visualizer.visualizer import Visualizer\n"
+    visualizer_setup = "" if options.headless else "vis = Visualizer(resource=lh)\nawait vis.setup()\n"
 
-{labware_defs}
-{tip_gen_func}
-{deck_func}
-
-# Initialize liquid handler
+    # Everything that needs the event loop; top-level awaits for notebooks,
+    # or the body of async def main() for plain `python script.py` runs
+    if tip_allocator is not None:
+        rack_vars = ", ".join(tip_allocator.rack_vars)
+        tip_setup = (f"# Tip racks for statically allocated tips ({len(tip_allocator.picks)} pick-ups, "
+                     f"{tip_allocator.remaining()} tips left)\n"
+                     + (f"{rack_vars}{',' if len(tip_allocator.rack_vars) == 1 else ''} = deck[\"tip_racks\"]\n"
+                        if rack_vars else ""))
+    else:
+        tip_setup = """# Initialize tip generator
+tips = _tip_gen(deck["tip_racks"]) if "tip_racks" in deck else None
+"""
+    if options.use_runtime:
+        handler_setup = f"""# Initialize liquid handler, deck and tip generator (plr_runtime)
+lh, deck, tips = await setup(LAYOUT, headless={options.headless})
+""" + ("\n" + tip_setup if tip_allocator is not None else "")
+    else:
+        handler_setup = f"""# Initialize liquid handler
 lh = LiquidHandler(backend=LiquidHandlerChatterboxBackend(), deck=OTDeck())
 deck = _build_deck(lh)
 await lh.setup()
-vis = Visualizer(resource=lh)
-await vis.setup()
-
+{visualizer_setup}
 # Enable tip and volume tracking
 set_tip_tracking(True)
 set_volume_tracking(True)
 
-# Initialize tip generator
-tips = _tip_gen(deck["tip_racks"]) if "tip_racks" in deck else None
-
+{tip_setup}"""
+    run_block = f"""{handler_setup}
 {well_definition_block}
 
 # Protocol steps
@@ -279,7 +348,52 @@ tips = _tip_gen(deck["tip_racks"]) if "tip_racks" in deck else None
 # Cleanup
 await lh.teardown()
 """
-    outdir.mkdir(exist_ok=True)
-    out_path = outdir / (ot_path.stem + "_plr.py")
-    out_path.write_text(textwrap.dedent(template))
-    print(f"[✓] {ot_path.name} → {out_path}")
\ No newline at end of file
+    if options.asyncio_main:
+        if use_runtime:
+            runtime_names.add("run")
+        entry_point = "run(main)" if use_runtime else "asyncio.run(main())"
+        run_block = (
+            "async def main():\n"
+            + textwrap.indent(run_block, "    ")
+            + f"\n\nif __name__ == \"__main__\":\n    {entry_point}\n"
+        )
+
+    # Generate the template with our prepared blocks
+    with ctx.stage("render_template"):
+        if options.use_runtime:
+            layout_block = "\n".join(layout_lines)
+            script = textwrap.dedent(f"""
+from pylabrobot.resources import Coordinate
+{resource_import_block}
+from plr_runtime import {", ".join(sorted(runtime_names))}
+require({RUNTIME_API})
+
+# Constants from Opentrons protocol
+{const_block}
+
+{labware_defs}
+
+# Deck layout: (key, labware class, slot, name)
+LAYOUT = [
+{layout_block}
+]
+
+{run_block}""")
+        else:
+            script = textwrap.dedent(f"""
+import asyncio
+from pylabrobot.liquid_handling import LiquidHandler
+from pylabrobot.liquid_handling.backends import LiquidHandlerChatterboxBackend
+from pylabrobot.resources.opentrons import OTDeck
+{visualizer_import}from pylabrobot.resources import Coordinate, set_tip_tracking, set_volume_tracking
+{resource_import_block}
+
+# Constants from Opentrons protocol
+{const_block}
+
+{labware_defs}
+{tip_gen_func}
+{deck_func}
+
+{run_block}""")
+    return script
\ No newline at end of file
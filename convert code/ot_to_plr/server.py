@@ -0,0 +1,362 @@
+"""
+常驻转换服务：asyncio 的 HTTP 前端（localhost TCP 或 Unix socket）+ 热的 worker 进程池。
+
+worker 启动时就 import pylabrobot、装好父进程建的器材索引（和 main.py --jobs 相同），
+每个请求只剩 api.convert 本身的时间。
+
+    POST /convert     body 为 JSON {"source": "...", "options": {"headless": true, ...}}
+                      或直接是协议源码（options 放在 query string，如 ?headless=1）
+                      -> 200 {"ok", "script", "diagnostics", "timings", "cached", ...}
+    GET  /health      -> 队列长度、缓存命中等统计
+
+- 背压：排队 + 执行中的请求超过 --max-pending 时直接回 503（带 Retry-After），不无限堆积；
+- 超时：单个请求超过 --timeout 秒回 504（worker 里的那次转换会跑完，结果仍进缓存）；
+- 缓存：按 (源码, options) 的 sha256 做 LRU，条目记下用到的自定义器材 JSON 的 sha256，
+  器材文件改了就当作未命中重新转换；失败（ok 为 False）的结果不缓存。
+  同一份源码正在转换时，后到的请求等同一个结果。
+
+    python server.py --port 8765 --labware-dir ../../labware
+    python server.py --unix /tmp/ot_to_plr.sock --workers 4
+"""
+import argparse
+import asyncio
+import dataclasses
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from api import convert, preload
+from context import ConversionOptions, SHARED_LABWARE_CACHE, get_labware_index, install_labware_index
+
+MAX_BODY_BYTES = 8 * 1024 * 1024
+_OPTION_FIELDS = {f.name for f in dataclasses.fields(ConversionOptions)}
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+            504: "Gateway Timeout"}
+
+
+# ---------------------------------------------------------------
+# WORKER --------------------------------------------------------
+# ---------------------------------------------------------------
+
+_WORKER_DIRS: Tuple[Path, ...] = ()
+# 本 worker 的 SHARED_LABWARE_CACHE 里的自定义器材：load_name -> (JSON 路径, (mtime_ns, 大小))
+_WORKER_LABWARE: Dict[str, Tuple[Path, Tuple[int, int]]] = {}
+
+
+def _init_worker(index, json_dirs):
+    """进程池 worker 初始化：装上父进程的器材索引，并提前 import pylabrobot。"""
+    global _WORKER_DIRS
+    install_labware_index(index)
+    _WORKER_DIRS = json_dirs
+    preload(json_dirs)
+
+
+def _stat_key(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _file_digest(path: Path) -> Optional[str]:
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def _convert_in_worker(source: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    # 器材 JSON 改过：丢掉本进程缓存的旧类代码，否则重新转换还是旧结果
+    for name, (path, stat) in list(_WORKER_LABWARE.items()):
+        if _stat_key(path) != stat:
+            SHARED_LABWARE_CACHE.invalidate(name)
+            del _WORKER_LABWARE[name]
+    result = convert(source, labware_dirs=_WORKER_DIRS, options=ConversionOptions(**options))
+    for name, path in result.labware_files.items():
+        _WORKER_LABWARE[name] = (path, _stat_key(path))
+    out = result.to_dict()
+    out["labware_hashes"] = {str(path): _file_digest(path) for path in result.labware_files.values()}
+    return out
+
+
+# ---------------------------------------------------------------
+# CACHE ---------------------------------------------------------
+# ---------------------------------------------------------------
+
+
+class ResultCache:
+    """
+    sha256(源码 + options) -> 结果 dict 的 LRU。结果里的 labware_hashes（用到的器材 JSON -> sha256）
+    也是 key 的一部分：命中时逐个核对，任何一个文件变了（或被删）都算未命中并丢掉条目。
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._digests: Dict[str, Tuple[Optional[Tuple[int, int]], Optional[str]]] = {}  # 路径 -> (stat, sha256)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(source: str, options: Dict[str, Any]) -> str:
+        h = hashlib.sha256(source.encode("utf-8"))
+        h.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+        return h.hexdigest()
+
+    def _digest(self, path: str) -> Optional[str]:
+        """文件的 sha256；mtime / 大小没变时用上次算的，不重读。"""
+        stat = _stat_key(Path(path))
+        cached = self._digests.get(path)
+        if cached is not None and cached[0] == stat:
+            return cached[1]
+        digest = _file_digest(Path(path)) if stat is not None else None
+        self._digests[path] = (stat, digest)
+        return digest
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._entries.get(key)
+        if value is not None and any(self._digest(path) != digest
+                                     for path, digest in value.get("labware_hashes", {}).items()):
+            del self._entries[key]
+            value = None
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]):
+        if self.max_entries <= 0 or not value.get("ok"):
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# ---------------------------------------------------------------
+# SERVER --------------------------------------------------------
+# ---------------------------------------------------------------
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ConversionServer:
+    def __init__(self, json_dirs: Tuple[Path, ...], workers: int = 0, max_pending: int = 64,
+                 timeout: float = 30.0, cache_size: int = 256):
+        self.json_dirs = json_dirs
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.cache = ResultCache(cache_size)
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.pending = 0
+        self.inflight: Dict[str, "asyncio.Future"] = {}
+        self.stats = {"requests": 0, "converted": 0, "rejected": 0, "timeouts": 0, "errors": 0}
+        self.started = time.time()
+
+    # ---- lifecycle ----
+
+    def start_pool(self):
+        index = get_labware_index(self.json_dirs)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                        initargs=(index, self.json_dirs))
+        # 提前把所有 worker 拉起来（import 都在这里完成），第一批请求不用等冷启动
+        for fut in [self.pool.submit(os.getpid) for _ in range(self.workers)]:
+            fut.result()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    # ---- conversion ----
+
+    async def convert(self, source: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        key = self.cache.key(source, options)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return {**cached, "cached": True}
+
+        future = self.inflight.get(key)
+        if future is None:
+            if self.pending >= self.max_pending:
+                self.stats["rejected"] += 1
+                raise HttpError(503, f"too many pending conversions ({self.pending})")
+            future = asyncio.get_running_loop().run_in_executor(
+                self.pool, _convert_in_worker, source, options)
+            self.inflight[key] = future
+            self.pending += 1
+            future.add_done_callback(lambda f, key=key: self._finished(key, f))
+        try:
+            # shield：一个请求超时不取消别的请求共享的那次转换
+            result = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise HttpError(504, f"conversion did not finish within {self.timeout:g}s")
+        return {**result, "cached": False}
+
+    def _finished(self, key: str, future: "asyncio.Future"):
+        self.pending -= 1
+        self.inflight.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            self.stats["errors"] += 1
+            return
+        self.stats["converted"] += 1
+        self.cache.put(key, future.result())
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "cache_entries": len(self.cache),
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+            "uptime_s": round(time.time() - self.started, 3),
+            **self.stats,
+        }
+
+    # ---- HTTP ----
+
+    @staticmethod
+    def _parse_options(raw: Dict[str, Any]) -> Dict[str, Any]:
+        unknown = set(raw) - _OPTION_FIELDS
+        if unknown:
+            raise HttpError(400, f"unknown options: {', '.join(sorted(unknown))}")
+        parsed = {}
+        for name, value in raw.items():
+            if isinstance(value, str):
+                value = value.lower() in ("1", "true", "yes", "on")
+            parsed[name] = bool(value)
+        return parsed
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        if not request_line:
+            return None
+        try:
+            method, target, _ = request_line.split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "malformed request line")
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, f"body larger than {MAX_BODY_BYTES} bytes")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, headers, body
+
+    async def _dispatch(self, method: str, target: str, headers: Dict[str, str], body: bytes):
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, self.health()
+        if url.path != "/convert":
+            raise HttpError(404, f"no route {url.path}")
+        if method != "POST":
+            raise HttpError(405, "use POST /convert")
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if headers.get("content-type", "").startswith("application/json"):
+            try:
+                payload = json.loads(body.decode("utf-8"))
+            except ValueError as e:
+                raise HttpError(400, f"invalid JSON: {e}")
+            source = payload.get("source")
+            options = {**query, **(payload.get("options") or {})}
+        else:
+            source, options = body.decode("utf-8"), query
+        if not isinstance(source, str) or not source.strip():
+            raise HttpError(400, "empty protocol source")
+        return 200, await self.convert(source, self._parse_options(options))
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.stats["requests"] += 1
+        extra = {}
+        try:
+            request = await self._read_request(reader)
+            if request is None:
+                return
+            status, payload = await self._dispatch(*request)
+        except HttpError as e:
+            status, payload = e.status, {"ok": False, "error": str(e)}
+            if e.status == 503:
+                extra["Retry-After"] = "1"
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception as e:  # worker 崩溃等
+            status, payload = 500, {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+                "Content-Type: application/json; charset=utf-8",
+                f"Content-Length: {len(data)}",
+                "Connection: close",
+                *(f"{k}: {v}" for k, v in extra.items())]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765, unix: Optional[Path] = None):
+        if unix is not None:
+            server = await asyncio.start_unix_server(self.handle, path=str(unix))
+            where = str(unix)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            where = "http://" + ", ".join(f"{s.getsockname()[0]}:{s.getsockname()[1]}" for s in server.sockets)
+        print(f"[serve] {self.workers} workers ready, listening on {where}")
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="OT-to-PLR conversion server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", default=8765, type=int)
+    ap.add_argument("--unix", type=Path, metavar="SOCKET", help="listen on a Unix socket instead of TCP")
+    ap.add_argument("--workers", "-j", default=0, type=int, help="worker processes (0 = one per CPU core)")
+    ap.add_argument("--max-pending", default=64, type=int,
+                    help="queued + running conversions before new requests get 503")
+    ap.add_argument("--timeout", default=30.0, type=float, help="per-request timeout in seconds")
+    ap.add_argument("--cache-size", default=256, type=int, help="LRU entries keyed by source hash (0 = off)")
+    ap.add_argument("--labware-dir", action="append", default=[], type=Path,
+                    help="extra directory to search for custom labware JSON (repeatable)")
+    args = ap.parse_args(argv)
+
+    json_dirs = tuple(dict.fromkeys(d.resolve() for d in [Path("."), *args.labware_dir]))
+    server = ConversionServer(json_dirs, workers=args.workers, max_pending=args.max_pending,
+                              timeout=args.timeout, cache_size=args.cache_size)
+    server.start_pool()
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if args.unix is not None and args.unix.exists():
+            args.unix.unlink()
+
+
+if __name__ == "__main__":
+    main()
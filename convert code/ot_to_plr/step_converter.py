@@ -1,8 +1,14 @@
 import ast
 import re
-from typing import List
+from typing import Dict, List, Optional
+from tip_allocator import TipAllocator, channels_for_model
 
-def generate_steps(steps: List[ast.Call]) -> List[str]:
+def generate_steps(steps: List[ast.Call], tip_allocator: Optional[TipAllocator] = None,
+                   pipette_models: Optional[Dict[str, str]] = None) -> List[str]:
+    """
+    tip_allocator 给定时，每个 pick_up_tip 都在转换时分配具体枪头位置（枪头不够直接抛
+    TipAllocationError）；否则沿用运行时的 next(tips)。
+    """
     lines = []
     variable_mappings: Dict[str, str] = {}
     defined_variables: Set[str] = set()
@@ -149,7 +155,11 @@ def generate_steps(steps: List[ast.Call]) -> List[str]:
                 lines.append(f"# WARNING: Incomplete mix command: {ast.unparse(call)}")
                 
         elif fun == "pick_up_tip":
-            lines.append("await lh.pick_up_tips(next(tips))")
+            if tip_allocator is not None:
+                channels = channels_for_model((pipette_models or {}).get(tgt, ""))
+                lines.append(f"await lh.pick_up_tips({tip_allocator.allocate(channels)})")
+            else:
+                lines.append("await lh.pick_up_tips(next(tips))")
         elif fun == "drop_tip":
             lines.append("await lh.discard_tips()")
         # ... 其他操作同理 ...
@@ -0,0 +1,79 @@
+import os
+
+from server import ResultCache, _file_digest
+
+
+def _touch(path, content):
+    # 同一个 mtime_ns 里写两次时 stat 不变；显式推后 mtime，模拟真实的“稍后改了文件”
+    st = path.stat()
+    path.write_text(content, encoding="utf-8")
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def _result(*labware_files):
+    return {"ok": True, "code": "...", "labware_hashes": {str(p): _file_digest(p) for p in labware_files}}
+
+
+def test_hit_while_labware_is_unchanged(tmp_path):
+    labware = tmp_path / "plate.json"
+    labware.write_text('{"wells": 96}', encoding="utf-8")
+    cache = ResultCache()
+    key = ResultCache.key("source", {"runtime": False})
+    cache.put(key, _result(labware))
+    assert cache.get(key) is not None and cache.get(key) is not None
+    assert (cache.hits, cache.misses) == (2, 0)
+
+
+def test_labware_change_invalidates_entry(tmp_path):
+    labware, other = tmp_path / "plate.json", tmp_path / "tips.json"
+    labware.write_text('{"wells": 96}', encoding="utf-8")
+    other.write_text('{"tips": 96}', encoding="utf-8")
+    cache = ResultCache()
+    key = ResultCache.key("source", {})
+    cache.put(key, _result(labware, other))
+    assert cache.get(key) is not None
+
+    _touch(labware, '{"wells": 24}')
+    assert cache.get(key) is None
+    assert len(cache) == 0 and cache.misses == 1
+
+    # 条目已经丢掉；重新 put 之后按新内容命中
+    cache.put(key, _result(labware, other))
+    assert cache.get(key) is not None
+
+
+def test_touch_without_content_change_is_still_a_hit(tmp_path):
+    labware = tmp_path / "plate.json"
+    labware.write_text('{"wells": 96}', encoding="utf-8")
+    cache = ResultCache()
+    key = ResultCache.key("source", {})
+    cache.put(key, _result(labware))
+    _touch(labware, '{"wells": 96}')   # mtime 变了但内容没变：按 sha256 比较，仍然命中
+    assert cache.get(key) is not None
+
+
+def test_deleted_labware_invalidates_entry(tmp_path):
+    labware = tmp_path / "plate.json"
+    labware.write_text('{"wells": 96}', encoding="utf-8")
+    cache = ResultCache()
+    key = ResultCache.key("source", {})
+    cache.put(key, _result(labware))
+    labware.unlink()
+    assert cache.get(key) is None and len(cache) == 0
+
+
+def test_failed_results_are_not_cached_and_lru_evicts_oldest():
+    cache = ResultCache(max_entries=2)
+    cache.put("bad", {"ok": False, "error": "boom"})
+    assert cache.get("bad") is None
+    for k in ("a", "b"):
+        cache.put(k, {"ok": True})
+    cache.get("a")            # a 变成最近用过
+    cache.put("c", {"ok": True})
+    assert cache.get("b") is None and cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_key_depends_on_source_and_options_only():
+    assert ResultCache.key("s", {"a": 1, "b": 2}) == ResultCache.key("s", {"b": 2, "a": 1})
+    assert ResultCache.key("s", {"a": 1}) != ResultCache.key("s", {"a": 2})
+    assert ResultCache.key("s", {}) != ResultCache.key("t", {})
@@ -0,0 +1,45 @@
+import pytest
+
+from tip_allocator import TipAllocationError, TipAllocator
+
+
+def test_eight_channel_takes_whole_columns_until_exhausted():
+    alloc = TipAllocator(["tiprack_1"])
+    picks = [alloc.allocate(8) for _ in range(12)]
+    assert picks[0] == 'tiprack_1["A1:H1"]' and picks[-1] == 'tiprack_1["A12:H12"]'
+    assert alloc.remaining() == 0
+    with pytest.raises(TipAllocationError, match=r"pick-up #13 \(8-channel\).*12 × 8-channel"):
+        alloc.allocate(8)
+
+
+def test_single_channel_uses_every_tip_then_fails():
+    alloc = TipAllocator(["tiprack_1", "tiprack_2"])
+    picks = [alloc.allocate(1) for _ in range(alloc.capacity)]
+    assert len(set(picks)) == 192
+    assert picks[:2] == ['tiprack_1["A1"]', 'tiprack_1["B1"]']
+    with pytest.raises(TipAllocationError, match=r"2 rack\(s\) = 192 tips"):
+        alloc.allocate(1)
+
+
+def test_a_started_column_blocks_eight_channel_pick_ups():
+    alloc = TipAllocator(["tiprack_1"])
+    for _ in range(11):
+        alloc.allocate(8)
+    alloc.allocate(1)               # opens the last full column
+    assert alloc.remaining() == 7
+    with pytest.raises(TipAllocationError):
+        alloc.allocate(8)
+
+
+def test_mixed_singles_come_from_the_back():
+    alloc = TipAllocator(["tiprack_1", "tiprack_2"], singles_from_back=True)
+    assert alloc.allocate(1) == 'tiprack_2["A12"]'
+    assert alloc.allocate(8) == 'tiprack_1["A1:H1"]'
+    # the opened column is finished before a new one is started
+    assert [alloc.allocate(1) for _ in range(7)][-1] == 'tiprack_2["H12"]'
+    assert alloc.allocate(1) == 'tiprack_2["A11"]'
+
+
+def test_unsupported_channel_count():
+    with pytest.raises(TipAllocationError, match="only 1 or 8"):
+        TipAllocator(["tiprack_1"]).allocate(4)
@@ -0,0 +1,82 @@
+import ast
+from typing import Dict, List, Sequence, Tuple
+
+ROWS = "ABCDEFGH"
+COLUMNS = 12
+
+
+class TipAllocationError(ValueError):
+    """装载的枪头盒不够协议用。转换时抛出，而不是运行到一半才发现。"""
+
+
+class TipAllocator:
+    """
+    转换时静态分配枪头：每次 pick_up_tip 得到一个具体的枪头位置表达式，
+    例如单通道 `tiprack_8["A3"]`，8 通道 `tiprack_8["A3:H3"]`。
+
+    多通道按枪头盒、列的顺序从前往后取整列。单通道默认也从前往后（A1, B1, ... H1, A2 ...）；
+    同一协议里单通道和多通道混用时（singles_from_back=True），单通道改为从最后一个盒子的
+    最后一列往前取，这样零散用掉的枪头不会打断多通道需要的整列。
+    """
+    def __init__(self, rack_vars: Sequence[str], singles_from_back: bool = False):
+        self.rack_vars = list(rack_vars)
+        self.singles_from_back = singles_from_back
+        # free[r][c] = 该列还剩的行（按 A..H 顺序）
+        self.free: List[List[List[str]]] = [[list(ROWS) for _ in range(COLUMNS)] for _ in self.rack_vars]
+        self.picks: List[Tuple[int, str]] = []   # (channels, expression)
+
+    @property
+    def capacity(self) -> int:
+        return len(self.rack_vars) * len(ROWS) * COLUMNS
+
+    def remaining(self) -> int:
+        return sum(len(col) for rack in self.free for col in rack)
+
+    def _fail(self, channels: int):
+        used: Dict[int, int] = {}
+        for ch, _ in self.picks:
+            used[ch] = used.get(ch, 0) + 1
+        summary = ", ".join(f"{n} × {ch}-channel" for ch, n in sorted(used.items())) or "none"
+        raise TipAllocationError(
+            f"out of tips at pick-up #{len(self.picks) + 1} ({channels}-channel): "
+            f"{len(self.rack_vars)} rack(s) = {self.capacity} tips, already allocated {summary}"
+        )
+
+    def allocate(self, channels: int = 1) -> str:
+        if channels == len(ROWS):
+            for r, rack in enumerate(self.free):
+                for c, col in enumerate(rack):
+                    if len(col) == len(ROWS):
+                        rack[c] = []
+                        expr = f'{self.rack_vars[r]}["A{c + 1}:H{c + 1}"]'
+                        self.picks.append((channels, expr))
+                        return expr
+            self._fail(channels)
+        if channels != 1:
+            raise TipAllocationError(f"unsupported channel count {channels} (only 1 or 8)")
+        rack_order = range(len(self.free) - 1, -1, -1) if self.singles_from_back else range(len(self.free))
+        for r in rack_order:
+            rack = self.free[r]
+            # 先用已经开过的列，再开新的列
+            started = [c for c in range(COLUMNS) if 0 < len(rack[c]) < len(ROWS)]
+            fresh = [c for c in range(COLUMNS) if len(rack[c]) == len(ROWS)]
+            if self.singles_from_back:
+                started, fresh = started[::-1], fresh[::-1]
+            for c in started + fresh:
+                row = rack[c].pop(0)
+                expr = f'{self.rack_vars[r]}["{row}{c + 1}"]'
+                self.picks.append((channels, expr))
+                return expr
+        self._fail(channels)
+
+
+def pick_up_channels(steps, pipette_models: Dict[str, str]) -> List[int]:
+    """协议里每次 pick_up_tip 用的通道数（按出现顺序）。"""
+    return [channels_for_model(pipette_models.get(ast.unparse(call.func.value), ""))
+            for call in steps
+            if isinstance(call.func, ast.Attribute) and call.func.attr == "pick_up_tip"]
+
+
+def channels_for_model(model: str) -> int:
+    """OT 移液器型号 -> 通道数（p300_multi_gen2 -> 8）。"""
+    return 8 if "multi" in str(model).lower() else 1
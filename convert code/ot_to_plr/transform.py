@@ -1,14 +1,15 @@
 import re
-from pathlib import PosixPath
+from pathlib import PurePath
 from matchers import match_for_loop, match_regex_pattern
 from expanders import expand_tiprack
+from context import print_diagnostic
 from handlers import handle_for_loop, handle_list_comprehension, handle_regex_operation
 
-def transform_explicit(code):
+def transform_explicit(code, report=print_diagnostic):
     """
-    主函数，处理整个代码的转换
+    主函数，处理整个代码的转换。report(level, message) 接收展开过程中的调试 / 警告信息。
     """
-    if isinstance(code, PosixPath):
+    if isinstance(code, PurePath):
         with code.open('r', encoding='utf-8') as f:
             code = f.read()
     
@@ -16,7 +17,7 @@ def transform_explicit(code):
     
     # 预处理：单独处理 tiprack 这样的特殊跨行列表推导式
     tiprack_pattern = re.compile(r'(\s*)(\w+)\s*=\s*\[\s*ctx\.load_labware\([\'"]([^\'"]+)[\'"]\s*,\s*(\w+)\s*\)\s*\n\s*for\s+\4\s+in\s+(\[[\d\s,]+\])\s*\]')
-    code = tiprack_pattern.sub(lambda m: expand_tiprack(m), code)
+    code = tiprack_pattern.sub(lambda m: expand_tiprack(m, report), code)
     
     # 预处理：合并其他多行列表推导式
     lines = code.split('\n')
@@ -76,8 +77,8 @@ def transform_explicit(code):
             transformed.extend(expanded_body)
         
         elif listcomp_match:
-            # 打印调试信息
-            print(f"Found list comprehension: {listcomp_match.groups()}")
+            # 调试信息
+            report("debug", f"Found list comprehension: {listcomp_match.groups()}")
             
             # 提取列表推导式信息
             indent = listcomp_match.group(1)
@@ -122,13 +123,13 @@ def transform_explicit(code):
             except Exception as e:
                 # 发生错误时保留原始行
                 transformed.append(line)
-                print(f"Error expanding list comprehension: {e}")
+                report("warning", f"Error expanding list comprehension: {e}")
             
             i += 1
         
         elif regex_match:
-            # 打印调试信息
-            print(f"Found regex operation: {regex_match.groups()}")
+            # 调试信息
+            report("debug", f"Found regex operation: {regex_match.groups()}")
             expanded_code, i = handle_regex_operation(lines, i, regex_match)
             transformed.extend(expanded_code)
         
@@ -0,0 +1,134 @@
+import hashlib
+import io
+import time
+import traceback
+from pathlib import Path
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from context import AstCache, ConversionContext, ConversionOptions, SHARED_LABWARE_CACHE, get_labware_index
+from labware_loader import CUSTOM_LABWARE_DIR
+from script_builder import generate_plr_script
+from transform import transform_explicit
+
+
+def _file_hash(path: Path) -> Optional[str]:
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except OSError:
+        return None     # 文件在扫描和读取之间被删掉了
+
+
+def _read(path: Path) -> Optional[bytes]:
+    try:
+        return path.read_bytes()
+    except OSError:
+        return None
+
+
+def _decode(data: bytes) -> str:
+    """和文本模式 open(encoding='utf-8') 读出来的一样（\r\n / \r 统一成 \n）。"""
+    return io.StringIO(data.decode("utf-8"), newline=None).read()
+
+
+class _Entry:
+    """一个被监视的 OT 脚本：源码 hash、依赖的器材 JSON 及其 hash、上次结果。"""
+    def __init__(self, source_hash: str):
+        self.source_hash = source_hash
+        self.labware_deps: Dict[str, Tuple[Path, Optional[str]]] = {}   # load_name -> (json, hash)
+        self.ok = False
+
+
+class ConversionWatcher:
+    """
+    常驻进程：器材索引、pylabrobot 内置器材、AST 缓存都保持热状态，
+    只重新转换内容 hash 变了、或者引用的自定义器材 JSON 变了的脚本。
+    """
+    def __init__(self, directory: Path, outdir: Path, json_dirs: Tuple[Path, ...],
+                 options: Optional[ConversionOptions] = None):
+        self.directory = Path(directory)
+        self.options = options
+        self.outdir = Path(outdir)
+        self.json_dirs = json_dirs
+        self.ast_cache = AstCache()
+        self.entries: Dict[Path, _Entry] = {}
+        self._labware_state: Optional[FrozenSet[Tuple[str, int, int]]] = None
+
+    def _is_candidate(self, path: Path) -> bool:
+        return not (path.name.endswith("_plr.py") or self.outdir.resolve() in path.resolve().parents)
+
+    def _labware_fingerprint(self) -> FrozenSet[Tuple[str, int, int]]:
+        """器材目录里所有 *.json 的 (路径, mtime, 大小)；只 stat，不读内容。"""
+        state = set()
+        for d in (CUSTOM_LABWARE_DIR, *self.json_dirs):
+            if not d.is_dir():
+                continue
+            for path in d.rglob("*.json"):
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                state.add((str(path), st.st_mtime_ns, st.st_size))
+        return frozenset(state)
+
+    def _changed_labware(self, entry: _Entry):
+        return [name for name, (path, digest) in entry.labware_deps.items() if _file_hash(path) != digest]
+
+    def _convert(self, path: Path, source_hash: str, data: bytes) -> _Entry:
+        """data 是 poll 已经读出来的源码字节，不再重新读文件（也保证转换的就是算 hash 的那份内容）。"""
+        entry = _Entry(source_hash)
+        start = time.perf_counter()
+        try:
+            ctx = ConversionContext(json_dirs=self.json_dirs, ast_cache=self.ast_cache,
+                                    options=self.options)
+            out_path = generate_plr_script(transform_explicit(_decode(data), report=ctx.report), self.outdir, path,
+                                           ctx=ctx)
+            entry.labware_deps = {name: (json_path, _file_hash(json_path))
+                                  for name, json_path in ctx.labware_files.items()}
+            entry.ok = True
+            print(f"[watch] {path} → {out_path} ({time.perf_counter() - start:.2f}s)")
+        except Exception as e:
+            traceback.print_exc()
+            print(f"[watch] [ERROR] {path}: {e}")
+        return entry
+
+    def poll(self) -> int:
+        """扫描一次目录，返回本轮重新转换的文件数。"""
+        converted = 0
+        seen = set()
+        # 器材目录有变化（新增 / 修改 / 删除 JSON）：重建索引，之前失败的转换也重试一次
+        labware_state = self._labware_fingerprint()
+        labware_changed = self._labware_state is not None and labware_state != self._labware_state
+        self._labware_state = labware_state
+        if labware_changed:
+            get_labware_index(self.json_dirs).refresh()
+        for path in sorted(self.directory.rglob("*.py")):
+            if not self._is_candidate(path):
+                continue
+            data = _read(path)      # 每轮每个文件只读一次：判断是不是 OT 脚本 + 算 hash
+            if data is None or b"def run(" not in data:
+                continue
+            seen.add(path)
+            digest = hashlib.sha256(data).hexdigest()
+            entry = self.entries.get(path)
+            if entry is not None and entry.source_hash == digest:
+                # 器材目录没变时不用再逐个 hash 依赖的 JSON
+                stale = self._changed_labware(entry) if labware_changed else []
+                if not stale and not (labware_changed and not entry.ok):
+                    continue
+                # 自定义器材 JSON 变了：丢掉共享缓存里的旧类代码（索引上面已经重建）
+                for name in stale:
+                    SHARED_LABWARE_CACHE.invalidate(name)
+            self.entries[path] = self._convert(path, digest, data)
+            converted += 1
+        for path in set(self.entries) - seen:
+            del self.entries[path]
+        return converted
+
+    def run(self, interval: float = 1.0):
+        print(f"[watch] watching {self.directory} (Ctrl-C to stop)")
+        try:
+            while True:
+                self.poll()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("[watch] stopped")
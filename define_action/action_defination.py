@@ -3,9 +3,11 @@ from __future__ import annotations
 from typing import List, Sequence, Optional, Literal, Union, Iterator
 
 import asyncio
+import logging
 import time
 
 from pylabrobot.liquid_handling import LiquidHandler
+from pylabrobot.liquid_handling.standard import Mix
 from pylabrobot.resources import (
     Resource,
     TipRack,
@@ -13,13 +15,119 @@ from pylabrobot.resources import (
     Coordinate,
 )
 
+from sim_clock import RealClock
+from path_optimizer import PathPlan, plan_resources
+from command_trace import RESOURCE_PARAM, TraceRecorder
+from latency import LatencyRecorder, instrumented, labware_of
+from modules import HeaterShakerModule, MagneticModule, TemperatureModule, chatterbox_module
+
+logger = logging.getLogger(__name__)
+
+# Seconds waited between the aspirate and dispense of each mix cycle.
+DEFAULT_MIX_DWELL = 0.0
+# Backends whose aspirate/dispense run a pylabrobot ``Mix`` themselves.
+NATIVE_MIX_BACKENDS = frozenset({"STARBackend", "VantageBackend", "NimbusBackend", "OpentronsOT2Backend"})
+
+
 class MyLiquidHandler(LiquidHandler):
-    """Extended LiquidHandler with additional operations."""
+    """Extended LiquidHandler with additional operations.
+
+    Pass ``clock=VirtualClock()`` for simulation and run the protocol with
+    ``clock.run(main())``: delays then advance a simulated clock instead of
+    sleeping, and ``clock.timeline`` records the simulated start time of
+    every backend operation.
+
+    Modules (heater-shaker, temperature, magnetic) added with ``add_module``
+    run in the background: their operations return handles, so pipetting
+    can continue until ``await handle``.
+
+    Pass ``recorder=TraceRecorder()`` to capture every backend-bound call
+    into a binary trace that ``command_trace.replay`` can re-issue later,
+    and ``latency=LatencyRecorder()`` for per-operation, per-labware
+    latency histograms (``latency.dump("latency.prom")``).
+    """
+
+    def __init__(self, *args, clock: Optional[RealClock] = None,
+                 recorder: Optional[TraceRecorder] = None,
+                 latency: Optional[LatencyRecorder] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.clock = clock if clock is not None else RealClock()
+        self.recorder = recorder
+        self.latency = latency
+        self.last_path_plan: Optional[PathPlan] = None
+        self.modules: dict = {}
+
+    # ---------------------------------------------------------------
+    # CLOCKED BACKEND OPERATIONS -------------------------------------
+    # ---------------------------------------------------------------
+
+    async def _clocked(self, name: str, op, *args, **kwargs):
+        if self.recorder is not None:
+            self.recorder.record(name, op, args, kwargs)
+        start = self.clock.now()
+        t0 = self.latency.clock() if self.latency is not None else 0.0
+        result = await op(*args, **kwargs)
+        if self.latency is not None:
+            resource = kwargs.get(RESOURCE_PARAM[name], args[0] if args else None)
+            self.latency.record(name, labware_of(resource), self.latency.clock() - t0)
+        await self.clock.operation_done(name)
+        self.clock.record(name, start)
+        return result
+
+    async def pick_up_tips(self, *args, **kwargs):
+        return await self._clocked("pick_up_tips", super().pick_up_tips, *args, **kwargs)
+
+    async def drop_tips(self, *args, **kwargs):
+        return await self._clocked("drop_tips", super().drop_tips, *args, **kwargs)
+
+    async def aspirate(self, *args, **kwargs):
+        return await self._clocked("aspirate", super().aspirate, *args, **kwargs)
+
+    async def dispense(self, *args, **kwargs):
+        return await self._clocked("dispense", super().dispense, *args, **kwargs)
+
+    async def pick_up_tips96(self, *args, **kwargs):
+        return await self._clocked("pick_up_tips96", super().pick_up_tips96, *args, **kwargs)
+
+    async def drop_tips96(self, *args, **kwargs):
+        return await self._clocked("drop_tips96", super().drop_tips96, *args, **kwargs)
+
+    async def aspirate96(self, *args, **kwargs):
+        return await self._clocked("aspirate96", super().aspirate96, *args, **kwargs)
+
+    async def dispense96(self, *args, **kwargs):
+        return await self._clocked("dispense96", super().dispense96, *args, **kwargs)
     
+    # ---------------------------------------------------------------
+    # MODULES --------------------------------------------------------
+    # ---------------------------------------------------------------
+
+    def add_module(self, kind: str, name: Optional[str] = None, backend=None):
+        """Attach a module sharing this handler's clock.
+
+        kind: ``heater_shaker``, ``temperature`` or ``magnetic``. Without a
+        backend the module uses an offline chatterbox backend.
+        """
+        name = name or kind
+        if backend is None:
+            module = chatterbox_module(kind, name, self.clock)
+        else:
+            cls = {"heater_shaker": HeaterShakerModule, "temperature": TemperatureModule,
+                   "magnetic": MagneticModule}[kind]
+            module = cls(name, backend, self.clock)
+        self.modules[name] = module
+        return module
+
+    async def wait_modules(self):
+        """Wait for every background module operation to finish."""
+        for module in self.modules.values():
+            await module.wait()
+
     # ---------------------------------------------------------------
     # REMOVE LIQUID --------------------------------------------------
     # ---------------------------------------------------------------
 
+    @instrumented("remove_liquid", "sources")
     async def remove_liquid(
         self,
         vols: List[float],
@@ -96,6 +204,7 @@ class MyLiquidHandler(LiquidHandler):
     # ADD LIQUID -----------------------------------------------------
     # ---------------------------------------------------------------
 
+    @instrumented("add_liquid", "targets")
     async def add_liquid(
         self,
         vols: Union[List[float], float],
@@ -168,11 +277,13 @@ class MyLiquidHandler(LiquidHandler):
                     )
                     await self.touch_tip(tgt)
                     await self.discard_tips()
+        except Exception as e:
             raise RuntimeError(f"Liquid addition failed: {e}") from e
 
     # ---------------------------------------------------------------
     # TRANSFER LIQUID ------------------------------------------------
     # ---------------------------------------------------------------
+    @instrumented("transfer_liquid", "targets")
     async def transfer_liquid(
         self,
         vols: Union[float, List[float]],
@@ -187,9 +298,12 @@ class MyLiquidHandler(LiquidHandler):
         blow_out_air_volume: Optional[List[Optional[float]]] = None,
         spread: Literal["wide", "tight", "custom"] = "wide",
         is_96_well: bool = False,
-        mix_times: int = None,
+        mix_times: Union[int, List[int], None] = None,
         mix_vol: Optional[int] = None,
         delays: Optional[List[int]] = None,
+        optimize_path: bool = False,
+        dispense_flow_rates: Optional[List[Optional[float]]] = None,
+        touch_tip: bool = True,
     ):
         """Transfer liquid from each *source* well/plate to the corresponding *target*.
 
@@ -204,6 +318,21 @@ class MyLiquidHandler(LiquidHandler):
             One or more TipRacks providing fresh tips.
         is_96_well
             Set *True* to use the 96‑channel head.
+        flow_rates, dispense_flow_rates, blow_out_air_volume, delays
+            Either one value list applied to every transfer, or one entry per
+            transfer (as in a merged ``protocol_ir.TransferOp``).
+            *dispense_flow_rates* defaults to *flow_rates*.
+        touch_tip
+            Touch the tip to both sides of the target after each transfer.
+        mix_times
+            Passed on to ``mix`` after each dispense: an int, ``[n]`` or a
+            ``protocol_ir.MixSpec``.
+        optimize_path
+            Reorder independent transfers to shorten gantry travel. Transfers
+            that read or write a well touched by an earlier one keep their
+            relative order. The tips this call would use are reassigned
+            among themselves too. The plan is kept in ``self.last_path_plan``
+            and its summary is logged at INFO level.
         """
 
         try:
@@ -248,8 +377,25 @@ class MyLiquidHandler(LiquidHandler):
                 if not (len(vols) == len(sources) == len(targets)):
                     raise ValueError("`sources`, `targets`, and `vols` must have the same length.")
 
+                n = len(sources)
+                per_transfer = [
+                    _per_transfer(values, n)
+                    for values in (flow_rates, dispense_flow_rates if dispense_flow_rates is not None else flow_rates,
+                                   blow_out_air_volume, delays)
+                ]
                 tip_iter = self.iter_tips(tip_racks)
-                for src, tgt, vol in zip(sources, targets, vols):
+                if optimize_path:
+                    tips = [next(tip_iter) for _ in sources]
+                    plan = plan_resources(sources, targets, tips, reorder_tips=True)
+                    self.last_path_plan = plan
+                    logger.info("optimize_path: %s", plan.summary())
+                    sources = [sources[k] for k in plan.order]
+                    targets = [targets[k] for k in plan.order]
+                    vols = [vols[k] for k in plan.order]
+                    per_transfer = [[values[k] for k in plan.order] for values in per_transfer]
+                    tip_iter = iter([tips[k] for k in plan.tip_order])
+                for src, tgt, vol, asp_rates, disp_rates, blow_out, delay in zip(
+                        sources, targets, vols, *per_transfer):
                     tip = next(tip_iter)
                     await self.pick_up_tips(tip)
                     # Aspirate from source
@@ -257,34 +403,72 @@ class MyLiquidHandler(LiquidHandler):
                         resources=[src],
                         vols=[vol],
                         use_channels=use_channels,
-                        flow_rates=flow_rates,
+                        flow_rates=asp_rates,
                         offsets=offsets,
                         liquid_height=liquid_height,
-                        blow_out_air_volume=blow_out_air_volume,
+                        blow_out_air_volume=blow_out,
                         spread=spread,
                     )
-                    self.custom_delay(seconds=delays[0] if delays else 0)
+                    await self.custom_delay(seconds=(delay[0] if delay else 0) or 0)
                     # Dispense into target
                     await self.dispense(
                         resources=[tgt],
                         vols=[vol],
                         use_channels=use_channels,
-                        flow_rates=flow_rates,
+                        flow_rates=disp_rates,
                         offsets=offsets,
                         liquid_height=liquid_height,
-                        blow_out_air_volume=blow_out_air_volume,
+                        blow_out_air_volume=blow_out,
                         spread=spread,
                     )
                     await self.mix(
                         targets=[tgt],
                         mix_times=mix_times,
                         mix_vol=mix_vol)
-                    await self.touch_tip(tgt)
+                    if touch_tip:
+                        await self.touch_tip(tgt)
                     await self.discard_tips()
 
         except Exception as exc:
             raise RuntimeError(f"Liquid transfer failed: {exc}") from exc
 
+    async def transfer_op(self, op, table, *, optimize_path: bool = False):
+        """Run one parsed ``protocol_ir.TransferOp`` (possibly merged from several phases).
+
+        Labware is looked up by deck slot: *table* is the op's ``LabwareTable``
+        and every ``WellRef`` resolves to the well of the same name on the
+        resource in that slot of ``self.deck``. Tips are picked up at exactly
+        the positions the log recorded. Per-phase fields (flow rates, blow-out,
+        delays) are applied per transfer and ``op.mix`` is handed to ``mix``.
+        """
+        def slot_resource(ref):
+            return self.deck.slots[table.slots[ref.labware] - 1]
+
+        def well(ref):
+            return slot_resource(ref).get_item(ref.well)
+
+        if op.is_96_well:
+            sources, targets = [slot_resource(op.sources[0])], [slot_resource(op.targets[0])]
+            tip_racks, vols = [slot_resource(op.tips[0])], op.asp_vols[0]
+        else:
+            sources, targets = [well(r) for r in op.sources], [well(r) for r in op.targets]
+            # one [TipSpot] per tip, like iterating a TipRack
+            tip_racks, vols = [[slot_resource(t)[t.well] for t in op.tips]], list(op.asp_vols)
+        await self.transfer_liquid(
+            vols,
+            sources,
+            targets,
+            tip_racks,
+            flow_rates=list(op.asp_flow_rates),
+            dispense_flow_rates=list(op.dis_flow_rates),
+            blow_out_air_volume=list(op.blow_out_air_volume),
+            delays=list(op.delays),
+            is_96_well=op.is_96_well,
+            touch_tip=op.touch_tip,
+            mix_times=op.mix,
+            optimize_path=optimize_path,
+        )
+
 # ---------------------------------------------------------------
 # Helper utilities
 # ---------------------------------------------------------------
@@ -295,70 +479,115 @@ class MyLiquidHandler(LiquidHandler):
         msg: information to be printed
         """
         if seconds > 0:
+            start = self.clock.now()
             if msg:
                 print(f"Waiting time: {msg}")
-                print(f"Current time: {time.strftime('%H:%M:%S')}")
-                print(f"Time to finish: {time.strftime('%H:%M:%S', time.localtime(time.time() + seconds))}")
-            await asyncio.sleep(seconds)
+                print(f"Current time: {time.strftime('%H:%M:%S', time.localtime(start))}")
+                print(f"Time to finish: {time.strftime('%H:%M:%S', time.localtime(start + seconds))}")
+            await self.clock.sleep(seconds)
+            self.clock.record("delay", start)
             if msg:
                 print(f"Done: {msg}")
-                print(f"Current time: {time.strftime('%H:%M:%S')}")
+                print(f"Current time: {time.strftime('%H:%M:%S', time.localtime(self.clock.now()))}")
 
+    @instrumented("touch_tip", "targets")
     async def touch_tip(self, 
                         targets: Sequence[Container],
                         ):
         """Touch the tip to the side of the well."""
-        await self.asperate(
+        await self.aspirate(
             resources=[targets],
             vols=[0],
             use_channels=None,
             flow_rates=None,
-            offsets=Coordinate(x=targets.size_x/2),
+            offsets=[Coordinate(x=targets.get_size_x()/2)],
             liquid_height=None,
             blow_out_air_volume=None,
             spread="wide"
         )
         await self.custom_delay(seconds=1)
-        await self.asperate(
+        await self.aspirate(
             resources=[targets],
             vols=[0],
             use_channels=None,
             flow_rates=None,
-            offsets=Coordinate(x=-targets.size_x/2),
+            offsets=[Coordinate(x=-targets.get_size_x()/2)],
             liquid_height=None,
             blow_out_air_volume=None,
             spread="wide"
         )
+    @instrumented("mix", "targets")
     async def mix(
         self,
         targets: Sequence[Container],
-        mix_times: int = None,
-        mix_vol: Optional[int] = None,
+        mix_times: Union[int, List[int], None] = None,
+        mix_vol: Optional[float] = None,
+        *,
+        use_channels: Optional[List[int]] = None,
+        flow_rates: Optional[List[Optional[float]]] = None,
+        offsets: Optional[List[Coordinate]] = None,
+        dwell: float = DEFAULT_MIX_DWELL,
+        native: Optional[bool] = None,
     ):
-        """Mix the liquid in the target wells."""
-        for _ in mix_times:
-            for target in targets:
-                await self.aspirate(
-                    resources=[target],
-                    vols=[mix_vol],
-                    use_channels=None,
-                    flow_rates=None,
-                    offsets=None,
-                    liquid_height=None,
-                    blow_out_air_volume=None,
-                    spread="wide"
-                )
-                await self.custom_delay(seconds=1)
-                await self.aspirate(
-                    resources=[target],
-                    vols=[mix_vol],
-                    use_channels=None,
-                    flow_rates=None,
-                    offsets=None,
-                    liquid_height=None,
-                    blow_out_air_volume=None,
-                    spread="wide"
-                )
+        """Mix the liquid in the target wells.
+
+        *mix_times* may be an int, the ``[n]`` list the log parsers produce,
+        or a ``protocol_ir.MixSpec`` (then *mix_vol* and the flow rate default
+        to the spec's volume and rate).
+
+        On backends that mix natively (``NATIVE_MIX_BACKENDS``, or
+        ``native=True``) all repetitions are sent as one zero-volume
+        ``dispense`` carrying a pylabrobot ``Mix``; the backend runs the
+        cycles and *dwell* is not used. Otherwise each repetition is one
+        aspirate/dispense pair covering all *targets* at once (one channel
+        per target) with *dwell* seconds between them on ``self.clock``.
+        Either way the calls go through ``aspirate``/``dispense``, so they
+        are clocked, traced and timed like any other pipetting.
+
+        *dwell* defaults to ``DEFAULT_MIX_DWELL`` (0 s): the fixed 1 s
+        pause per cycle of earlier versions is gone; pass ``dwell=1`` to
+        keep it.
+        """
+        spec = mix_times if hasattr(mix_times, "times") else None
+        if spec is not None:
+            mix_times = spec.times
+            mix_vol = mix_vol if mix_vol is not None else spec.volume
+            if flow_rates is None and spec.rate is not None:
+                flow_rates = [spec.rate] * len(targets)
+        if isinstance(mix_times, (list, tuple)):
+            mix_times = mix_times[0] if mix_times else 0
+        if not mix_times or not mix_vol or not targets:
+            return
+        targets = list(targets)
+        vols = [mix_vol] * len(targets)
+        if native is None:
+            native = any(cls.__name__ in NATIVE_MIX_BACKENDS for cls in type(self.backend).__mro__)
+        if native:
+            rates = flow_rates or [None] * len(targets)
+            await self.dispense(
+                resources=targets,
+                vols=[0] * len(targets),
+                use_channels=use_channels,
+                offsets=offsets,
+                mix=[Mix(volume=mix_vol, repetitions=int(mix_times), flow_rate=rate) for rate in rates],
+            )
+            return
+        for _ in range(int(mix_times)):
+            await self.aspirate(
+                resources=targets,
+                vols=vols,
+                use_channels=use_channels,
+                flow_rates=flow_rates,
+                offsets=offsets,
+            )
+            await self.custom_delay(seconds=dwell)
+            await self.dispense(
+                resources=targets,
+                vols=vols,
+                use_channels=use_channels,
+                flow_rates=flow_rates,
+                offsets=offsets,
+            )
 
     def iter_tips(self, tip_racks: Sequence[TipRack]) -> Iterator[Resource]:
         """Yield tips from a list of TipRacks one-by-one until depleted."""
@@ -366,3 +595,10 @@ class MyLiquidHandler(LiquidHandler):
             for tip in rack:
                 yield tip
         raise RuntimeError("Out of tips!")
+
+
+def _per_transfer(values: Optional[list], n: int) -> list:
+    """Split a per-transfer list into ``[v]`` per transfer; anything else is reused by every transfer."""
+    if isinstance(values, list) and n > 1 and len(values) == n:
+        return [[v] for v in values]
+    return [values] * n
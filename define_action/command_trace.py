@@ -0,0 +1,323 @@
+"""
+Binary command trace for MyLiquidHandler.
+
+Layout (little endian):
+
+    header   b"PLRT" | version u16 | resource count u32 | record count u32 | extras count u32
+    table    per resource: name length u16 | utf-8 name
+    records  RECORD, one per channel of each backend call
+    extras   per call that passed backend kwargs: call u32 | length u32 | utf-8 JSON object
+
+Records of the same call share ``call``; ``channel`` is the index passed in
+``use_channels`` (NO_CHANNEL when the call used the default channels) and
+``spread`` indexes SPREADS (NO_SPREAD for operations without one).
+Numbers are float64; missing values (no offset, default flow rate, ...) are
+stored as NaN. Backend kwargs must be JSON values to replay exactly: anything
+else is stored as its ``str()`` and replayed as that string. A pylabrobot
+``Mix`` passed to aspirate/dispense is stored in the same JSON object under
+the key ``mix`` (a named parameter, so it cannot clash with a backend kwarg).
+"""
+
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import inspect
+import json
+import math
+import struct
+
+MAGIC = b"PLRT"
+VERSION = 2
+HEADER = struct.Struct("<4sHIII")
+NAME_LEN = struct.Struct("<H")
+# call, op, channel, spread, resource, volume, flow_rate, offset x/y/z, liquid_height, blow_out_air_volume
+RECORD = struct.Struct("<IBBBIddddddd")
+EXTRA = struct.Struct("<II")
+NO_CHANNEL = 0xFF
+SPREADS = ("wide", "tight", "custom")
+NO_SPREAD = 0xFF
+
+OPS = (
+    "pick_up_tips",
+    "drop_tips",
+    "aspirate",
+    "dispense",
+    "pick_up_tips96",
+    "drop_tips96",
+    "aspirate96",
+    "dispense96",
+)
+OP_CODES = {name: code for code, name in enumerate(OPS)}
+# first positional parameter (the resource) of each operation
+RESOURCE_PARAM = {
+    "pick_up_tips": "tip_spots",
+    "drop_tips": "tip_spots",
+    "aspirate": "resources",
+    "dispense": "resources",
+    "pick_up_tips96": "tip_rack",
+    "drop_tips96": "resource",
+    "aspirate96": "resource",
+    "dispense96": "resource",
+}
+NAN = float("nan")
+
+
+@dataclass
+class TraceRecord:
+    call: int
+    op: str
+    channel: Optional[int]
+    resource: str
+    volume: Optional[float] = None
+    flow_rate: Optional[float] = None
+    offset: Optional[Tuple[float, float, float]] = None
+    liquid_height: Optional[float] = None
+    blow_out_air_volume: Optional[float] = None
+    spread: Optional[str] = None
+    backend_kwargs: Optional[Dict[str, Any]] = None
+    mix: Optional[List[Optional[Dict[str, Any]]]] = None   # per channel, as dicts of Mix fields
+
+
+def _f(value) -> float:
+    return NAN if value is None else float(value)
+
+
+def _opt(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+
+def _per_channel(value, n: int) -> List[Any]:
+    """Normalise a scalar / list / None argument to one value per channel."""
+    if value is None:
+        return [None] * n
+    if isinstance(value, (list, tuple)):
+        return list(value) + [None] * (n - len(value))
+    return [value] * n
+
+
+class TraceRecorder:
+    """Collects backend-bound operations; attach with ``MyLiquidHandler(recorder=...)``."""
+
+    def __init__(self):
+        self.resources: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self.records: List[Tuple] = []
+        self.extras: Dict[int, Dict[str, Any]] = {}   # call -> backend kwargs
+        self.calls = 0
+        self._signatures: Dict[str, inspect.Signature] = {}
+        self._var_kwargs: Dict[str, Optional[str]] = {}
+
+    def intern(self, name: str) -> int:
+        rid = self._ids.get(name)
+        if rid is None:
+            rid = self._ids[name] = len(self.resources)
+            self.resources.append(name)
+        return rid
+
+    def _bind(self, op: str, method, args, kwargs) -> Dict[str, Any]:
+        sig = self._signatures.get(op)
+        if sig is None:
+            sig = self._signatures[op] = inspect.signature(method)
+            self._var_kwargs[op] = next((p.name for p in sig.parameters.values()
+                                         if p.kind is inspect.Parameter.VAR_KEYWORD), None)
+        return sig.bind_partial(*args, **kwargs).arguments
+
+    def record(self, op: str, method, args: Sequence, kwargs: Dict[str, Any]):
+        """Record one call; ``method`` is the bound LiquidHandler method being called."""
+        if op not in OP_CODES:
+            return
+        a = self._bind(op, method, args, kwargs)
+        resources = a.get(RESOURCE_PARAM[op])
+        if not isinstance(resources, (list, tuple)):
+            resources = [resources]
+        if op.endswith("96"):
+            resources = resources[:1]
+            volume = a.get("volume")
+            vols = [volume[0] if isinstance(volume, (list, tuple)) else volume]
+            flows = [a.get("flow_rate")]
+            offsets = [a.get("offset")]
+            heights = [None]
+            blow_outs = [a.get("blow_out_air_volume")]
+            channels = [None]
+        else:
+            n = len(resources)
+            vols = _per_channel(a.get("vols"), n)
+            flows = _per_channel(a.get("flow_rates"), n)
+            offsets = _per_channel(a.get("offsets"), n)
+            heights = _per_channel(a.get("liquid_height"), n)
+            blow_outs = _per_channel(a.get("blow_out_air_volume"), n)
+            channels = _per_channel(a.get("use_channels"), n)
+        code = OP_CODES[op]
+        spread = a.get("spread")
+        spread = NO_SPREAD if spread is None else SPREADS.index(spread)
+        extra = dict(a.get(self._var_kwargs[op]) or {}) if self._var_kwargs[op] else {}
+        if a.get("mix"):
+            extra["mix"] = [None if m is None else asdict(m) for m in a["mix"]]
+        if extra:
+            self.extras[self.calls] = extra
+        for res, vol, flow, off, height, blow, ch in zip(resources, vols, flows, offsets, heights, blow_outs, channels):
+            self.records.append((
+                self.calls, code, NO_CHANNEL if ch is None else ch, spread,
+                self.intern(getattr(res, "name", str(res))),
+                _f(vol), _f(flow),
+                _f(off.x if off is not None else None),
+                _f(off.y if off is not None else None),
+                _f(off.z if off is not None else None),
+                _f(height), _f(blow),
+            ))
+        self.calls += 1
+
+    def to_bytes(self) -> bytes:
+        parts = [HEADER.pack(MAGIC, VERSION, len(self.resources), len(self.records), len(self.extras))]
+        for name in self.resources:
+            raw = name.encode("utf-8")
+            parts.append(NAME_LEN.pack(len(raw)))
+            parts.append(raw)
+        parts.extend(RECORD.pack(*r) for r in self.records)
+        for call, extra in self.extras.items():
+            raw = json.dumps(extra, default=str).encode("utf-8")
+            parts.append(EXTRA.pack(call, len(raw)))
+            parts.append(raw)
+        return b"".join(parts)
+
+    def save(self, path: Union[str, Path]) -> Path:
+        path = Path(path)
+        path.write_bytes(self.to_bytes())
+        return path
+
+
+class Trace:
+    """A decoded trace: the resource table, the raw fixed-width records and per-call backend kwargs."""
+
+    def __init__(self, resources: List[str], records: List[Tuple],
+                 extras: Optional[Dict[int, Dict[str, Any]]] = None):
+        self.resources = resources
+        self.records = records
+        self.extras = extras or {}
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Trace":
+        magic, version = struct.unpack_from("<4sH", data, 0)
+        if magic != MAGIC:
+            raise ValueError("not a PLR command trace")
+        if version != VERSION:
+            raise ValueError(f"unsupported trace version {version} (expected {VERSION})")
+        _, _, n_res, n_rec, n_extra = HEADER.unpack_from(data, 0)
+        pos = HEADER.size
+        resources = []
+        for _ in range(n_res):
+            (length,) = NAME_LEN.unpack_from(data, pos)
+            pos += NAME_LEN.size
+            resources.append(data[pos:pos + length].decode("utf-8"))
+            pos += length
+        end = pos + n_rec * RECORD.size
+        if len(data) < end:
+            raise ValueError(f"truncated trace: expected {n_rec} records")
+        records = list(RECORD.iter_unpack(data[pos:end]))
+        pos = end
+        extras = {}
+        for _ in range(n_extra):
+            if len(data) < pos + EXTRA.size:
+                raise ValueError(f"truncated trace: expected {n_extra} backend kwargs entries")
+            call, length = EXTRA.unpack_from(data, pos)
+            pos += EXTRA.size
+            extras[call] = json.loads(data[pos:pos + length].decode("utf-8"))
+            pos += length
+        if pos != len(data):
+            raise ValueError("trailing bytes after trace")
+        return cls(resources, records, extras)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "Trace":
+        return cls.from_bytes(Path(path).read_bytes())
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def decoded(self) -> Iterator[TraceRecord]:
+        for call, code, ch, spread, rid, vol, flow, ox, oy, oz, height, blow in self.records:
+            yield TraceRecord(
+                call, OPS[code], None if ch == NO_CHANNEL else ch, self.resources[rid],
+                _opt(vol), _opt(flow), None if math.isnan(ox) else (ox, oy, oz),
+                _opt(height), _opt(blow),
+                None if spread == NO_SPREAD else SPREADS[spread], *self._split_extra(call),
+            )
+
+    def _split_extra(self, call: int) -> Tuple[Optional[Dict[str, Any]], Optional[list]]:
+        extra = dict(self.extras.get(call) or {})
+        mix = extra.pop("mix", None)
+        return extra or None, mix
+
+    def calls(self) -> Iterator[List[TraceRecord]]:
+        """Records grouped per backend call, in issue order."""
+        group: List[TraceRecord] = []
+        for rec in self.decoded():
+            if group and rec.call != group[0].call:
+                yield group
+                group = []
+            group.append(rec)
+        if group:
+            yield group
+
+
+def _lists_or_none(values: List[Any]) -> Optional[List[Any]]:
+    return None if all(v is None for v in values) else values
+
+
+async def replay(lh, trace: Union[Trace, str, Path]) -> int:
+    """Re-issue a trace on ``lh`` (any backend, same deck layout). Returns the number of calls.
+
+    Only the backend-bound operations are replayed: no protocol logic, no
+    delays, no planning.
+    """
+    from pylabrobot.liquid_handling.standard import Mix
+    from pylabrobot.resources import Coordinate
+
+    if not isinstance(trace, Trace):
+        trace = Trace.load(trace)
+    resources: Dict[str, Any] = {}
+
+    def resolve(name: str):
+        if name not in resources:
+            resources[name] = lh.deck.get_resource(name)
+        return resources[name]
+
+    def coord(off):
+        return None if off is None else Coordinate(*off)
+
+    n = 0
+    for group in trace.calls():
+        op = group[0].op
+        method = getattr(lh, op)
+        if op.endswith("96"):
+            rec = group[0]
+            kwargs: Dict[str, Any] = {}
+            if rec.offset is not None:
+                kwargs["offset"] = coord(rec.offset)
+            if op in ("aspirate96", "dispense96"):
+                kwargs.update(volume=rec.volume, flow_rate=rec.flow_rate,
+                              blow_out_air_volume=rec.blow_out_air_volume)
+            kwargs.update(rec.backend_kwargs or {})
+            await method(resolve(rec.resource), **kwargs)
+        else:
+            kwargs = {"use_channels": _lists_or_none([r.channel for r in group])}
+            if any(r.offset is not None for r in group):
+                kwargs["offsets"] = [coord(r.offset) or Coordinate.zero() for r in group]
+            if op in ("aspirate", "dispense"):
+                kwargs.update(
+                    vols=[r.volume for r in group],
+                    flow_rates=_lists_or_none([r.flow_rate for r in group]),
+                    liquid_height=_lists_or_none([r.liquid_height for r in group]),
+                    blow_out_air_volume=_lists_or_none([r.blow_out_air_volume for r in group]),
+                )
+                if group[0].spread is not None:
+                    kwargs["spread"] = group[0].spread
+                if group[0].mix is not None:
+                    kwargs["mix"] = [None if m is None else Mix(**m) for m in group[0].mix]
+            kwargs.update(group[0].backend_kwargs or {})
+            await method([resolve(r.resource) for r in group], **kwargs)
+        n += 1
+    return n
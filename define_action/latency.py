@@ -0,0 +1,179 @@
+"""
+Per-operation latency histograms for MyLiquidHandler.
+
+Each (operation, labware) pair gets an HDR-style histogram: values are
+bucketed by power of two, and each power of two is split into
+SUB_BUCKETS linear sub-buckets, so every recorded latency keeps ~3%
+relative precision from microseconds to hours in a few hundred counters.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+import functools
+import inspect
+import json
+import math
+import time
+
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+UNIT = 1e-6  # smallest resolved latency: 1 µs
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    @staticmethod
+    def bucket_of(seconds: float) -> int:
+        units = max(int(seconds / UNIT), 0)
+        if units < SUB_BUCKETS:
+            return units
+        exp = units.bit_length() - SUB_BUCKET_BITS - 1
+        return (exp << SUB_BUCKET_BITS) + ((units >> exp) - SUB_BUCKETS) + SUB_BUCKETS
+
+    @staticmethod
+    def bucket_bounds(index: int) -> Tuple[float, float]:
+        """[low, high) of a bucket, in seconds."""
+        if index < SUB_BUCKETS:
+            return index * UNIT, (index + 1) * UNIT
+        exp, sub = divmod(index - SUB_BUCKETS, SUB_BUCKETS)
+        low = (SUB_BUCKETS + sub) << exp
+        return low * UNIT, (low + (1 << exp)) * UNIT
+
+    def record(self, seconds: float):
+        idx = self.bucket_of(seconds)
+        self.counts[idx] = self.counts.get(idx, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def merge(self, other: "LatencyHistogram"):
+        for idx, n in other.counts.items():
+            self.counts[idx] = self.counts.get(idx, 0) + n
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th value (never above max)."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for idx in sorted(self.counts):
+            seen += self.counts[idx]
+            if seen >= rank:
+                return min(self.bucket_bounds(idx)[1], self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum_s": self.total,
+            "min_s": self.min if self.count else 0.0,
+            "max_s": self.max,
+            "mean_s": self.total / self.count if self.count else 0.0,
+            "quantiles_s": {str(q): self.quantile(q) for q in QUANTILES},
+            "buckets": {str(idx): n for idx, n in sorted(self.counts.items())},
+        }
+
+
+def labware_of(resource) -> str:
+    """Name of the labware a well / tip spot belongs to (the resource itself for plates)."""
+    if isinstance(resource, (list, tuple)):
+        if not resource:
+            return ""
+        resource = resource[0]
+    if resource is None:
+        return ""
+    parent = getattr(resource, "parent", None)
+    # well -> plate -> deck: report the plate; plate -> deck: report the plate itself
+    if parent is not None and getattr(parent, "parent", None) is not None:
+        return getattr(parent, "name", "")
+    return getattr(resource, "name", str(resource))
+
+
+class LatencyRecorder:
+    """Histograms keyed by (operation, labware); attach with ``MyLiquidHandler(latency=...)``."""
+
+    def __init__(self, clock: Optional[Callable[[], float]] = None):
+        # default: perf_counter, i.e. real latency even when the handler runs on a VirtualClock
+        self.clock = clock or time.perf_counter
+        self.histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+
+    def record(self, op: str, labware: str, seconds: float):
+        key = (op, labware)
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms[key] = LatencyHistogram()
+        hist.record(seconds)
+
+    def by_operation(self) -> Dict[str, LatencyHistogram]:
+        merged: Dict[str, LatencyHistogram] = {}
+        for (op, _), hist in self.histograms.items():
+            merged.setdefault(op, LatencyHistogram()).merge(hist)
+        return merged
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "operations": {op: h.to_dict() for op, h in sorted(self.by_operation().items())},
+            "by_labware": [
+                {"operation": op, "labware": lw, **h.to_dict()}
+                for (op, lw), h in sorted(self.histograms.items())
+            ],
+        }
+
+    def to_prometheus(self, prefix: str = "plr_operation_latency_seconds") -> str:
+        """Prometheus text exposition format (one summary per operation/labware)."""
+        lines = [f"# HELP {prefix} Latency of MyLiquidHandler operations.", f"# TYPE {prefix} summary"]
+        for (op, lw), h in sorted(self.histograms.items()):
+            labels = f'operation="{_escape(op)}",labware="{_escape(lw)}"'
+            for q in QUANTILES:
+                lines.append(f'{prefix}{{{labels},quantile="{q}"}} {h.quantile(q):.6g}')
+            lines.append(f"{prefix}_sum{{{labels}}} {h.total:.6g}")
+            lines.append(f"{prefix}_count{{{labels}}} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: Union[str, Path]) -> Path:
+        """Write ``*.json`` as JSON, anything else (e.g. ``*.prom``) as Prometheus text."""
+        path = Path(path)
+        if path.suffix == ".json":
+            path.write_text(json.dumps(self.to_json(), indent=2), encoding="utf-8")
+        else:
+            path.write_text(self.to_prometheus(), encoding="utf-8")
+        return path
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def instrumented(op: str, resource_arg: str):
+    """Time an ``async`` MyLiquidHandler method when ``self.latency`` is set."""
+    def decorator(fn):
+        sig = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(self, *args, **kwargs):
+            latency = getattr(self, "latency", None)
+            if latency is None:
+                return await fn(self, *args, **kwargs)
+            bound = sig.bind_partial(self, *args, **kwargs).arguments
+            start = latency.clock()
+            try:
+                return await fn(self, *args, **kwargs)
+            finally:
+                latency.record(op, labware_of(bound.get(resource_arg)), latency.clock() - start)
+        return wrapper
+    return decorator
@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import asyncio
+import logging
+
+from sim_clock import RealClock
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------
+# CHATTERBOX BACKENDS --------------------------------------------
+# ---------------------------------------------------------------
+# Method names follow pylabrobot's HeaterShakerBackend /
+# TemperatureControllerBackend, so a real backend can be passed instead.
+
+
+class _RampingTemperature:
+    """Temperature that moves linearly toward its target on the given clock."""
+
+    def __init__(self, clock: RealClock, ambient: float = 22.0, ramp_c_per_s: float = 0.5):
+        self.clock = clock
+        self.ambient = ambient
+        self.ramp = ramp_c_per_s
+        self._from = ambient
+        self._to = ambient
+        self._since = clock.now()
+
+    def set_target(self, target: Optional[float]):
+        self._from = self.current()
+        self._to = self.ambient if target is None else target
+        self._since = self.clock.now()
+
+    def current(self) -> float:
+        moved = self.ramp * (self.clock.now() - self._since)
+        if self._to >= self._from:
+            return min(self._to, self._from + moved)
+        return max(self._to, self._from - moved)
+
+
+class ChatterboxTemperatureBackend:
+    """Logs what a temperature module would do and simulates the ramp."""
+
+    def __init__(self, clock: RealClock, name: str = "temperature_module", ramp_c_per_s: float = 0.5):
+        self.name = name
+        self.temperature = _RampingTemperature(clock, ramp_c_per_s=ramp_c_per_s)
+
+    async def setup(self):
+        logger.info("[%s] setup", self.name)
+
+    async def stop(self):
+        logger.info("[%s] stop", self.name)
+
+    async def set_temperature(self, temperature: float):
+        logger.info("[%s] setting temperature to %s °C", self.name, temperature)
+        self.temperature.set_target(temperature)
+
+    async def get_current_temperature(self) -> float:
+        return self.temperature.current()
+
+    async def deactivate(self):
+        logger.info("[%s] deactivating", self.name)
+        self.temperature.set_target(None)
+
+
+class ChatterboxHeaterShakerBackend(ChatterboxTemperatureBackend):
+    def __init__(self, clock: RealClock, name: str = "heater_shaker", ramp_c_per_s: float = 0.5):
+        super().__init__(clock, name=name, ramp_c_per_s=ramp_c_per_s)
+        self.speed = 0.0
+        self.plate_locked = False
+
+    async def start_shaking(self, speed: float):
+        logger.info("[%s] shaking at %s RPM", self.name, speed)
+        self.speed = speed
+
+    async def stop_shaking(self):
+        logger.info("[%s] stop shaking", self.name)
+        self.speed = 0.0
+
+    async def lock_plate(self):
+        logger.info("[%s] locking plate", self.name)
+        self.plate_locked = True
+
+    async def unlock_plate(self):
+        logger.info("[%s] unlocking plate", self.name)
+        self.plate_locked = False
+
+
+class ChatterboxMagneticBackend:
+    def __init__(self, clock: RealClock, name: str = "magnetic_module"):
+        self.name = name
+        self.height: Optional[float] = None
+
+    async def setup(self):
+        logger.info("[%s] setup", self.name)
+
+    async def stop(self):
+        logger.info("[%s] stop", self.name)
+
+    async def engage(self, height: float):
+        logger.info("[%s] engaging magnets at %s mm", self.name, height)
+        self.height = height
+
+    async def disengage(self):
+        logger.info("[%s] disengaging magnets", self.name)
+        self.height = None
+
+
+# ---------------------------------------------------------------
+# HANDLES AND MODULES --------------------------------------------
+# ---------------------------------------------------------------
+
+
+class ModuleHandle:
+    """Awaitable result of a module operation that runs in the background.
+
+    The operation starts as soon as the handle is created; ``await handle``
+    waits for it to finish (and re-raises its error).
+    """
+
+    def __init__(self, name: str, task: "asyncio.Task"):
+        self.name = name
+        self.task = task
+
+    def __await__(self):
+        return self.task.__await__()
+
+    def done(self) -> bool:
+        return self.task.done()
+
+    def cancel(self) -> bool:
+        return self.task.cancel()
+
+    def __repr__(self):
+        state = "done" if self.done() else "running"
+        return f"<ModuleHandle {self.name} {state}>"
+
+
+class _Module:
+    """Base for modules: one operation at a time, each returned as a handle."""
+
+    def __init__(self, name: str, backend: Any, clock: Optional[RealClock] = None):
+        self.name = name
+        self.backend = backend
+        self.clock = clock if clock is not None else RealClock()
+        self.handles: List[ModuleHandle] = []
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _start(self, op: str, coro_fn: Callable[[], Awaitable]) -> ModuleHandle:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        name = f"{self.name}.{op}"
+
+        async def run():
+            # operations on the same module queue up; other modules and pipetting keep going
+            async with self._lock:
+                start = self.clock.now()
+                result = await coro_fn()
+                self.clock.record(name, start)
+                return result
+
+        handle = ModuleHandle(name, asyncio.ensure_future(run()))
+        self.handles.append(handle)
+        return handle
+
+    def pending(self) -> List[ModuleHandle]:
+        return [h for h in self.handles if not h.done()]
+
+    async def wait(self):
+        """Wait for every operation started on this module."""
+        await asyncio.gather(*self.pending())
+
+
+class TemperatureModule(_Module):
+    # poll interval while waiting for the target (simulated time under VirtualClock)
+    poll_seconds = 5.0
+    tolerance = 0.5
+    # give up if the target is not reached within this many seconds on the module's clock
+    timeout_seconds = 3600.0
+
+    async def _wait_for(self, temperature: float):
+        deadline = self.clock.now() + self.timeout_seconds
+        while True:
+            current = await self.backend.get_current_temperature()
+            if abs(current - temperature) <= self.tolerance:
+                return
+            if self.clock.now() >= deadline:
+                raise TimeoutError(f"{self.name} at {current:.1f} °C did not reach {temperature} °C "
+                                   f"within {self.timeout_seconds:g} s")
+            await self.clock.sleep(self.poll_seconds)
+
+    def set_temperature(self, temperature: float, wait: bool = True) -> ModuleHandle:
+        """Set the target; with ``wait`` the handle completes once it is reached."""
+        async def op():
+            await self.backend.set_temperature(temperature)
+            if wait:
+                await self._wait_for(temperature)
+        return self._start("set_temperature", op)
+
+    def hold(self, temperature: float, seconds: float) -> ModuleHandle:
+        """Reach ``temperature`` and hold it for ``seconds`` (an incubation)."""
+        async def op():
+            await self.backend.set_temperature(temperature)
+            await self._wait_for(temperature)
+            await self.clock.sleep(seconds)
+        return self._start("hold", op)
+
+    def deactivate(self) -> ModuleHandle:
+        return self._start("deactivate", self.backend.deactivate)
+
+
+class HeaterShakerModule(TemperatureModule):
+    def shake(self, speed: float, seconds: Optional[float] = None) -> ModuleHandle:
+        """Start shaking; with ``seconds`` the handle completes after shaking stops."""
+        async def op():
+            await self.backend.lock_plate()
+            await self.backend.start_shaking(speed)
+            if seconds is not None:
+                await self.clock.sleep(seconds)
+                await self.backend.stop_shaking()
+        return self._start("shake", op)
+
+    def stop_shaking(self) -> ModuleHandle:
+        return self._start("stop_shaking", self.backend.stop_shaking)
+
+    def incubate(self, temperature: Optional[float], speed: Optional[float], seconds: float,
+                 deactivate: bool = True) -> ModuleHandle:
+        """Heat, shake for ``seconds``, then stop (the parser's ``heater_shaker`` template)."""
+        async def op():
+            if temperature is not None:
+                await self.backend.set_temperature(temperature)
+                await self._wait_for(temperature)
+            if speed:
+                await self.backend.lock_plate()
+                await self.backend.start_shaking(speed)
+            await self.clock.sleep(seconds)
+            if speed:
+                await self.backend.stop_shaking()
+            if deactivate and temperature is not None:
+                await self.backend.deactivate()
+        return self._start("incubate", op)
+
+    def deactivate(self) -> ModuleHandle:
+        async def op():
+            await self.backend.stop_shaking()
+            await self.backend.deactivate()
+        return self._start("deactivate", op)
+
+
+class MagneticModule(_Module):
+    def engage(self, height: float = 10.0, settle_seconds: float = 0) -> ModuleHandle:
+        """Raise the magnets; the handle completes after the beads settle."""
+        async def op():
+            await self.backend.engage(height)
+            await self.clock.sleep(settle_seconds)
+        return self._start("engage", op)
+
+    def disengage(self) -> ModuleHandle:
+        return self._start("disengage", self.backend.disengage)
+
+
+def chatterbox_module(kind: str, name: str, clock: RealClock) -> _Module:
+    """Module with an offline backend: kind is heater_shaker / temperature / magnetic."""
+    factories: Dict[str, Callable[[], _Module]] = {
+        "heater_shaker": lambda: HeaterShakerModule(name, ChatterboxHeaterShakerBackend(clock, name), clock),
+        "temperature": lambda: TemperatureModule(name, ChatterboxTemperatureBackend(clock, name), clock),
+        "magnetic": lambda: MagneticModule(name, ChatterboxMagneticBackend(clock, name), clock),
+    }
+    if kind not in factories:
+        raise ValueError(f"unknown module kind {kind!r}; expected one of {sorted(factories)}")
+    return factories[kind]()
@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import math
+
+from well_addressing import DECK_COORDINATES
+
+Point = Tuple[float, float]
+
+# 2-opt 最多扫几轮；每轮 O(n^2) 次翻转尝试，每次 O(1) 算代价
+MAX_2OPT_PASSES = 20
+# 超过这么多 transfer 时只做最近邻
+MAX_2OPT_JOBS = 200
+
+
+@dataclass
+class TransferJob:
+    """One independent pick-up → aspirate → dispense → drop unit, as deck XY points."""
+
+    source: Point
+    target: Point
+    source_key: str = ""
+    target_key: str = ""
+
+
+@dataclass
+class PathPlan:
+    order: List[int]
+    before_mm: float
+    after_mm: float
+    dependencies: int = 0
+    tip_order: List[int] = field(default_factory=list)  # tips[tip_order[k]] is used by the k-th transfer
+    notes: List[str] = field(default_factory=list)
+
+    @property
+    def saved_mm(self) -> float:
+        return self.before_mm - self.after_mm
+
+    def summary(self) -> str:
+        pct = 100.0 * self.saved_mm / self.before_mm if self.before_mm else 0.0
+        return (f"gantry travel {self.before_mm:.0f} mm -> {self.after_mm:.0f} mm "
+                f"({pct:.1f}% less, {len(self.order)} transfers, {self.dependencies} ordering constraints)")
+
+
+def distance(a: Point, b: Point) -> float:
+    """XY straight-line distance in mm (Z moves are the same for any order)."""
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+def location_of(resource) -> Point:
+    """Deck XY of a well / tip spot (its centre), via the cached per-labware coordinate array."""
+    x, y, _ = DECK_COORDINATES.position(resource)
+    return (x, y)
+
+
+def dependencies(jobs: Sequence[TransferJob]) -> Dict[int, Set[int]]:
+    """
+    job j 必须排在 job i 之后（i < j 原顺序）的约束：
+    - j 从 i 加过液的孔里吸（读写）
+    - j 往 i 吸过的孔里加（写读）
+    - 两者往同一个孔里加（写写，保持加液顺序）
+    """
+    written: Dict[str, Set[int]] = {}   # 孔 -> 之前往里加过液的 job
+    touched: Dict[str, Set[int]] = {}   # 孔 -> 之前吸过或加过的 job
+    preds: Dict[int, Set[int]] = {}
+    for j, b in enumerate(jobs):
+        preds[j] = written.get(b.source_key, set()) | touched.get(b.target_key, set())
+        for key in {b.source_key, b.target_key} - {""}:
+            touched.setdefault(key, set()).add(j)
+        if b.target_key:
+            written.setdefault(b.target_key, set()).add(j)
+    return preds
+
+
+def travel(order: Sequence[int], jobs: Sequence[TransferJob], tips: Sequence[Point],
+           start: Optional[Point] = None, metric: Callable[[Point, Point], float] = distance) -> float:
+    """
+    按 order 执行时的估算行程：第 k 个 transfer 用 tips[k]，
+    路径为 上一个目标孔 -> 枪头 -> 源孔 -> 目标孔。
+    """
+    total = 0.0
+    here = start
+    for k, j in enumerate(order):
+        tip = tips[k] if tips else None
+        job = jobs[j]
+        for point in (tip, job.source, job.target):
+            if point is None:
+                continue
+            if here is not None:
+                total += metric(here, point)
+            here = point
+    return total
+
+
+def _leg(metric, a, b):
+    return metric(a, b) if a is not None and b is not None else 0.0
+
+
+def _nearest_neighbour(jobs, tips, preds, start, metric, reorder_tips) -> Tuple[List[int], List[int]]:
+    """
+    贪心排序：每一步先选枪头（reorder_tips 时离当前位置最近的空枪头，否则按顺序取下一个），
+    再选离这个枪头（没有枪头时离当前位置）最近的可执行 transfer。每步 O(n)，总共 O(n^2)。
+    """
+    successors: Dict[int, List[int]] = {j: [] for j in range(len(jobs))}
+    waiting = {j: len(ps) for j, ps in preds.items()}
+    for j, ps in preds.items():
+        for i in ps:
+            successors[i].append(j)
+    ready = {j for j, count in waiting.items() if count == 0}
+    order: List[int] = []
+    tip_order: List[int] = []
+    free_tips = list(range(len(tips)))
+    here = start
+    while ready:
+        tip = None
+        if tips:
+            tip = (min(free_tips, key=lambda t: (_leg(metric, here, tips[t]), t)) if reorder_tips
+                   else free_tips[0])
+            free_tips.remove(tip)
+            tip_order.append(tip)
+        anchor = here if tip is None else tips[tip]
+        nxt = min(ready, key=lambda j: (_leg(metric, anchor, jobs[j].source), j))
+        ready.remove(nxt)
+        order.append(nxt)
+        for j in successors[nxt]:
+            waiting[j] -= 1
+            if waiting[j] == 0:
+                ready.add(j)
+        here = jobs[nxt].target
+    return order, tip_order
+
+
+def _two_opt(order, jobs, preds, start, metric, entry=None, slot_tips=()) -> List[int]:
+    """
+    在依赖约束内做 2-opt（翻转一段顺序）。
+    entry[j] 是执行 job j 时先到的点（跟着 job 走的枪头，或源孔）；slot_tips 给定时枪头固定在
+    位置上（第 p 个 transfer 用 slot_tips[p]）。两种情况下都按翻转段的中心 i + k 枚举、
+    从中心向两边扩，段内连接之和每扩一步只加两项，每次尝试 O(1)。
+    """
+    best = list(order)
+    n = len(best)
+    related = {j: set(ps) for j, ps in preds.items()}   # 有先后约束的两个 job 不能在同一翻转段里
+    for j, ps in preds.items():
+        for i in ps:
+            related[i].add(j)
+
+    def link(p, a, b):
+        """位置 p 上的 job b 接在 job a（None = 起点）之后的行程，不含 b 自身 源孔 -> 目标孔 那段。"""
+        here = start if a is None else jobs[a].target
+        if slot_tips:
+            return _leg(metric, here, slot_tips[p]) + _leg(metric, slot_tips[p], jobs[b].source)
+        return _leg(metric, here, entry[b])
+
+    def forward():
+        # fwd[p]: 位置 0..p-1 的连接之和
+        sums = [0.0]
+        for p in range(n):
+            sums.append(sums[-1] + link(p, best[p - 1] if p else None, best[p]))
+        return sums
+
+    for _ in range(MAX_2OPT_PASSES):
+        improved = False
+        fwd = forward()
+        for center in range(1, 2 * n - 2):
+            i, k = (center - 1) // 2, center // 2 + 1      # 最短的段：两个（center 奇）或三个 job
+            if k >= n:
+                continue
+            segment = set()
+            valid = True
+            for q in range(i, k + 1):
+                if related[best[q]] & segment:
+                    valid = False
+                    break
+                segment.add(best[q])
+            if not valid:
+                continue
+            # 翻转后位置 q（i < q <= k）上是 best[center - q]，前面接 best[center - q + 1]
+            inner = sum(link(q, best[center - q + 1], best[center - q]) for q in range(i + 1, k + 1))
+            while True:
+                old = fwd[min(k + 2, n)] - fwd[i]
+                new = link(i, best[i - 1] if i else None, best[k]) + inner
+                if k + 1 < n:
+                    new += link(k + 1, best[i], best[k + 1])
+                if new < old - 1e-9:
+                    best[i:k + 1] = best[i:k + 1][::-1]
+                    improved = True
+                    fwd = forward()
+                    break
+                if i == 0 or k + 1 >= n:
+                    break
+                i, k = i - 1, k + 1
+                # 更长的段包含当前段，有约束冲突时再扩也一样不行
+                if related[best[k]] & segment:
+                    break
+                segment.add(best[k])
+                if related[best[i]] & segment:
+                    break
+                segment.add(best[i])
+                inner += link(i + 1, best[center - i], best[center - i - 1]) + link(k, best[center - k + 1], best[center - k])
+        if not improved:
+            break
+    return best
+
+
+def plan_transfers(jobs: Sequence[TransferJob], tips: Sequence[Point] = (), start: Optional[Point] = None,
+                   metric: Callable[[Point, Point], float] = distance, two_opt: bool = True,
+                   reorder_tips: bool = False) -> PathPlan:
+    """
+    重排相互独立的 transfer（以及可选地重排枪头），使龙门估算行程最短：
+    先按依赖约束做最近邻，再做 2-opt（超过 MAX_2OPT_JOBS 个 transfer 时跳过）。
+    只在不违反依赖约束、且行程确实变短时才改变顺序，结果不会比原顺序差。
+    tips 为空时不计枪头行程；reorder_tips=False 时枪头按 tips 的顺序使用。
+    """
+    if tips and len(tips) < len(jobs):
+        raise ValueError(f"{len(jobs)} transfers but only {len(tips)} tips")
+    identity = list(range(len(jobs)))
+    identity_tips = list(range(len(jobs))) if tips else []
+    before = travel(identity, jobs, tips, start, metric)
+    preds = dependencies(jobs)
+    n_deps = sum(len(p) for p in preds.values())
+    if len(jobs) < 2:
+        return PathPlan(identity, before, before, n_deps, identity_tips)
+    order, tip_order = _nearest_neighbour(jobs, tips, preds, start, metric, reorder_tips)
+    notes = []
+    if two_opt and len(jobs) > MAX_2OPT_JOBS:
+        notes.append(f"2-opt skipped ({len(jobs)} transfers > {MAX_2OPT_JOBS})")
+    elif two_opt and len(jobs) > 2:
+        if tips and reorder_tips:
+            # 枪头跟着 transfer 走，翻转顺序不改变谁用哪个枪头
+            tip_of = dict(zip(order, tip_order))
+            order = _two_opt(order, jobs, preds, start, metric, entry=[tips[tip_of[j]] for j in range(len(jobs))])
+            tip_order = [tip_of[j] for j in order]
+        elif tips:
+            order = _two_opt(order, jobs, preds, start, metric, slot_tips=[tips[t] for t in tip_order])
+        else:
+            order = _two_opt(order, jobs, preds, start, metric, entry=[job.source for job in jobs])
+    assigned = [tips[t] for t in tip_order]
+    after = travel(order, jobs, assigned, start, metric)
+    if after >= before:
+        return PathPlan(identity, before, before, n_deps, identity_tips, notes + ["original order already shortest"])
+    return PathPlan(order, before, after, n_deps, tip_order, notes)
+
+
+def plan_resources(sources: Sequence, targets: Sequence, tip_spots: Sequence = (), **kwargs) -> PathPlan:
+    """plan_transfers on pylabrobot resources (wells, tip spots) placed on a deck."""
+    jobs = [TransferJob(location_of(s), location_of(t), s.name, t.name) for s, t in zip(sources, targets)]
+    tips = [location_of(tip) for tip in tip_spots]
+    return plan_transfers(jobs, tips, **kwargs)
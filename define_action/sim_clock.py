@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+import asyncio
+import heapq
+import itertools
+import selectors
+import time
+
+T = TypeVar("T")
+
+
+# Rough per-operation durations (seconds) on an OT-2, used by VirtualClock to
+# project the wall time of a simulated run. Delays and module waits are exact.
+DEFAULT_OP_SECONDS: Dict[str, float] = {
+    "pick_up_tips": 4.0,
+    "drop_tips": 4.0,
+    "aspirate": 3.0,
+    "dispense": 3.0,
+    "pick_up_tips96": 6.0,
+    "drop_tips96": 6.0,
+    "aspirate96": 4.0,
+    "dispense96": 4.0,
+}
+
+
+class RealClock:
+    """Wall-clock time; `sleep` really waits. Used on hardware."""
+
+    def __init__(self):
+        self.timeline: List[Tuple[float, str, float]] = []
+
+    def now(self) -> float:
+        return time.time()
+
+    async def sleep(self, seconds: float):
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    async def operation_done(self, name: str):
+        """Hook called after each backend operation; real time already passed."""
+
+    def record(self, name: str, start: float):
+        self.timeline.append((start, name, self.now() - start))
+
+    @property
+    def elapsed(self) -> float:
+        if not self.timeline:
+            return 0.0
+        start, name, duration = self.timeline[-1]
+        return start + duration - self.timeline[0][0]
+
+
+class _Wakeup:
+    """One pending VirtualClock.sleep; ``cancelled`` marks it for lazy removal from the heap."""
+
+    __slots__ = ("when", "seq", "future", "woken", "cancelled")
+
+    def __init__(self, when: float, seq: int, future: "asyncio.Future"):
+        self.when = when
+        self.seq = seq
+        self.future = future
+        self.woken = False
+        self.cancelled = False
+
+    def __lt__(self, other: "_Wakeup") -> bool:
+        return (self.when, self.seq) < (other.when, other.seq)
+
+
+class _IdleSelector(selectors.DefaultSelector):
+    """Selector that calls ``on_idle`` whenever the event loop is about to block.
+
+    The loop only asks to block (a non-zero select timeout) once no callback
+    is ready, i.e. every task is waiting on something. ``on_idle`` returns
+    True when it woke a task, and the loop then polls instead of blocking.
+    """
+
+    def __init__(self, on_idle: Callable[[], bool]):
+        super().__init__()
+        self._on_idle = on_idle
+
+    def select(self, timeout=None):
+        if (timeout is None or timeout > 0) and self._on_idle():
+            timeout = 0
+        return super().select(timeout)
+
+
+class VirtualClock(RealClock):
+    """Simulated time for chatterbox runs.
+
+    `sleep` returns without waiting and advances the clock, and every backend
+    operation advances it by its estimated duration, so an hours-long
+    protocol simulates in seconds and `elapsed` is its projected wall time.
+
+    Run the protocol with ``clock.run(main())`` instead of ``asyncio.run``:
+    the clock only moves when every task on that loop is blocked, and then
+    jumps to the earliest pending wake-up, like a discrete-event simulator.
+    Concurrent sleepers (e.g. a heater-shaker incubation running while the
+    pipette keeps working) therefore overlap.
+    """
+
+    def __init__(self, start: Optional[float] = None, op_seconds: Optional[Dict[str, float]] = None):
+        super().__init__()
+        start = time.time() if start is None else start
+        self._start = start
+        self._now = start
+        self.op_seconds = DEFAULT_OP_SECONDS if op_seconds is None else op_seconds
+        self._wakeups: List[_Wakeup] = []
+        self._cancelled = 0
+        self._seq = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def now(self) -> float:
+        return self._now
+
+    def new_event_loop(self) -> asyncio.AbstractEventLoop:
+        """Event loop whose idle turns advance this clock."""
+        self._loop = asyncio.SelectorEventLoop(_IdleSelector(self._advance))
+        return self._loop
+
+    def run(self, main: Awaitable[T]) -> T:
+        """``asyncio.run`` for simulations: run ``main`` on a fresh loop driven by this clock."""
+        loop = self.new_event_loop()
+        try:
+            asyncio.set_event_loop(loop)
+            return loop.run_until_complete(main)
+        finally:
+            try:
+                pending = asyncio.all_tasks(loop)
+                for task in pending:
+                    task.cancel()
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+                loop.run_until_complete(loop.shutdown_asyncgens())
+            finally:
+                asyncio.set_event_loop(None)
+                loop.close()
+                self._loop = None
+
+    async def sleep(self, seconds: float):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            raise RuntimeError("VirtualClock.sleep must run on the clock's loop; use clock.run(main())")
+        if seconds <= 0:
+            await asyncio.sleep(0)  # still yield so concurrent tasks interleave
+            return
+        wakeup = _Wakeup(self._now + seconds, next(self._seq), loop.create_future())
+        heapq.heappush(self._wakeups, wakeup)
+        try:
+            await wakeup.future
+        finally:
+            if not wakeup.woken:
+                # cancelled while waiting: leave it in the heap, _advance skips it
+                wakeup.cancelled = True
+                self._cancelled += 1
+                self._drop_cancelled()
+
+    def _drop_cancelled(self):
+        while self._wakeups and self._wakeups[0].cancelled:
+            heapq.heappop(self._wakeups)
+            self._cancelled -= 1
+        if self._cancelled > len(self._wakeups) // 2:
+            self._wakeups = [w for w in self._wakeups if not w.cancelled]
+            heapq.heapify(self._wakeups)
+            self._cancelled = 0
+
+    def _advance(self) -> bool:
+        """Loop is idle: jump to the earliest wake-up and release every sleeper due then."""
+        self._drop_cancelled()
+        if not self._wakeups:
+            return False
+        when = self._wakeups[0].when
+        self._now = max(self._now, when)
+        while self._wakeups and self._wakeups[0].when <= when:
+            wakeup = heapq.heappop(self._wakeups)
+            if wakeup.cancelled:
+                self._cancelled -= 1
+                continue
+            wakeup.woken = True
+            if not wakeup.future.done():
+                wakeup.future.set_result(None)
+        return True
+
+    @property
+    def pending_sleepers(self) -> int:
+        return len(self._wakeups) - self._cancelled
+
+    async def operation_done(self, name: str):
+        await self.sleep(self.op_seconds.get(name, 0.0))
+
+    @property
+    def elapsed(self) -> float:
+        return self._now - self._start
+
+    def report(self) -> Dict[str, float]:
+        """Projected seconds per operation name, plus the total."""
+        totals: Dict[str, float] = {}
+        for _, name, duration in self.timeline:
+            totals[name] = totals.get(name, 0.0) + duration
+        totals["total"] = self.elapsed
+        return totals
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("pylabrobot")
+
+from pylabrobot.liquid_handling.backends import LiquidHandlerChatterboxBackend
+from pylabrobot.resources import Coordinate, cor_96_wellplate_360uL_Fb, hamilton_96_tiprack_300uL
+from pylabrobot.resources.opentrons import OTDeck
+
+from action_defination import MyLiquidHandler
+from command_trace import Trace, TraceRecorder, replay
+
+
+def _handler():
+    recorder = TraceRecorder()
+    lh = MyLiquidHandler(backend=LiquidHandlerChatterboxBackend(num_channels=8), deck=OTDeck(), recorder=recorder)
+    lh.deck.assign_child_at_slot(cor_96_wellplate_360uL_Fb("plate"), 1)
+    lh.deck.assign_child_at_slot(hamilton_96_tiprack_300uL("tips"), 2)
+    return lh, recorder
+
+
+async def _protocol(lh):
+    plate, tips = lh.deck.get_resource("plate"), lh.deck.get_resource("tips")
+    await lh.pick_up_tips(tips["A1:B1"], use_channels=[2, 5])
+    await lh.aspirate(plate["A1:B1"], vols=[20, 30], use_channels=[2, 5], flow_rates=[50, None],
+                      offsets=[Coordinate(0, 0, 1), Coordinate.zero()], blow_out_air_volume=[5, 5])
+    await lh.dispense(plate["A2:B2"], vols=[20, 30], use_channels=[2, 5], liquid_height=[2, 3])
+    await lh.drop_tips(tips["A1:B1"], use_channels=[2, 5])
+    await lh.pick_up_tips(tips["C1"])
+    await lh.aspirate(plate["C1"], vols=[10], spread="tight")
+    await lh.dispense(plate["C2"], vols=[10])
+    await lh.drop_tips(tips["C1"])
+
+
+def test_record_save_load_replay_round_trip(tmp_path):
+    lh, recorder = _handler()
+
+    async def record():
+        await lh.setup()
+        await _protocol(lh)
+
+    asyncio.run(record())
+    path = recorder.save(tmp_path / "run.plrt")
+    trace = Trace.load(path)
+    assert len(list(trace.calls())) == 8
+
+    lh2, recorder2 = _handler()
+
+    async def play():
+        await lh2.setup()
+        return await replay(lh2, path)
+
+    assert asyncio.run(play()) == 8
+    replayed = Trace.from_bytes(recorder2.to_bytes())
+    assert list(replayed.decoded()) == list(trace.decoded())
+    assert recorder2.to_bytes() == recorder.to_bytes()
+
+
+def test_decoded_records_keep_per_channel_values():
+    lh, recorder = _handler()
+
+    async def record():
+        await lh.setup()
+        await _protocol(lh)
+
+    asyncio.run(record())
+    aspirate = next(g for g in Trace.from_bytes(recorder.to_bytes()).calls() if g[0].op == "aspirate")
+    assert [(r.channel, r.resource, r.volume, r.flow_rate) for r in aspirate] == [
+        (2, "plate_well_A1", 20.0, 50.0), (5, "plate_well_B1", 30.0, None)]
+    assert aspirate[0].offset == (0.0, 0.0, 1.0) and aspirate[1].offset == (0.0, 0.0, 0.0)
+    dispense = next(g for g in Trace.from_bytes(recorder.to_bytes()).calls() if g[0].op == "dispense")
+    assert [r.liquid_height for r in dispense] == [2.0, 3.0]
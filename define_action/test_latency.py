@@ -0,0 +1,61 @@
+import random
+
+import pytest
+
+from latency import SUB_BUCKETS, UNIT, LatencyHistogram
+
+
+def _units(bounds):
+    low, high = bounds
+    return round(low / UNIT), round(high / UNIT)
+
+
+def test_buckets_tile_the_axis_without_gaps():
+    prev_high = 0
+    for idx in range(40 * SUB_BUCKETS):
+        low, high = _units(LatencyHistogram.bucket_bounds(idx))
+        assert low == prev_high and high > low
+        prev_high = high
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_every_value_falls_inside_its_bucket(seed):
+    rng = random.Random(seed)
+    for _ in range(2000):
+        seconds = 10 ** rng.uniform(-7, 4)          # 0.1 µs .. ~3 h
+        units = int(seconds / UNIT)
+        low, high = _units(LatencyHistogram.bucket_bounds(LatencyHistogram.bucket_of(seconds)))
+        assert low <= units < high
+
+
+def test_bucket_width_is_within_relative_precision():
+    for idx in range(SUB_BUCKETS, 40 * SUB_BUCKETS):
+        low, high = _units(LatencyHistogram.bucket_bounds(idx))
+        assert (high - low) / low <= 1 / SUB_BUCKETS
+
+
+def test_exact_buckets_below_sub_bucket_count_and_negative_values():
+    assert [LatencyHistogram.bucket_of(i * UNIT + UNIT / 2) for i in range(SUB_BUCKETS)] == list(range(SUB_BUCKETS))
+    assert LatencyHistogram.bucket_of(-1.0) == 0
+
+
+def test_quantiles_are_bucket_upper_bounds_capped_at_max():
+    hist = LatencyHistogram()
+    for ms in range(1, 101):
+        hist.record(ms / 1000)
+    assert hist.count == 100 and hist.min == 0.001 and hist.max == 0.1
+    p50 = hist.quantile(0.5)
+    assert 0.050 <= p50 <= 0.050 * (1 + 1 / SUB_BUCKETS)
+    assert hist.quantile(1.0) == hist.max
+    assert LatencyHistogram().quantile(0.5) == 0.0
+
+
+def test_merge_adds_counts():
+    a, b = LatencyHistogram(), LatencyHistogram()
+    a.record(0.002)
+    b.record(0.002)
+    b.record(3.0)
+    a.merge(b)
+    assert a.count == 3 and sum(a.counts.values()) == 3
+    assert a.counts[LatencyHistogram.bucket_of(0.002)] == 2
+    assert a.max == 3.0 and a.min == 0.002
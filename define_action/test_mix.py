@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("pylabrobot")
+
+from pylabrobot.liquid_handling.backends import LiquidHandlerChatterboxBackend
+from pylabrobot.resources import cor_96_wellplate_360uL_Fb, hamilton_96_tiprack_300uL
+from pylabrobot.resources.opentrons import OTDeck
+
+from action_defination import MyLiquidHandler
+from command_trace import Trace, TraceRecorder
+from sim_clock import VirtualClock
+
+
+def _handler(clock=None):
+    recorder = TraceRecorder()
+    lh = MyLiquidHandler(backend=LiquidHandlerChatterboxBackend(num_channels=8), deck=OTDeck(),
+                         clock=clock, recorder=recorder)
+    plate = cor_96_wellplate_360uL_Fb("plate")
+    tips = hamilton_96_tiprack_300uL("tips")
+    lh.deck.assign_child_at_slot(plate, 1)
+    lh.deck.assign_child_at_slot(tips, 2)
+    return lh, plate, tips, recorder
+
+
+def _ops(recorder):
+    return [(r.op, r.resource) for r in Trace.from_bytes(recorder.to_bytes()).decoded()]
+
+
+def test_mix_accepts_parser_list_mix_times():
+    lh, plate, tips, recorder = _handler()
+
+    async def main():
+        await lh.setup()
+        await lh.pick_up_tips(tips["A1:B1"])
+        await lh.mix(plate["A1:B1"], mix_times=[3], mix_vol=10)
+
+    asyncio.run(main())
+    ops = [op for op, _ in _ops(recorder)][2:]   # after the two pick-up records
+    # one two-channel aspirate/dispense pair per repetition
+    assert ops == ["aspirate", "aspirate", "dispense", "dispense"] * 3
+
+
+def test_mix_dwell_runs_on_the_clock():
+    clock = VirtualClock(start=0.0)
+    lh, plate, tips, _ = _handler(clock)
+
+    async def main():
+        await lh.setup()
+        await lh.pick_up_tips(tips["A1"])
+        start = clock.now()
+        await lh.mix(plate["A1"], mix_times=2, mix_vol=10, dwell=1.5)
+        return clock.now() - start
+
+    elapsed = clock.run(main())
+    assert elapsed >= 3.0
+
+
+def test_native_mix_is_one_traced_dispense():
+    lh, plate, tips, recorder = _handler()
+
+    async def main():
+        await lh.setup()
+        await lh.pick_up_tips(tips["A1"])
+        await lh.mix(plate["A1"], mix_times=[20], mix_vol=10, native=True)
+
+    asyncio.run(main())
+    records = list(Trace.from_bytes(recorder.to_bytes()).decoded())
+    assert [r.op for r in records] == ["pick_up_tips", "dispense"]
+    assert records[1].volume == 0
+    assert records[1].mix[0]["repetitions"] == 20
+    assert records[1].mix[0]["volume"] == 10
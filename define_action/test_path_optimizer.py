@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from path_optimizer import TransferJob, dependencies, plan_transfers, travel
+
+
+def _random_jobs(rng, n, wells=12):
+    """Transfers between a few shared wells, so many of them depend on each other."""
+    keys = [f"w{i}" for i in range(wells)]
+    pos = {k: (rng.uniform(0, 400), rng.uniform(0, 300)) for k in keys}
+    jobs = []
+    for _ in range(n):
+        s, t = rng.sample(keys, 2)
+        jobs.append(TransferJob(pos[s], pos[t], s, t))
+    return jobs
+
+
+def _assert_respects(order, jobs):
+    preds = dependencies(jobs)
+    position = {j: p for p, j in enumerate(order)}
+    assert sorted(order) == list(range(len(jobs)))
+    for j, ps in preds.items():
+        for i in ps:
+            assert position[i] < position[j], f"job {j} moved before job {i} it depends on"
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("with_tips,reorder_tips", [(False, False), (True, False), (True, True)])
+def test_plan_keeps_every_dependency(seed, with_tips, reorder_tips):
+    rng = random.Random(seed)
+    jobs = _random_jobs(rng, rng.randint(2, 40))
+    tips = [(rng.uniform(0, 400), rng.uniform(0, 300)) for _ in jobs] if with_tips else []
+    plan = plan_transfers(jobs, tips, reorder_tips=reorder_tips)
+    _assert_respects(plan.order, jobs)
+    assert plan.after_mm <= plan.before_mm + 1e-9
+    if with_tips:
+        assert sorted(plan.tip_order) == list(range(len(jobs)))
+        assert plan.after_mm == pytest.approx(travel(plan.order, jobs, [tips[t] for t in plan.tip_order]))
+
+
+def test_dependency_chain_is_never_reordered():
+    # serial dilution far -> near -> far: shorter in reverse, but each step reads the previous target
+    xs = [0, 300, 10, 290, 20, 280]
+    jobs = [TransferJob((xs[i], 0), (xs[i + 1], 0), f"w{i}", f"w{i + 1}") for i in range(len(xs) - 1)]
+    plan = plan_transfers(jobs)
+    assert plan.order == list(range(len(jobs)))
+    assert plan.dependencies == len(jobs) - 1
+
+
+def test_independent_transfers_are_reordered():
+    jobs = [TransferJob((x, 0), (x, 10), f"s{x}", f"t{x}") for x in (0, 300, 10, 290, 20, 280)]
+    plan = plan_transfers(jobs)
+    assert plan.dependencies == 0
+    assert plan.after_mm < plan.before_mm
+    _assert_respects(plan.order, jobs)
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from modules import chatterbox_module
+from sim_clock import VirtualClock
+
+
+def test_concurrent_sleepers_overlap():
+    clock = VirtualClock(start=0.0)
+
+    async def main():
+        await asyncio.gather(clock.sleep(30), clock.sleep(10), clock.sleep(20))
+
+    clock.run(main())
+    assert clock.elapsed == 30
+
+
+def test_clock_waits_for_busy_tasks():
+    # a task that keeps running without sleeping must not let the clock jump ahead of it
+    clock = VirtualClock(start=0.0)
+    seen = []
+
+    async def busy():
+        for _ in range(100):
+            await asyncio.sleep(0)
+        seen.append(clock.now())
+
+    async def main():
+        await asyncio.gather(clock.sleep(5), busy())
+
+    clock.run(main())
+    assert seen == [0.0]
+    assert clock.elapsed == 5
+
+
+def test_cancelled_sleeper_does_not_block_others():
+    clock = VirtualClock(start=0.0)
+
+    async def main():
+        early = asyncio.ensure_future(clock.sleep(10))
+        late = asyncio.ensure_future(clock.sleep(20))
+        await asyncio.sleep(0)
+        early.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await early
+        await asyncio.wait_for(late, timeout=5)
+        assert clock.pending_sleepers == 0
+
+    clock.run(main())
+    assert clock.elapsed == 20
+
+
+def test_sleep_outside_clock_loop_fails():
+    clock = VirtualClock(start=0.0)
+    with pytest.raises(RuntimeError):
+        asyncio.run(clock.sleep(1))
+
+
+def test_temperature_wait_times_out():
+    clock = VirtualClock(start=0.0)
+    module = chatterbox_module("temperature", "temp", clock)
+    module.backend.temperature.ramp = 0.0   # never moves
+    module.timeout_seconds = 60
+
+    async def main():
+        await module.set_temperature(4)
+
+    with pytest.raises(TimeoutError):
+        clock.run(main())
+    assert clock.elapsed >= 60
+
+
+def test_module_runs_alongside_pipetting():
+    clock = VirtualClock(start=0.0)
+    module = chatterbox_module("heater_shaker", "hs", clock)
+
+    async def main():
+        handle = module.incubate(None, 500, seconds=300)
+        for _ in range(10):
+            await clock.operation_done("aspirate")
+        assert clock.now() == 30
+        await handle
+
+    clock.run(main())
+    assert clock.elapsed == 300
@@ -0,0 +1,64 @@
+import asyncio
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pylabrobot")
+
+from pylabrobot.liquid_handling.backends import LiquidHandlerChatterboxBackend
+from pylabrobot.resources import cor_96_wellplate_360uL_Fb, hamilton_96_tiprack_300uL
+from pylabrobot.resources.opentrons import OTDeck
+
+from action_defination import MyLiquidHandler
+from command_trace import Trace, TraceRecorder
+
+
+def _load_protocol_ir():
+    # protocol_ir lives with the log parsers in Protocol/ and only imports the stdlib
+    path = Path(__file__).resolve().parent.parent / "Protocol" / "protocol_ir.py"
+    spec = importlib.util.spec_from_file_location("protocol_ir", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+ir = _load_protocol_ir()
+
+
+def test_transfer_op_runs_a_merged_op_per_transfer():
+    recorder = TraceRecorder()
+    lh = MyLiquidHandler(backend=LiquidHandlerChatterboxBackend(num_channels=8), deck=OTDeck(), recorder=recorder)
+    lh.deck.assign_child_at_slot(cor_96_wellplate_360uL_Fb("src"), 1)
+    lh.deck.assign_child_at_slot(cor_96_wellplate_360uL_Fb("dst"), 3)
+    lh.deck.assign_child_at_slot(hamilton_96_tiprack_300uL("tips"), 6)
+
+    table = ir.LabwareTable()
+
+    def op(tip, well, rate):
+        return ir.TransferOp(
+            template="transfer",
+            sources=[table.ref(well, "Source Plate", 1)],
+            targets=[table.ref(well, "Dest Plate", 3)],
+            tips=[table.ref(tip, "Tip Rack", 6)],
+            asp_vols=[20.0], disp_vols=[20.0],
+            asp_flow_rates=[rate], dis_flow_rates=[rate],
+            blow_out_air_volume=[None], delays=[None],
+            mix=ir.MixSpec("after", 2, 10.0),
+        )
+
+    merged = ir.merge_ops([op("A1", "A1", 50.0), op("C3", "B1", 80.0)], table)
+    assert len(merged) == 1
+
+    async def main():
+        await lh.setup()
+        await lh.transfer_op(merged[0], table)
+
+    asyncio.run(main())
+    records = list(Trace.from_bytes(recorder.to_bytes()).decoded())
+    picks = [r.resource for r in records if r.op == "pick_up_tips"]
+    assert picks == ["tips_tipspot_A1", "tips_tipspot_C3"]   # the tips the log used
+    transfers = [r for r in records if r.op == "aspirate" and r.volume == 20.0]
+    assert [(r.resource, r.flow_rate) for r in transfers] == [("src_well_A1", 50.0), ("src_well_B1", 80.0)]
+    mixes = [r for r in records if r.op == "aspirate" and r.volume == 10.0]
+    assert [r.resource for r in mixes] == ["dst_well_A1"] * 2 + ["dst_well_B1"] * 2
@@ -0,0 +1,193 @@
+"""
+Shared well addressing.
+
+Well names map to (row, col) and to a linear index through tables built
+once at import, so parsers and planners never re-parse "B7" by hand.
+Linear indices are column-major (A1, B1, ..., H1, A2, ...), the order of
+Opentrons ``wells()`` and of pylabrobot plate children.
+
+Absolute well coordinates of placed labware are cached as NumPy arrays
+(one (n, 3) array per labware, dropped with the labware) for vectorized
+geometry. NumPy is only imported when coordinates are requested.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, Sequence, Tuple
+
+import functools
+import weakref
+
+ROW_LETTERS = "ABCDEFGHIJKLMNOP"
+MAX_ROWS, MAX_COLS = 16, 24
+# regex fragment for a well name in OT logs: exactly the names in WELL_ROWCOL (A1 .. P24)
+WELL_PATTERN = r"[A-P](?:2[0-4]|1\d|[1-9])(?!\d)"
+
+# "A1" -> (row, col) for every well of the largest (384) format
+WELL_ROWCOL: Dict[str, Tuple[int, int]] = {
+    f"{ROW_LETTERS[r]}{c + 1}": (r, c) for r in range(MAX_ROWS) for c in range(MAX_COLS)
+}
+
+
+class PlateFormat:
+    """Lookup tables for one rows × cols layout."""
+
+    __slots__ = ("rows", "cols", "names", "index", "rowcol")
+
+    def __init__(self, rows: int, cols: int):
+        self.rows = rows
+        self.cols = cols
+        self.names: Tuple[str, ...] = tuple(
+            f"{ROW_LETTERS[r]}{c + 1}" for c in range(cols) for r in range(rows)
+        )
+        self.index: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        self.rowcol: Tuple[Tuple[int, int], ...] = tuple(WELL_ROWCOL[n] for n in self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __repr__(self):
+        return f"PlateFormat({self.rows}x{self.cols})"
+
+    def linear(self, row: int, col: int) -> int:
+        return col * self.rows + row
+
+    def column(self, col: int) -> Tuple[str, ...]:
+        """Wells of 0-based column ``col``, top to bottom."""
+        return self.names[col * self.rows:(col + 1) * self.rows]
+
+    def row(self, row: int) -> Tuple[str, ...]:
+        """Wells of 0-based row ``row``, left to right."""
+        return self.names[row::self.rows]
+
+
+@functools.lru_cache(maxsize=None)
+def plate_format(rows: int, cols: int) -> PlateFormat:
+    if not (1 <= rows <= MAX_ROWS and 1 <= cols <= MAX_COLS):
+        raise ValueError(f"unsupported plate layout {rows}x{cols}")
+    return PlateFormat(rows, cols)
+
+
+# standard SBS formats by well count
+FORMATS: Dict[int, PlateFormat] = {
+    6: plate_format(2, 3),
+    12: plate_format(3, 4),
+    24: plate_format(4, 6),
+    48: plate_format(6, 8),
+    96: plate_format(8, 12),
+    384: plate_format(16, 24),
+}
+
+
+def rowcol(name: str) -> Tuple[int, int]:
+    """'B7' -> (1, 6). KeyError for anything that is not a well name."""
+    return WELL_ROWCOL[name]
+
+
+def is_full_row(wells: Sequence[str], cols: int = 12) -> bool:
+    """True when the wells include every column of the first well's row; False if any name is not a well."""
+    if len(wells) < cols:
+        return False
+    cells = [WELL_ROWCOL.get(w) for w in wells]
+    if None in cells:
+        return False
+    row = cells[0][0]
+    return sorted(c for r, c in cells if r == row) == list(range(cols))
+
+
+# ---------------------------------------------------------------
+# COORDINATES ----------------------------------------------------
+# ---------------------------------------------------------------
+
+
+class DeckCoordinates:
+    """Cached (n, 3) arrays of absolute well centres for labware placed on a deck.
+
+    Entries are keyed by the labware object (by identity, without keeping
+    it alive) and checked against where it is attached: its parent and its
+    location on that parent. Reassigning a plate to another slot therefore
+    recomputes its array; moving a carrier it sits on does not, so call
+    ``invalidate(labware)`` (or ``clear()``) after moving an ancestor.
+    ``position(well)`` looks a single well up through its parent.
+    """
+
+    def __init__(self):
+        # id(labware) -> (placement, array, name -> row); the entry is dropped when the labware
+        # is garbage collected, so the id cannot be reused while the entry exists
+        self._arrays: Dict[int, Tuple[tuple, object, Dict[str, int]]] = {}
+
+    @staticmethod
+    def _centre(resource):
+        try:
+            return resource.get_absolute_location(x="c", y="c", z="b")
+        except TypeError:  # older pylabrobot
+            return resource.get_absolute_location()
+
+    @staticmethod
+    def _placement(labware) -> tuple:
+        loc = getattr(labware, "location", None)
+        return (id(getattr(labware, "parent", None)), None if loc is None else (loc.x, loc.y, loc.z))
+
+    def _entry(self, labware) -> Tuple[tuple, object, Dict[str, int]]:
+        import numpy as np
+
+        placement = self._placement(labware)
+        key = id(labware)
+        cached = self._arrays.get(key)
+        if cached is not None and cached[0] == placement:
+            return cached
+        children = list(labware.children)
+        coords = np.empty((len(children), 3), dtype=float)
+        for i, child in enumerate(children):
+            c = self._centre(child)
+            coords[i] = (c.x, c.y, c.z)
+        coords.setflags(write=False)
+        if cached is None:
+            weakref.finalize(labware, self._arrays.pop, key, None)
+        entry = (placement, coords, {child.name: i for i, child in enumerate(children)})
+        self._arrays[key] = entry
+        return entry
+
+    def array(self, labware):
+        """(n, 3) float array of well centres in the labware's child order."""
+        return self._entry(labware)[1]
+
+    def position(self, well) -> Tuple[float, float, float]:
+        """Absolute centre of one well or tip spot, from its parent's cached array."""
+        parent = getattr(well, "parent", None)
+        if parent is None or not getattr(parent, "children", None):
+            c = self._centre(well)
+            return (c.x, c.y, c.z)
+        _, coords, names = self._entry(parent)
+        idx = names.get(well.name)
+        if idx is None:
+            c = self._centre(well)
+            return (c.x, c.y, c.z)
+        x, y, z = coords[idx]
+        return (float(x), float(y), float(z))
+
+    def positions(self, wells: Iterable) -> "object":
+        """(n, 3) array for a list of wells (any mix of labware)."""
+        import numpy as np
+
+        return np.array([self.position(w) for w in wells], dtype=float).reshape(-1, 3)
+
+    def invalidate(self, labware):
+        self._arrays.pop(id(labware), None)
+
+    def clear(self):
+        self._arrays.clear()
+
+
+def path_length(points) -> float:
+    """Total XY length of a polyline given as an (n, 2+) array."""
+    import numpy as np
+
+    pts = np.asarray(points, dtype=float)
+    if len(pts) < 2:
+        return 0.0
+    steps = np.diff(pts[:, :2], axis=0)
+    return float(np.hypot(steps[:, 0], steps[:, 1]).sum())
+
+
+DECK_COORDINATES = DeckCoordinates()